@@ -8,7 +8,69 @@ load_dotenv()
 
 class Settings(BaseSettings):
     # Database
-    DATABASE_URL: str = os.getenv("DATABASE_URL")
+    DATABASE_URL: Optional[str] = os.getenv("DATABASE_URL")
+    # "postgres", or "memory" to run without a database (tests, HTTP layer benchmarks)
+    STORAGE_BACKEND: str = "postgres"
+    
+    # Connection pool (per worker process: total connections = workers x DB_POOL_MAX_SIZE)
+    DB_POOL_MIN_SIZE: int = 5
+    DB_POOL_MAX_SIZE: int = 20
+    DB_POOL_MAX_QUERIES: int = 50000
+    DB_POOL_MAX_INACTIVE_CONNECTION_LIFETIME: float = 300.0
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    DB_COMMAND_TIMEOUT: Optional[float] = None
+    DB_WARM_UP_STATEMENTS: bool = True
+    
+    # Read replicas (optional, comma-separated DSNs); read-only queries go to them
+    DATABASE_REPLICA_URLS: Optional[str] = None
+    DB_REPLICA_POOL_MIN_SIZE: int = 2
+    DB_REPLICA_POOL_MAX_SIZE: int = 20
+    DB_REPLICA_ACQUIRE_TIMEOUT: float = 2.0
+    DB_REPLICA_RETRY_INTERVAL: float = 30.0
+    
+    # Cache
+    IDEAS_CACHE_TTL: float = 60.0
+    COUPLE_CACHE_SIZE: int = 10000
+    COUPLE_CACHE_TTL: float = 300.0
+    
+    # Invite codes
+    INVITE_CODE_RESERVOIR_SIZE: int = 500
+    INVITE_CODE_REFILL_THRESHOLD: int = 100
+    INVITE_CODE_REFILL_INTERVAL: float = 10.0
+    INVITE_CODE_RESERVATION_TTL: float = 3600.0
+    
+    # Date event notifications (SSE)
+    DATE_EVENT_QUEUE_SIZE: int = 100
+    SSE_KEEPALIVE_INTERVAL: float = 15.0
+    
+    # Idea search: queries up to this many characters use the in-process prefix index
+    IDEA_SEARCH_LOCAL_MAX_LENGTH: int = 3
+    
+    # Recommendations
+    RECOMMENDER_PROFILES_SIZE: int = 10000
+    
+    # Date reminders: sent REMINDER_LEAD_TIME seconds before scheduled_date
+    REMINDER_SCHEDULER_ENABLED: bool = True
+    REMINDER_LEAD_TIME: float = 3600.0
+    REMINDER_BATCH_SIZE: int = 100
+    REMINDER_POLL_INTERVAL: float = 60.0
+    
+    # Idempotency keys: "memory" (per worker) or "postgres" (shared, needs the postgres backend)
+    IDEMPOTENCY_ENABLED: bool = True
+    IDEMPOTENCY_STORE: str = "memory"
+    IDEMPOTENCY_KEY_TTL: float = 86400.0
+    IDEMPOTENCY_CACHE_SIZE: int = 10000
+    IDEMPOTENCY_WAIT_TIMEOUT: float = 10.0
+    IDEMPOTENCY_LOCK_TIMEOUT: float = 60.0
+    
+    # Metrics
+    METRICS_ENABLED: bool = True
+    
+    # Slow query log (opt-in)
+    SLOW_QUERY_LOG_ENABLED: bool = False
+    SLOW_QUERY_THRESHOLD_MS: float = 200.0
+    SLOW_QUERY_EXPLAIN_SAMPLE_RATE: float = 0.1
+    SLOW_QUERY_LOG_SIZE: int = 200
     
     # App
     APP_NAME: str = "Couple Bot API"
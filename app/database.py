@@ -1,251 +1,968 @@
 import asyncpg
 import asyncio
+import functools
+import json
+import logging
 import random
+import re
 import string
-from typing import Optional, List, Dict, Any
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Tuple, AsyncIterator, Mapping, Sequence
 from app.config import settings
+from app.migrations import run_migrations, IDEA_SEARCH_DOCUMENT
+from app.storage.base import Storage, JoinStatus, ProposalStatus, DateEventCallback, RESYNC_NOTIFICATION
+from app.utils.cache import IdeaCatalogCache, CoupleCache
+from app.utils.etag import compute_etag
+from app.utils.metrics import instrument_queries
+from app.utils.pagination import Keyset
+from app.utils.pool_monitor import PoolMonitor
+from app.utils.search import tokenize
+from app.utils.replicas import ReplicaSet, REPLICA_UNAVAILABLE_ERRORS, parse_urls, pinned_to_primary, writes
+from app.utils.slow_queries import SlowQueryLog
 
 
-class Database:
+logger = logging.getLogger(__name__)
+
+# Channel the date_events trigger (migration 6) notifies on
+DATE_EVENTS_CHANNEL = "date_events"
+# Channel the couples trigger (migration 11) notifies on when membership changes
+COUPLE_CHANGES_CHANNEL = "couple_changes"
+# Seconds between attempts to re-open a lost listener connection, doubling up to the max
+LISTENER_RETRY_DELAY = 1.0
+LISTENER_MAX_RETRY_DELAY = 30.0
+
+# Date event rows are always returned with the idea and proposer fields joined in.
+# ``{source}`` is either the date_events table or a CTE producing date_events rows.
+DATE_EVENT_SELECT = """
+    SELECT de.*, i.title as idea_title, i.description as idea_description,
+           u.name as proposer_name
+    FROM {source} de
+    JOIN ideas i ON de.idea_id = i.id
+    JOIN users u ON de.proposer_id = u.id
+"""
+
+SELECT_USER_BY_ID = "SELECT * FROM users WHERE id = $1"
+SELECT_USER_BY_TELEGRAM_ID = "SELECT * FROM users WHERE telegram_id = $1"
+SELECT_COUPLE_BY_ID = "SELECT * FROM couples WHERE id = $1"
+SELECT_COUPLE_BY_USER_ID = "SELECT * FROM couples WHERE user1_id = $1 OR user2_id = $1"
+SELECT_IDEA_BY_ID = "SELECT * FROM ideas WHERE id = $1"
+SELECT_ACTIVE_IDEAS = "SELECT * FROM ideas WHERE is_active = TRUE ORDER BY created_at DESC, id DESC"
+# Keyset pages of the catalog, a range scan of idx_ideas_active_created_id
+SELECT_ACTIVE_IDEAS_PAGE = "SELECT * FROM ideas WHERE is_active = TRUE ORDER BY created_at DESC, id DESC LIMIT $1"
+SELECT_ACTIVE_IDEAS_PAGE_AFTER = """
+    SELECT * FROM ideas
+    WHERE is_active = TRUE AND (created_at, id) < ($1, $2)
+    ORDER BY created_at DESC, id DESC
+    LIMIT $3
+"""
+# $1 prefix tsquery, $2 category or NULL, $3 limit; {fuzzy} optionally adds a
+# trigram match of the raw query ($4) against titles, for misspellings
+SEARCH_IDEAS = """
+    SELECT *, ts_rank({document}, to_tsquery('russian', $1)){fuzzy_rank} AS rank
+    FROM ideas
+    WHERE is_active = TRUE AND ($2::varchar IS NULL OR category = $2)
+      AND ({document} @@ to_tsquery('russian', $1){fuzzy_match})
+    ORDER BY rank DESC, created_at DESC, id DESC
+    LIMIT $3
+"""
+SEARCH_IDEAS_FULL_TEXT = SEARCH_IDEAS.format(document=IDEA_SEARCH_DOCUMENT, fuzzy_rank="", fuzzy_match="")
+SEARCH_IDEAS_FUZZY = SEARCH_IDEAS.format(
+    document=IDEA_SEARCH_DOCUMENT,
+    fuzzy_rank=" + word_similarity($4, title)",
+    fuzzy_match=" OR $4 <% title"
+)
+SELECT_DATE_EVENT_BY_ID = DATE_EVENT_SELECT.format(source="date_events") + " WHERE de.id = $1"
+
+# Claim one unreserved code from the reservoir and create the couple with it, atomically
+CLAIM_INVITE_CODE = """
+    WITH claimed AS (
+        DELETE FROM invite_codes
+        WHERE code = (
+            SELECT code FROM invite_codes WHERE reserved_at IS NULL
+            LIMIT 1 FOR UPDATE SKIP LOCKED
+        )
+        RETURNING code
+    )
+    INSERT INTO couples (user1_id, invite_code)
+    SELECT $1, code FROM claimed
+    RETURNING *
+"""
+
+# Same as CLAIM_INVITE_CODE for a code handed out earlier by reserve_invite_code
+CLAIM_RESERVED_INVITE_CODE = """
+    WITH claimed AS (
+        DELETE FROM invite_codes
+        WHERE code = $2 AND reserved_at IS NOT NULL
+        RETURNING code
+    )
+    INSERT INTO couples (user1_id, invite_code)
+    SELECT $1, code FROM claimed
+    RETURNING *
+"""
+
+INVITE_CODE_CLAIM_ATTEMPTS = 3
+
+
+# Join a couple in one statement. The UPDATE re-checks user2_id IS NULL on the
+# latest row version, so of several concurrent joins with one code only the first
+# commits; the rest fall through to a failure reason. The reasons are evaluated
+# against the statement snapshot, which is why a lost race reports couple_full.
+JOIN_COUPLE = """
+    WITH target AS (
+        SELECT * FROM couples WHERE invite_code = $2
+    ),
+    membership AS (
+        SELECT EXISTS (SELECT 1 FROM couples WHERE user1_id = $1 OR user2_id = $1) AS in_couple
+    ),
+    joined AS (
+        UPDATE couples c SET user2_id = $1
+        FROM target t, membership m
+        WHERE c.id = t.id
+          AND c.user2_id IS NULL
+          AND c.user1_id <> $1
+          AND NOT m.in_couple
+        RETURNING c.*
+    )
+    SELECT j.*,
+        CASE
+            WHEN j.id IS NOT NULL THEN 'joined'
+            WHEN NOT EXISTS (SELECT 1 FROM target) THEN 'invalid_code'
+            WHEN EXISTS (SELECT 1 FROM target WHERE user1_id = $1 OR user2_id = $1) THEN 'own_couple'
+            WHEN (SELECT in_couple FROM membership) THEN 'already_in_couple'
+            ELSE 'couple_full'
+        END AS join_status
+    FROM (SELECT 1) one
+    LEFT JOIN joined j ON TRUE
+"""
+
+# Batches at least this large are loaded with COPY instead of executemany
+BULK_COPY_THRESHOLD = 100
+
+
+# Validated insert: only inserts when the couple and an active idea exist and the
+# proposer belongs to the couple, otherwise reports which check failed
+CREATE_DATE_PROPOSAL = """
+    WITH couple AS (
+        SELECT user1_id, user2_id FROM couples WHERE id = $1
+    ),
+    idea AS (
+        SELECT title, description, category, is_active FROM ideas WHERE id = $2
+    ),
+    inserted AS (
+        INSERT INTO date_events (couple_id, idea_id, proposer_id, idea_category)
+        SELECT $1, $2, $3, idea.category FROM couple, idea
+        WHERE $3 IN (couple.user1_id, couple.user2_id) AND idea.is_active IS NOT FALSE
+        RETURNING *
+    )
+    SELECT de.*, idea.title as idea_title, idea.description as idea_description,
+           u.name as proposer_name,
+        CASE
+            WHEN de.id IS NOT NULL THEN 'ok'
+            WHEN NOT EXISTS (SELECT 1 FROM couple) THEN 'couple_not_found'
+            WHEN NOT EXISTS (SELECT 1 FROM idea) THEN 'idea_not_found'
+            WHEN NOT EXISTS (SELECT 1 FROM couple WHERE $3 IN (user1_id, user2_id)) THEN 'not_member'
+            ELSE 'idea_inactive'
+        END AS outcome
+    FROM (SELECT 1) one
+    LEFT JOIN inserted de ON TRUE
+    LEFT JOIN idea ON de.id IS NOT NULL
+    LEFT JOIN users u ON u.id = de.proposer_id
+"""
+
+# Validated response: only updates a pending event of the responder's couple that
+# the responder did not propose, otherwise reports which check failed
+RESPOND_TO_DATE_PROPOSAL = """
+    WITH event AS (
+        SELECT de.proposer_id, c.user1_id, c.user2_id
+        FROM date_events de
+        JOIN couples c ON c.id = de.couple_id
+        WHERE de.id = $1
+    ),
+    updated AS (
+        UPDATE date_events de SET date_status = $2, responded_at = CURRENT_TIMESTAMP
+        FROM event e
+        WHERE de.id = $1
+          AND de.date_status = 'pending'
+          AND $3 IN (e.user1_id, e.user2_id)
+          AND de.proposer_id <> $3
+        RETURNING de.*
+    )
+    SELECT de.*, i.title as idea_title, i.description as idea_description,
+           u.name as proposer_name,
+        CASE
+            WHEN de.id IS NOT NULL THEN 'ok'
+            WHEN NOT EXISTS (SELECT 1 FROM event) THEN 'event_not_found'
+            WHEN NOT EXISTS (SELECT 1 FROM event WHERE $3 IN (user1_id, user2_id)) THEN 'not_member'
+            WHEN EXISTS (SELECT 1 FROM event WHERE proposer_id = $3) THEN 'own_proposal'
+            ELSE 'not_pending'
+        END AS outcome
+    FROM (SELECT 1) one
+    LEFT JOIN updated de ON TRUE
+    LEFT JOIN ideas i ON i.id = de.idea_id
+    LEFT JOIN users u ON u.id = de.proposer_id
+"""
+
+
+COUPLE_STATS_COLUMNS = """
+    couple_id, proposed, pending, accepted, declined, completed, categories,
+    last_date_at, last_date_week, current_streak_weeks, longest_streak_weeks
+"""
+
+# couple_stats rows recomputed from date_events for couple $1, or every couple
+# when $1 is NULL. Must agree with the apply_couple_stats trigger (migration 8).
+COMPUTE_COUPLE_STATS = """
+    WITH events AS (
+        SELECT de.couple_id, de.date_status, de.idea_category AS category,
+               de.date_status IN ('accepted', 'completed') AS done,
+               coalesce(de.responded_at, de.created_at) AS done_at
+        FROM date_events de
+        WHERE $1::int IS NULL OR de.couple_id = $1
+    ),
+    counts AS (
+        SELECT couple_id,
+               count(*)::int AS proposed,
+               (count(*) FILTER (WHERE date_status = 'pending'))::int AS pending,
+               (count(*) FILTER (WHERE date_status = 'accepted'))::int AS accepted,
+               (count(*) FILTER (WHERE date_status IN ('rejected', 'declined')))::int AS declined,
+               (count(*) FILTER (WHERE date_status = 'completed'))::int AS completed,
+               max(done_at) FILTER (WHERE done) AS last_date_at
+        FROM events
+        GROUP BY couple_id
+    ),
+    categories AS (
+        SELECT couple_id, jsonb_object_agg(category, dates) AS categories
+        FROM (
+            SELECT couple_id, category, count(*) AS dates FROM events WHERE done GROUP BY couple_id, category
+        ) per_category
+        GROUP BY couple_id
+    ),
+    runs AS (
+        -- Consecutive weeks share the same week - 7 * rank
+        SELECT couple_id, count(*)::int AS weeks, max(week) AS last_week
+        FROM (
+            SELECT couple_id, week, week - 7 * (rank() OVER (PARTITION BY couple_id ORDER BY week))::int AS run
+            FROM (SELECT DISTINCT couple_id, date_trunc('week', done_at)::date AS week FROM events WHERE done) weeks
+        ) ranked
+        GROUP BY couple_id, run
+    ),
+    streaks AS (
+        SELECT couple_id, max(last_week) AS last_date_week,
+               (array_agg(weeks ORDER BY last_week DESC))[1] AS current_streak_weeks,
+               max(weeks) AS longest_streak_weeks
+        FROM runs
+        GROUP BY couple_id
+    )
+    SELECT c.couple_id, c.proposed, c.pending, c.accepted, c.declined, c.completed,
+           coalesce(cat.categories, '{}') AS categories, c.last_date_at, s.last_date_week,
+           coalesce(s.current_streak_weeks, 0) AS current_streak_weeks,
+           coalesce(s.longest_streak_weeks, 0) AS longest_streak_weeks
+    FROM counts c
+    LEFT JOIN categories cat ON cat.couple_id = c.couple_id
+    LEFT JOIN streaks s ON s.couple_id = c.couple_id
+"""
+
+REBUILD_COUPLE_STATS = f"""
+    INSERT INTO couple_stats ({COUPLE_STATS_COLUMNS})
+    SELECT {COUPLE_STATS_COLUMNS} FROM ({COMPUTE_COUPLE_STATS}) computed
+"""
+
+# Couples whose stored stats differ from the recomputed ones, with both versions
+CHECK_COUPLE_STATS = f"""
+    WITH expected AS ({COMPUTE_COUPLE_STATS}),
+    actual AS (
+        SELECT {COUPLE_STATS_COLUMNS} FROM couple_stats WHERE $1::int IS NULL OR couple_id = $1
+    )
+    SELECT coalesce(e.couple_id, a.couple_id) AS couple_id,
+           to_jsonb(e) AS expected, to_jsonb(a) AS actual
+    FROM expected e
+    FULL JOIN actual a ON a.couple_id = e.couple_id
+    WHERE e IS DISTINCT FROM a
+    ORDER BY 1
+"""
+
+
+# Validated update of an accepted date by a member of its couple; {assignments}
+# is the SET list, which may use $3. Otherwise reports which check failed.
+UPDATE_ACCEPTED_DATE = """
+    WITH event AS (
+        SELECT c.user1_id, c.user2_id
+        FROM date_events de
+        JOIN couples c ON c.id = de.couple_id
+        WHERE de.id = $1
+    ),
+    updated AS (
+        UPDATE date_events de SET {assignments}
+        FROM event e
+        WHERE de.id = $1
+          AND de.date_status = 'accepted'
+          AND $2 IN (e.user1_id, e.user2_id)
+        RETURNING de.*
+    )
+    SELECT de.*, i.title as idea_title, i.description as idea_description,
+           u.name as proposer_name,
+        CASE
+            WHEN de.id IS NOT NULL THEN 'ok'
+            WHEN NOT EXISTS (SELECT 1 FROM event) THEN 'event_not_found'
+            WHEN NOT EXISTS (SELECT 1 FROM event WHERE $2 IN (user1_id, user2_id)) THEN 'not_member'
+            ELSE 'not_accepted'
+        END AS outcome
+    FROM (SELECT 1) one
+    LEFT JOIN updated de ON TRUE
+    LEFT JOIN ideas i ON i.id = de.idea_id
+    LEFT JOIN users u ON u.id = de.proposer_id
+"""
+SCHEDULE_DATE = UPDATE_ACCEPTED_DATE.format(assignments="scheduled_date = $3, reminded_at = NULL")
+COMPLETE_DATE = UPDATE_ACCEPTED_DATE.format(
+    assignments="date_status = 'completed', completed_date = CURRENT_TIMESTAMP"
+)
+
+# scheduled_date and reminded_at are naive UTC, whatever the session time zone
+UTC_NOW = "(now() AT TIME ZONE 'UTC')"
+
+# Accepted dates whose reminder is still to be sent; idx_date_events_reminders (migration 9)
+PENDING_REMINDER = "reminded_at IS NULL AND scheduled_date IS NOT NULL AND date_status = 'accepted'"
+
+# Claim a batch of due reminders. Rows another claimer has locked are skipped
+# rather than waited for, and the claim is recorded in the same statement, so
+# concurrent schedulers split the due reminders between them. Setting
+# reminded_at fires the ``reminder`` notification (migration 9 trigger).
+CLAIM_DUE_REMINDERS = f"""
+    WITH due AS (
+        SELECT id FROM date_events
+        WHERE {PENDING_REMINDER}
+          AND scheduled_date <= {UTC_NOW} + make_interval(secs => $1)
+        ORDER BY scheduled_date
+        LIMIT $2
+        FOR UPDATE SKIP LOCKED
+    ),
+    claimed AS (
+        UPDATE date_events de SET reminded_at = {UTC_NOW}
+        FROM due
+        WHERE de.id = due.id
+        RETURNING de.*
+    )
+""" + DATE_EVENT_SELECT.format(source="claimed") + " ORDER BY de.scheduled_date, de.id"
+
+SELECT_NEXT_REMINDER_AT = f"SELECT min(scheduled_date) FROM date_events WHERE {PENDING_REMINDER}"
+
+
+def _split_outcome(row: asyncpg.Record) -> Tuple[Optional[Dict[str, Any]], ProposalStatus]:
+    """Separate the outcome column from a validated date event statement's row"""
+    outcome = ProposalStatus(row['outcome'])
+    if outcome != ProposalStatus.ok:
+        return None, outcome
+    event = dict(row)
+    del event['outcome']
+    return event, outcome
+
+
+# Take an idempotency key, or take it over from a first request that finished
+# ``$3`` seconds ago or was abandoned unfinished ``$4`` seconds ago. Returns
+# whether it was taken, and otherwise the row as of the statement's snapshot
+# (none if another request took it concurrently).
+CLAIM_IDEMPOTENCY_KEY = """
+    WITH claimed AS (
+        INSERT INTO idempotency_keys (key, fingerprint) VALUES ($1, $2)
+        ON CONFLICT (key) DO UPDATE
+            SET fingerprint = EXCLUDED.fingerprint, status_code = NULL, headers = NULL,
+                body = NULL, created_at = CURRENT_TIMESTAMP
+            WHERE idempotency_keys.created_at < CURRENT_TIMESTAMP - make_interval(secs =>
+                CASE WHEN idempotency_keys.status_code IS NULL THEN $4::float8 ELSE $3::float8 END)
+        RETURNING key
+    )
+    SELECT EXISTS (SELECT 1 FROM claimed) AS claimed, k.fingerprint, k.status_code, k.headers, k.body
+    FROM (SELECT 1) one
+    LEFT JOIN idempotency_keys k ON k.key = $1 AND NOT EXISTS (SELECT 1 FROM claimed)
+"""
+
+
+# Statements prepared on every pooled connection at startup so the first
+# requests after a deploy or pool recycle skip the parse/plan round trip.
+# Each is run once with every parameter NULL, which matches no rows
+HOT_READS = [
+    SELECT_USER_BY_ID,
+    SELECT_USER_BY_TELEGRAM_ID,
+    SELECT_COUPLE_BY_ID,
+    SELECT_COUPLE_BY_USER_ID,
+    SELECT_IDEA_BY_ID,
+    SELECT_DATE_EVENT_BY_ID,
+]
+# Primary only: replicas reject writes even when they change nothing.
+# CLAIM_INVITE_CODE is left out, it takes a code whatever its parameter
+HOT_WRITES = [
+    JOIN_COUPLE,
+    CREATE_DATE_PROPOSAL,
+    RESPOND_TO_DATE_PROPOSAL,
+]
+
+
+def parameter_count(query: str) -> int:
+    return max((int(n) for n in re.findall(r"\$(\d+)", query)), default=0)
+
+
+class Database(Storage):
+    """PostgreSQL storage backend on an asyncpg pool"""
+    
     def __init__(self):
         self.pool = None
+        self.ideas_cache = IdeaCatalogCache(ttl=settings.IDEAS_CACHE_TTL)
+        self.couple_cache = CoupleCache(max_size=settings.COUPLE_CACHE_SIZE, ttl=settings.COUPLE_CACHE_TTL)
+        self.pool_monitor = PoolMonitor()
+        self.slow_queries = SlowQueryLog(
+            threshold_ms=settings.SLOW_QUERY_THRESHOLD_MS,
+            sample_rate=settings.SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+            size=settings.SLOW_QUERY_LOG_SIZE
+        )
+        self.replicas = ReplicaSet(
+            parse_urls(settings.DATABASE_REPLICA_URLS),
+            retry_interval=settings.DB_REPLICA_RETRY_INTERVAL
+        )
+        self._schema_ready = False
+        # Set by create_tables when migration 7 could install pg_trgm
+        self._trigram_search = False
+        self._date_event_listeners: List[DateEventCallback] = []
+        self._listener: Optional[asyncpg.Connection] = None
+        self._listener_task: Optional[asyncio.Task] = None
+        self._closing = False
     
     async def connect(self):
-        """Create connection pool to the database"""
-        self.pool = await asyncpg.create_pool(settings.DATABASE_URL)
+        """Create the primary connection pool and one read pool per replica"""
+        self.pool = await self._create_pool(
+            settings.DATABASE_URL,
+            min_size=settings.DB_POOL_MIN_SIZE,
+            max_size=settings.DB_POOL_MAX_SIZE,
+            primary=True
+        )
+        self.slow_queries.pool = self.pool
+        for replica in self.replicas:
+            try:
+                replica.pool = await self._create_pool(
+                    replica.url,
+                    min_size=settings.DB_REPLICA_POOL_MIN_SIZE,
+                    max_size=settings.DB_REPLICA_POOL_MAX_SIZE
+                )
+            except REPLICA_UNAVAILABLE_ERRORS as e:
+                # Start without it: an empty pool connects lazily once the
+                # replica is back, and reads use the primary until then
+                self.replicas.mark_down(replica, e)
+                replica.pool = await self._create_pool(
+                    replica.url, min_size=0, max_size=settings.DB_REPLICA_POOL_MAX_SIZE
+                )
+    
+    async def _create_pool(self, dsn: str, min_size: int, max_size: int,
+                           primary: bool = False) -> asyncpg.Pool:
+        return await asyncpg.create_pool(
+            dsn,
+            min_size=min_size,
+            max_size=max_size,
+            max_queries=settings.DB_POOL_MAX_QUERIES,
+            max_inactive_connection_lifetime=settings.DB_POOL_MAX_INACTIVE_CONNECTION_LIFETIME,
+            statement_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
+            command_timeout=settings.DB_COMMAND_TIMEOUT,
+            init=functools.partial(self._init_connection, primary=primary)
+        )
+    
+    async def _init_connection(self, conn: asyncpg.Connection, primary: bool):
+        """Install the slow query logger and warm up a newly opened pool connection"""
+        if settings.SLOW_QUERY_LOG_ENABLED:
+            conn.add_query_logger(self.slow_queries)
+        # Before migrations have run the tables may not exist yet; warm_up()
+        # covers the connections opened during that window
+        if self._schema_ready and settings.DB_WARM_UP_STATEMENTS:
+            await self._prepare_hot_statements(conn, primary)
+    
+    async def _prepare_hot_statements(self, conn: asyncpg.Connection, primary: bool):
+        # Connection.prepare() does not add to the statement cache fetch() and
+        # fetchrow() look up, so run each statement once instead
+        for query in HOT_READS + (HOT_WRITES if primary else []):
+            await conn.fetch(query, *[None] * parameter_count(query))
+    
+    async def warm_up(self):
+        """Prepare hot statements on every connection the pools have opened so far"""
+        self._schema_ready = True
+        if not settings.DB_WARM_UP_STATEMENTS:
+            return
+        await self._warm_up_pool(self.pool, primary=True)
+        for replica in self.replicas:
+            try:
+                await self._warm_up_pool(replica.pool, primary=False)
+            except REPLICA_UNAVAILABLE_ERRORS as e:
+                self.replicas.mark_down(replica, e)
+    
+    async def _warm_up_pool(self, pool: asyncpg.Pool, primary: bool):
+        conns = [await pool.acquire() for _ in range(pool.get_size())]
+        try:
+            await asyncio.gather(*(self._prepare_hot_statements(conn, primary) for conn in conns))
+        finally:
+            for conn in conns:
+                await pool.release(conn)
+    
+    @asynccontextmanager
+    async def connection(self, conn: Optional[asyncpg.Connection] = None) -> AsyncIterator[asyncpg.Connection]:
+        """Yield the caller's connection, or acquire one from the pool if none was given"""
+        if conn is not None:
+            yield conn
+        else:
+            async with self.pool_monitor.acquire(self.pool) as conn:
+                yield conn
+    
+    @asynccontextmanager
+    async def read_connection(self, conn: Optional[asyncpg.Connection] = None) -> AsyncIterator[asyncpg.Connection]:
+        """Yield the caller's connection, else a healthy replica's unless this request wrote, else the primary's"""
+        replica = None if conn is not None or pinned_to_primary() else self.replicas.pick()
+        if replica is None:
+            async with self.connection(conn) as conn:
+                yield conn
+            return
+        
+        try:
+            replica_conn = await replica.pool.acquire(timeout=settings.DB_REPLICA_ACQUIRE_TIMEOUT)
+        except REPLICA_UNAVAILABLE_ERRORS as e:
+            self.replicas.mark_down(replica, e)
+            self.replicas.fallbacks += 1
+        else:
+            replica.reads += 1
+            try:
+                yield replica_conn
+            finally:
+                await replica.pool.release(replica_conn)
+            return
+        
+        async with self.connection() as conn:
+            yield conn
+    
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[asyncpg.Connection]:
+        """Yield one pooled connection inside a transaction, to pass as ``conn=`` to other methods"""
+        async with self.pool_monitor.acquire(self.pool) as conn:
+            async with conn.transaction():
+                yield conn
+    
+    async def stream(self, query: str, *args, chunk_size: int = 1000) -> AsyncIterator[List[asyncpg.Record]]:
+        """Yield query results in chunks read from a server-side cursor"""
+        async with self.read_connection() as conn, conn.transaction(readonly=True):
+            cursor = await conn.cursor(query, *args)
+            while True:
+                rows = await cursor.fetch(chunk_size)
+                if not rows:
+                    break
+                yield rows
     
     async def disconnect(self):
-        """Close the connection pool"""
+        """Close the LISTEN connection, cancel pending query plans and close the connection pools"""
+        self._closing = True
+        if self._listener_task:
+            self._listener_task.cancel()
+        if self._listener:
+            await self._listener.close()
+        await self.slow_queries.close()
         if self.pool:
             await self.pool.close()
+        for replica in self.replicas:
+            if replica.pool:
+                await replica.pool.close()
     
     async def init_db(self):
-        """Initialize database and create tables"""
+        """Initialize database, create tables, start listening and warm up the pool"""
         await self.connect()
         await self.create_tables()
+        if self._listener is None:
+            await self._open_listener()
+        await self.warm_up()
     
     async def create_tables(self):
-        """Create database tables"""
-        async with self.pool.acquire() as conn:
-            # Users table
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id SERIAL PRIMARY KEY,
-                    telegram_id BIGINT UNIQUE NOT NULL,
-                    name VARCHAR(255) NOT NULL,
-                    username VARCHAR(255),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Couples table
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS couples (
-                    id SERIAL PRIMARY KEY,
-                    user1_id INTEGER REFERENCES users(id),
-                    user2_id INTEGER REFERENCES users(id),
-                    invite_code VARCHAR(6) UNIQUE NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Ideas table
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS ideas (
-                    id SERIAL PRIMARY KEY,
-                    title VARCHAR(255) NOT NULL,
-                    description TEXT,
-                    category VARCHAR(100) NOT NULL,
-                    is_active BOOLEAN DEFAULT TRUE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Date events table
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS date_events (
-                    id SERIAL PRIMARY KEY,
-                    couple_id INTEGER REFERENCES couples(id),
-                    idea_id INTEGER REFERENCES ideas(id),
-                    proposer_id INTEGER REFERENCES users(id),
-                    date_status VARCHAR(20) DEFAULT 'pending',
-                    scheduled_date TIMESTAMP,
-                    completed_date TIMESTAMP,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            
-            # Populate initial ideas if table is empty
-            count = await conn.fetchval('SELECT COUNT(*) FROM ideas')
-            if count == 0:
-                await self.populate_initial_ideas(conn)
-    
-    async def populate_initial_ideas(self, conn):
-        """Populate initial date ideas"""
-        initial_ideas = [
-            ("Романтический ужин при свечах", "Приготовьте ужин дома при свечах с любимой музыкой", "романтика"),
-            ("Прогулка в парке", "Неспешная прогулка по красивому парку или скверу", "активность"),
-            ("Домашний кинотеатр", "Посмотрите фильм дома с попкорном и уютной атмосферой", "дом"),
-            ("Посещение музея", "Сходите в местный музей или галерею", "культура"),
-            ("Пикник на природе", "Организуйте пикник в живописном месте", "активность"),
-            ("Кулинарный мастер-класс дома", "Готовьте новое блюдо вместе", "дом"),
-            ("Концерт или театр", "Сходите на живое выступление", "культура"),
-            ("Спа-день дома", "Устройте релаксирующий день дома с масками и массажем", "релакс"),
-            ("Фотосессия", "Сделайте красивые фотографии друг друга", "творчество"),
-            ("Ужин в ресторане", "Попробуйте новую кухню в хорошем ресторане", "ресторан"),
-            ("Настольные игры", "Проведите вечер за любимыми настольными играми", "дом"),
-            ("Велопрогулка", "Покатайтесь на велосипедах по городу или парку", "активность"),
-            ("Кулинарные эксперименты", "Попробуйте приготовить блюдо новой кухни", "дом"),
-            ("Танцевальный вечер", "Устройте танцы дома под любимую музыку", "романтика"),
-            ("Книжный клуб на двоих", "Читайте одну книгу и обсуждайте", "культура"),
-            ("Йога вместе", "Занимайтесь йогой или медитацией", "релакс")
-        ]
-        
-        for title, description, category in initial_ideas:
-            await conn.execute(
-                "INSERT INTO ideas (title, description, category) VALUES ($1, $2, $3)",
-                title, description, category
+        """Create or upgrade database tables by applying pending migrations"""
+        async with self.pool_monitor.acquire(self.pool) as conn:
+            await run_migrations(self, conn)
+            self._trigram_search = await conn.fetchval(
+                "SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')"
             )
     
+    async def listen_date_events(self, callback: DateEventCallback):
+        """Call ``callback`` for every date event from any process, over one shared LISTEN connection"""
+        self._date_event_listeners.append(callback)
+        if self._listener is None and self._listener_task is None:
+            await self._open_listener()
+    
+    async def _open_listener(self):
+        conn = await asyncpg.connect(settings.DATABASE_URL)
+        await conn.add_listener(DATE_EVENTS_CHANNEL, self._on_date_event)
+        await conn.add_listener(COUPLE_CHANGES_CHANNEL, self._on_couple_change)
+        conn.add_termination_listener(self._on_listener_lost)
+        self._listener = conn
+    
+    def _on_date_event(self, conn: asyncpg.Connection, pid: int, channel: str, payload: str):
+        notification = json.loads(payload)
+        for callback in self._date_event_listeners:
+            callback(notification)
+    
+    def _on_couple_change(self, conn: asyncpg.Connection, pid: int, channel: str, payload: str):
+        # Joins made by this process arrive here too, invalidating twice is harmless
+        change = json.loads(payload)
+        self.couple_cache.invalidate(change['id'], user_ids=change['user_ids'])
+    
+    def _on_listener_lost(self, conn: asyncpg.Connection):
+        self._listener = None
+        if not self._closing:
+            logger.warning("LISTEN connection lost, reconnecting")
+            self._listener_task = asyncio.create_task(self._reopen_listener())
+    
+    async def _reopen_listener(self):
+        delay = LISTENER_RETRY_DELAY
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self._open_listener()
+                break
+            except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as e:
+                logger.warning("Re-opening the LISTEN connection failed: %s", e)
+                delay = min(delay * 2, LISTENER_MAX_RETRY_DELAY)
+        self._listener_task = None
+        # Couple changes made while the connection was down were not heard
+        self.couple_cache.clear()
+        for callback in self._date_event_listeners:
+            callback(RESYNC_NOTIFICATION)
+    
     #* Users
-    async def create_user(self, telegram_id: int, name: str, username: str = None) -> Optional[Dict[str, Any]]:
+    @writes
+    async def create_user(self, telegram_id: int, name: str, username: str = None,
+                          conn: Optional[asyncpg.Connection] = None) -> Optional[Dict[str, Any]]:
         """Create a new user"""
-        async with self.pool.acquire() as conn:
+        async with self.connection(conn) as conn:
             try:
-                user_id = await conn.fetchval(
-                    "INSERT INTO users (telegram_id, name, username) VALUES ($1, $2, $3) RETURNING id",
+                row = await conn.fetchrow(
+                    "INSERT INTO users (telegram_id, name, username) VALUES ($1, $2, $3) RETURNING *",
                     telegram_id, name, username
                 )
-                return await self.get_user_by_id(user_id)
+                return dict(row)
             except asyncpg.UniqueViolationError:
                 return None
     
-    async def get_user_by_id(self, user_id: int) -> Optional[Dict[str, Any]]:
+    async def get_user_by_id(self, user_id: int, conn: Optional[asyncpg.Connection] = None) -> Optional[Dict[str, Any]]:
         """Get user by ID"""
-        async with self.pool.acquire() as conn:
+        async with self.read_connection(conn) as conn:
             row = await conn.fetchrow(
-                "SELECT * FROM users WHERE id = $1",
+                SELECT_USER_BY_ID,
                 user_id
             )
             return dict(row) if row else None
     
-    async def get_user_by_telegram_id(self, telegram_id: int) -> Optional[Dict[str, Any]]:
+    async def get_user_by_telegram_id(self, telegram_id: int,
+                                      conn: Optional[asyncpg.Connection] = None) -> Optional[Dict[str, Any]]:
         """Get user by Telegram ID"""
-        async with self.pool.acquire() as conn:
+        async with self.read_connection(conn) as conn:
             row = await conn.fetchrow(
-                "SELECT * FROM users WHERE telegram_id = $1",
+                SELECT_USER_BY_TELEGRAM_ID,
                 telegram_id
             )
             return dict(row) if row else None
     
-    async def get_all_users(self) -> List[Dict[str, Any]]:
-        """Get all users"""
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch("SELECT * FROM users ORDER BY created_at DESC")
+    async def get_users_batch(self, ids: List[int] = None, telegram_ids: List[int] = None,
+                              conn: Optional[asyncpg.Connection] = None) -> List[Dict[str, Any]]:
+        """Get all users matching any of the given IDs or Telegram IDs in one query"""
+        async with self.read_connection(conn) as conn:
+            rows = await conn.fetch(
+                "SELECT * FROM users WHERE id = ANY($1::int[]) OR telegram_id = ANY($2::bigint[])",
+                ids or [], telegram_ids or []
+            )
             return [dict(row) for row in rows]
     
+    async def get_all_users(self, limit: int = None, after: Keyset = None,
+                            conn: Optional[asyncpg.Connection] = None) -> List[Dict[str, Any]]:
+        """Get users, newest first, optionally a keyset page of them"""
+        async with self.read_connection(conn) as conn:
+            query = "SELECT * FROM users"
+            params = []
+            
+            if after:
+                query += " WHERE (created_at, id) < ($1, $2)"
+                params.extend(after)
+            
+            query += " ORDER BY created_at DESC, id DESC"
+            
+            if limit:
+                params.append(limit)
+                query += f" LIMIT ${len(params)}"
+            
+            rows = await conn.fetch(query, *params)
+            return [dict(row) for row in rows]
+    
+    def stream_users(self, chunk_size: int = 1000) -> AsyncIterator[List[asyncpg.Record]]:
+        """Stream all users in id order"""
+        return self.stream("SELECT * FROM users ORDER BY id", chunk_size=chunk_size)
+    
     #* Couples
     def generate_invite_code(self) -> str:
         """Generate a unique invite code"""
         return ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
     
-    async def create_couple(self, user_id: int) -> Optional[Dict[str, Any]]:
-        """Create a new couple and return the invite code"""
-        async with self.pool.acquire() as conn:
+    @writes
+    async def create_couple(self, user_id: int, invite_code: str = None,
+                            conn: Optional[asyncpg.Connection] = None) -> Optional[Dict[str, Any]]:
+        """Create a new couple and return the invite code.
+
+        The code is claimed from the invite code reservoir, or ``invite_code`` is
+        used if it was reserved beforehand with reserve_invite_code.
+        """
+        async with self.connection(conn) as conn:
             # Check if user is already in a couple
             existing_couple = await conn.fetchrow(
-                "SELECT * FROM couples WHERE user1_id = $1 OR user2_id = $1",
+                SELECT_COUPLE_BY_USER_ID,
                 user_id
             )
             if existing_couple:
                 return None
             
-            invite_code = self.generate_invite_code()
-            # Ensure unique invite code
-            while await conn.fetchval("SELECT id FROM couples WHERE invite_code = $1", invite_code):
-                invite_code = self.generate_invite_code()
-            
-            couple_id = await conn.fetchval(
-                "INSERT INTO couples (user1_id, invite_code) VALUES ($1, $2) RETURNING id",
-                user_id, invite_code
+            couple = await self._insert_couple(conn, user_id, invite_code)
+            self.couple_cache.invalidate(user_ids=[user_id])
+            return couple
+    
+    async def _insert_couple(self, conn: asyncpg.Connection, user_id: int,
+                             invite_code: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Insert a couple for ``user_id`` with a reserved, pooled or freshly generated code"""
+        if invite_code:
+            row = await conn.fetchrow(CLAIM_RESERVED_INVITE_CODE, user_id, invite_code)
+            return dict(row) if row else None
+        
+        for _ in range(INVITE_CODE_CLAIM_ATTEMPTS):
+            try:
+                # Savepoint: a failed attempt must not abort a transaction the caller passed in
+                async with conn.transaction():
+                    row = await conn.fetchrow(CLAIM_INVITE_CODE, user_id)
+            except asyncpg.UniqueViolationError:
+                # A fallback-generated code got there first, drop it and try the next one
+                continue
+            if row:
+                return dict(row)
+            break
+        
+        # Reservoir is empty: generate a code in place and let the unique index arbitrate
+        while True:
+            row = await conn.fetchrow(
+                """
+                INSERT INTO couples (user1_id, invite_code)
+                SELECT $1, $2::varchar WHERE NOT EXISTS (SELECT 1 FROM invite_codes WHERE code = $2::varchar)
+                ON CONFLICT (invite_code) DO NOTHING
+                RETURNING *
+                """,
+                user_id, self.generate_invite_code()
             )
-            return await self.get_couple_by_id(couple_id)
+            if row:
+                return dict(row)
     
-    async def join_couple(self, user_id: int, invite_code: str) -> Optional[Dict[str, Any]]:
-        """Join an existing couple using invite code"""
-        async with self.pool.acquire() as conn:
-            # Check if user is already in a couple
-            existing_couple = await conn.fetchrow(
-                "SELECT * FROM couples WHERE user1_id = $1 OR user2_id = $1",
-                user_id
+    @writes
+    async def join_couple(self, user_id: int, invite_code: str,
+                          conn: Optional[asyncpg.Connection] = None) -> Tuple[Optional[Dict[str, Any]], JoinStatus]:
+        """Join an existing couple using invite code.
+
+        Runs as a single conditional UPDATE, so concurrent joins with the same
+        code cannot both succeed. Returns the couple (None on failure) and why.
+        """
+        async with self.connection(conn) as conn:
+            row = await conn.fetchrow(JOIN_COUPLE, user_id, invite_code)
+            join_status = JoinStatus(row['join_status'])
+            if join_status != JoinStatus.joined:
+                return None, join_status
+            couple = dict(row)
+            del couple['join_status']
+            self.couple_cache.invalidate(couple['id'], user_ids=[couple['user1_id'], user_id])
+            return couple, join_status
+    
+    @writes
+    async def reserve_invite_code(self, conn: Optional[asyncpg.Connection] = None) -> Optional[str]:
+        """Take a code out of the reservoir for a couple to be created with later"""
+        async with self.connection(conn) as conn:
+            return await conn.fetchval(
+                """
+                UPDATE invite_codes SET reserved_at = CURRENT_TIMESTAMP
+                WHERE code = (
+                    SELECT code FROM invite_codes WHERE reserved_at IS NULL
+                    LIMIT 1 FOR UPDATE SKIP LOCKED
+                )
+                RETURNING code
+                """
             )
-            if existing_couple:
-                return None
-            
-            # Check if invite code exists and couple is not full
-            couple = await conn.fetchrow(
-                "SELECT * FROM couples WHERE invite_code = $1 AND user2_id IS NULL",
-                invite_code
+    
+    async def count_available_invite_codes(self, conn: Optional[asyncpg.Connection] = None) -> int:
+        """Count unreserved codes left in the reservoir"""
+        async with self.connection(conn) as conn:
+            return await conn.fetchval("SELECT COUNT(*) FROM invite_codes WHERE reserved_at IS NULL")
+    
+    @writes
+    async def refill_invite_codes(self, count: int, conn: Optional[asyncpg.Connection] = None) -> int:
+        """Add up to ``count`` fresh codes to the reservoir and return how many were added"""
+        codes = list({self.generate_invite_code() for _ in range(count)})
+        async with self.connection(conn) as conn:
+            result = await conn.execute(
+                """
+                INSERT INTO invite_codes (code)
+                SELECT c FROM unnest($1::varchar[]) c
+                WHERE NOT EXISTS (SELECT 1 FROM couples WHERE invite_code = c)
+                ON CONFLICT DO NOTHING
+                """,
+                codes
             )
-            if not couple or couple['user1_id'] == user_id:
-                return None
-            
-            await conn.execute(
-                "UPDATE couples SET user2_id = $1 WHERE invite_code = $2",
-                user_id, invite_code
+            return int(result.split()[-1])
+    
+    @writes
+    async def expire_invite_code_reservations(self, max_age: float,
+                                              conn: Optional[asyncpg.Connection] = None) -> int:
+        """Drop codes reserved more than ``max_age`` seconds ago and never used"""
+        async with self.connection(conn) as conn:
+            result = await conn.execute(
+                "DELETE FROM invite_codes WHERE reserved_at < CURRENT_TIMESTAMP - make_interval(secs => $1)",
+                max_age
             )
-            return await self.get_couple_by_id(couple['id'])
+            return int(result.split()[-1])
     
-    async def get_couple_by_id(self, couple_id: int) -> Optional[Dict[str, Any]]:
-        """Get couple by ID"""
-        async with self.pool.acquire() as conn:
+    async def get_couple_by_id(self, couple_id: int, conn: Optional[asyncpg.Connection] = None) -> Optional[Dict[str, Any]]:
+        """Get couple by ID, served from the couple cache when possible"""
+        couple = self.couple_cache.get_by_id(couple_id)
+        if couple:
+            return couple
+        
+        generation = self.couple_cache.generation
+        # Cache fills read from the primary: a lagging replica could put a
+        # couple back that a join has just invalidated
+        async with self.connection(conn) as conn:
             row = await conn.fetchrow(
-                "SELECT * FROM couples WHERE id = $1",
+                SELECT_COUPLE_BY_ID,
                 couple_id
             )
-            return dict(row) if row else None
+            if not row:
+                return None
+            couple = dict(row)
+            self.couple_cache.put(couple, generation)
+            return couple
     
-    async def get_couple_by_user_id(self, user_id: int) -> Optional[Dict[str, Any]]:
-        """Get couple by user ID"""
-        async with self.pool.acquire() as conn:
+    async def get_couple_by_user_id(self, user_id: int,
+                                    conn: Optional[asyncpg.Connection] = None) -> Optional[Dict[str, Any]]:
+        """Get couple by user ID, served from the couple cache when possible"""
+        couple = self.couple_cache.get_by_user(user_id)
+        if couple:
+            return couple
+        
+        generation = self.couple_cache.generation
+        async with self.connection(conn) as conn:
             row = await conn.fetchrow(
-                "SELECT * FROM couples WHERE user1_id = $1 OR user2_id = $1",
-            user_id
-        )
-        return dict(row) if row else None
+                SELECT_COUPLE_BY_USER_ID,
+                user_id
+            )
+            if not row:
+                return None
+            couple = dict(row)
+            self.couple_cache.put(couple, generation)
+            return couple
     
     #* Ideas
-    async def create_idea(self, title: str, description: str, category: str) -> Optional[Dict[str, Any]]:
+    @writes
+    async def create_idea(self, title: str, description: str, category: str,
+                          conn: Optional[asyncpg.Connection] = None) -> Optional[Dict[str, Any]]:
         """Create a new idea"""
-        async with self.pool.acquire() as conn:
-            idea_id = await conn.fetchval(
-                "INSERT INTO ideas (title, description, category) VALUES ($1, $2, $3) RETURNING id",
+        async with self.connection(conn) as conn:
+            row = await conn.fetchrow(
+                "INSERT INTO ideas (title, description, category) VALUES ($1, $2, $3) RETURNING *",
                 title, description, category
             )
-            return await self.get_idea_by_id(idea_id)
+            self.ideas_cache.invalidate()
+            return dict(row)
+    
+    @writes
+    async def bulk_create_ideas(self, ideas: List[Tuple[str, Optional[str], str]],
+                                conn: Optional[asyncpg.Connection] = None) -> Tuple[int, List[str]]:
+        """Insert (title, description, category) rows, skipping titles that already exist.
+
+        Returns the number of ideas created and the titles skipped as duplicates,
+        either of an existing idea or of an earlier row in the same batch.
+        """
+        async with self.connection(conn) as conn:
+            async with conn.transaction():
+                # Serialize concurrent imports so their duplicate checks see each other
+                await conn.execute("SELECT pg_advisory_xact_lock(hashtext('ideas_bulk_import'))")
+                existing = set(await conn.fetchval(
+                    "SELECT COALESCE(array_agg(title), '{}') FROM ideas WHERE title = ANY($1::varchar[])",
+                    list({title for title, _, _ in ideas})
+                ))
+                
+                records = []
+                duplicates = []
+                for title, description, category in ideas:
+                    if title in existing:
+                        duplicates.append(title)
+                        continue
+                    existing.add(title)
+                    records.append((title, description, category))
+                
+                if len(records) >= BULK_COPY_THRESHOLD:
+                    await conn.copy_records_to_table(
+                        "ideas", records=records, columns=["title", "description", "category"]
+                    )
+                elif records:
+                    await conn.executemany(
+                        "INSERT INTO ideas (title, description, category) VALUES ($1, $2, $3)",
+                        records
+                    )
+            
+            if records:
+                self.ideas_cache.invalidate()
+            return len(records), duplicates
     
-    async def get_idea_by_id(self, idea_id: int) -> Optional[Dict[str, Any]]:
+    async def get_idea_by_id(self, idea_id: int, conn: Optional[asyncpg.Connection] = None) -> Optional[Dict[str, Any]]:
         """Get idea by ID"""
-        async with self.pool.acquire() as conn:
+        async with self.read_connection(conn) as conn:
             row = await conn.fetchrow(
-                "SELECT * FROM ideas WHERE id = $1",
+                SELECT_IDEA_BY_ID,
                 idea_id
             )
             return dict(row) if row else None
     
-    async def get_all_ideas(self) -> List[Dict[str, Any]]:
-        """Get all active ideas"""
-        async with self.pool.acquire() as conn:
+    async def get_ideas_catalog(self) -> Tuple[Sequence[Mapping[str, Any]], str]:
+        """Get all active ideas with the catalog ETag, served from the in-process cache"""
+        return await self.ideas_cache.get(self._fetch_active_ideas)
+    
+    async def get_ideas_page(self, limit: int, after: Keyset = None) -> Tuple[List[Dict[str, Any]], str]:
+        """Get a keyset page of active ideas, newest first, with the ETag of the page"""
+        async with self.read_connection() as conn:
+            if after:
+                rows = await conn.fetch(SELECT_ACTIVE_IDEAS_PAGE_AFTER, *after, limit)
+            else:
+                rows = await conn.fetch(SELECT_ACTIVE_IDEAS_PAGE, limit)
+            page = [dict(row) for row in rows]
+            return page, compute_etag(page)
+    
+    async def _fetch_active_ideas(self) -> List[Dict[str, Any]]:
+        """Load all active ideas from the primary, so a catalog cached after a write includes it"""
+        async with self.connection() as conn:
             rows = await conn.fetch(
-                "SELECT * FROM ideas WHERE is_active = TRUE ORDER BY created_at DESC"
+                SELECT_ACTIVE_IDEAS
             )
             return [dict(row) for row in rows]
     
+    async def search_ideas(self, query: str, category: str = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """Search active ideas by Russian full text (every word as a prefix) and title trigrams"""
+        words = tokenize(query)
+        if not words:
+            return []
+        # Short queries match too many words for the database index to help
+        if len(query.strip()) <= settings.IDEA_SEARCH_LOCAL_MAX_LENGTH:
+            return await super().search_ideas(query, category, limit)
+        
+        # Words are \w+ only, so quoting them is enough to keep tsquery syntax out
+        tsquery = " & ".join(f"'{word}':*" for word in words)
+        async with self.read_connection() as conn:
+            if self._trigram_search:
+                rows = await conn.fetch(SEARCH_IDEAS_FUZZY, tsquery, category, limit, query)
+            else:
+                rows = await conn.fetch(SEARCH_IDEAS_FULL_TEXT, tsquery, category, limit)
+            return [dict(row) for row in rows]
+    
+    @writes
     async def update_idea(self, idea_id: int, title: str = None, description: str = None, 
-                         category: str = None, is_active: bool = None) -> Optional[Dict[str, Any]]:
+                         category: str = None, is_active: bool = None,
+                         conn: Optional[asyncpg.Connection] = None) -> Optional[Dict[str, Any]]:
         """Update an idea"""
-        async with self.pool.acquire() as conn:
+        async with self.connection(conn) as conn:
             updates = []
             values = []
             param_count = 1
@@ -271,97 +988,229 @@ class Database:
                 param_count += 1
             
             if not updates:
-                return await self.get_idea_by_id(idea_id)
+                return await self.get_idea_by_id(idea_id, conn=conn)
             
             values.append(idea_id)
-            query = f"UPDATE ideas SET {', '.join(updates)} WHERE id = ${param_count} RETURNING id"
+            query = f"UPDATE ideas SET {', '.join(updates)} WHERE id = ${param_count} RETURNING *"
             
-            updated_id = await conn.fetchval(query, *values)
-            return await self.get_idea_by_id(updated_id) if updated_id else None
+            row = await conn.fetchrow(query, *values)
+            if not row:
+                return None
+            self.ideas_cache.invalidate()
+            return dict(row)
     
-    async def delete_idea(self, idea_id: int) -> bool:
+    @writes
+    async def delete_idea(self, idea_id: int, conn: Optional[asyncpg.Connection] = None) -> bool:
         """Delete an idea"""
-        async with self.pool.acquire() as conn:
+        async with self.connection(conn) as conn:
             result = await conn.execute(
                 "DELETE FROM ideas WHERE id = $1",
                 idea_id
             )
-            return result != "DELETE 0"
+            if result != "DELETE 0":
+                self.ideas_cache.invalidate()
+                return True
+            return False
     
     #* Date/Events
-    async def create_date_proposal(self, couple_id: int, idea_id: int, proposer_id: int) -> Optional[Dict[str, Any]]:
-        """Create a date proposal"""
-        async with self.pool.acquire() as conn:
-            event_id = await conn.fetchval(
-                "INSERT INTO date_events (couple_id, idea_id, proposer_id) VALUES ($1, $2, $3) RETURNING id",
-                couple_id, idea_id, proposer_id
-            )
-            return await self.get_date_event_by_id(event_id)
-    
-    async def respond_to_date_proposal(self, event_id: int, response: str) -> Optional[Dict[str, Any]]:
-        """Respond to a date proposal"""
-        async with self.pool.acquire() as conn:
-            updated_id = await conn.fetchval(
-                "UPDATE date_events SET date_status = $1 WHERE id = $2 AND date_status = 'pending' RETURNING id",
-                response, event_id
-            )
-            return await self.get_date_event_by_id(updated_id) if updated_id else None
+    @writes
+    async def create_date_proposal(self, couple_id: int, idea_id: int, proposer_id: int,
+                                   conn: Optional[asyncpg.Connection] = None) -> Tuple[Optional[Dict[str, Any]], ProposalStatus]:
+        """Create a date proposal.
+
+        Couple and idea existence, idea activity and proposer membership are all
+        checked by the insert statement itself. Returns the enriched event (None
+        on failure) and the outcome.
+        """
+        async with self.connection(conn) as conn:
+            row = await conn.fetchrow(CREATE_DATE_PROPOSAL, couple_id, idea_id, proposer_id)
+            return _split_outcome(row)
+    
+    @writes
+    async def respond_to_date_proposal(self, event_id: int, response: str, user_id: int,
+                                       conn: Optional[asyncpg.Connection] = None) -> Tuple[Optional[Dict[str, Any]], ProposalStatus]:
+        """Respond to a date proposal on behalf of ``user_id``.
+
+        The update only applies to a pending event of the user's couple that
+        someone else proposed. Returns the enriched event (None on failure) and
+        the outcome.
+        """
+        async with self.connection(conn) as conn:
+            row = await conn.fetchrow(RESPOND_TO_DATE_PROPOSAL, event_id, response, user_id)
+            return _split_outcome(row)
         
-    async def get_proposals_for_user(self, couple_id: int, user_id: int, status: str = None) -> List[Dict[str, Any]]:
+    @writes
+    async def schedule_date(self, event_id: int, user_id: int, scheduled_date: datetime,
+                            conn: Optional[asyncpg.Connection] = None) -> Tuple[Optional[Dict[str, Any]], ProposalStatus]:
+        """Set when an accepted date takes place and re-arm its reminder"""
+        async with self.connection(conn) as conn:
+            row = await conn.fetchrow(SCHEDULE_DATE, event_id, user_id, scheduled_date)
+            return _split_outcome(row)
+    
+    @writes
+    async def complete_date(self, event_id: int, user_id: int,
+                            conn: Optional[asyncpg.Connection] = None) -> Tuple[Optional[Dict[str, Any]], ProposalStatus]:
+        """Mark an accepted date completed as of now"""
+        async with self.connection(conn) as conn:
+            row = await conn.fetchrow(COMPLETE_DATE, event_id, user_id)
+            return _split_outcome(row)
+    
+    @writes
+    async def claim_due_reminders(self, lead_time: float, limit: int,
+                                  conn: Optional[asyncpg.Connection] = None) -> List[Dict[str, Any]]:
+        """Claim up to ``limit`` accepted dates scheduled within ``lead_time`` seconds, soonest first"""
+        async with self.connection(conn) as conn:
+            rows = await conn.fetch(CLAIM_DUE_REMINDERS, lead_time, limit)
+            return [dict(row) for row in rows]
+    
+    async def next_reminder_at(self, conn: Optional[asyncpg.Connection] = None) -> Optional[datetime]:
+        """The earliest scheduled_date of an accepted date whose reminder is still to be sent"""
+        # On the primary: a lagging replica would miss a date scheduled just now
+        async with self.connection(conn) as conn:
+            return await conn.fetchval(SELECT_NEXT_REMINDER_AT)
+    
+    async def get_proposals_for_user(self, couple_id: int, user_id: int, status: str = None,
+                                     limit: int = None, after: Keyset = None,
+                                     conn: Optional[asyncpg.Connection] = None) -> List[Dict[str, Any]]:
         """Get proposals that user can respond to"""
-        async with self.pool.acquire() as conn:
-            query = """
-            SELECT de.*, i.title as idea_title, i.description as idea_description,
-                u.name as proposer_name
-            FROM date_events de
-            JOIN ideas i ON de.idea_id = i.id
-            JOIN users u ON de.proposer_id = u.id
+        async with self.read_connection(conn) as conn:
+            query = DATE_EVENT_SELECT.format(source="date_events") + """
             WHERE de.couple_id = $1 AND de.proposer_id != $2
             """
             params = [couple_id, user_id]
             
             if status:
-                query += " AND de.date_status = $3"
                 params.append(status)
+                query += f" AND de.date_status = ${len(params)}"
+            
+            if after:
+                params.extend(after)
+                query += f" AND (de.created_at, de.id) < (${len(params) - 1}, ${len(params)})"
             
-            query += " ORDER BY de.created_at DESC"
+            query += " ORDER BY de.created_at DESC, de.id DESC"
+            
+            if limit:
+                params.append(limit)
+                query += f" LIMIT ${len(params)}"
             
             rows = await conn.fetch(query, *params)
             return [dict(row) for row in rows]
     
-    async def get_date_event_by_id(self, event_id: int) -> Optional[Dict[str, Any]]:
+    async def get_date_event_by_id(self, event_id: int,
+                                   conn: Optional[asyncpg.Connection] = None) -> Optional[Dict[str, Any]]:
         """Get date event by ID"""
-        async with self.pool.acquire() as conn:
+        async with self.read_connection(conn) as conn:
             row = await conn.fetchrow(
-                """
-                SELECT de.*, i.title as idea_title, i.description as idea_description,
-                       u.name as proposer_name
-                FROM date_events de
-                JOIN ideas i ON de.idea_id = i.id
-                JOIN users u ON de.proposer_id = u.id
-                WHERE de.id = $1
-                """,
+                SELECT_DATE_EVENT_BY_ID,
                 event_id
             )
             return dict(row) if row else None
     
-    async def get_date_history(self, couple_id: int, limit: int = 10) -> List[Dict[str, Any]]:
-        """Get date history for a couple"""
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch(
-                """
-                SELECT de.*, i.title as idea_title, i.description as idea_description,
-                       u.name as proposer_name
-                FROM date_events de
-                JOIN ideas i ON de.idea_id = i.id
-                JOIN users u ON de.proposer_id = u.id
-                WHERE de.couple_id = $1
-                ORDER BY de.created_at DESC
-                LIMIT $2
-                """,
-                couple_id, limit
-            )
+    def stream_date_events(self, chunk_size: int = 1000) -> AsyncIterator[List[asyncpg.Record]]:
+        """Stream all date events with idea and proposer fields, in id order"""
+        return self.stream(
+            DATE_EVENT_SELECT.format(source="date_events") + " ORDER BY de.id",
+            chunk_size=chunk_size
+        )
+    
+    async def get_date_history(self, couple_id: int, limit: int = 10, after: Keyset = None,
+                               conn: Optional[asyncpg.Connection] = None) -> List[Dict[str, Any]]:
+        """Get date history for a couple, newest first, continuing after the ``after`` keyset"""
+        async with self.read_connection(conn) as conn:
+            query = DATE_EVENT_SELECT.format(source="date_events") + """
+            WHERE de.couple_id = $1
+            """
+            params = [couple_id]
+            
+            if after:
+                params.extend(after)
+                query += " AND (de.created_at, de.id) < ($2, $3)"
+            
+            params.append(limit)
+            query += f" ORDER BY de.created_at DESC, de.id DESC LIMIT ${len(params)}"
+            
+            rows = await conn.fetch(query, *params)
             return [dict(row) for row in rows]
+    
+    #* Stats
+    async def get_couple_stats(self, couple_id: int, conn: Optional[asyncpg.Connection] = None) -> Optional[Dict[str, Any]]:
+        """Get the couple's date statistics, None if it has no date events yet"""
+        async with self.read_connection(conn) as conn:
+            row = await conn.fetchrow("SELECT * FROM couple_stats WHERE couple_id = $1", couple_id)
+            if not row:
+                return None
+            stats = dict(row)
+            stats['categories'] = json.loads(stats['categories'])
+            return stats
+    
+    @writes
+    async def rebuild_couple_stats(self, couple_id: int = None,
+                                   conn: Optional[asyncpg.Connection] = None) -> int:
+        """Recompute couple_stats from date_events for one couple, or every couple; returns couples written"""
+        async with self.connection(conn) as conn:
+            async with conn.transaction():
+                # Holds off the stats trigger, so no event is both rebuilt and applied on top
+                await conn.execute("LOCK TABLE couple_stats IN SHARE ROW EXCLUSIVE MODE")
+                await conn.execute("DELETE FROM couple_stats WHERE $1::int IS NULL OR couple_id = $1", couple_id)
+                result = await conn.execute(REBUILD_COUPLE_STATS, couple_id)
+                return int(result.split()[-1])
+    
+    async def check_couple_stats(self, couple_id: int = None,
+                                 conn: Optional[asyncpg.Connection] = None) -> List[Dict[str, Any]]:
+        """Couples whose couple_stats differ from date_events, with ``expected`` and ``actual`` rows"""
+        async with self.connection(conn) as conn:
+            rows = await conn.fetch(CHECK_COUPLE_STATS, couple_id)
+            return [{
+                'couple_id': row['couple_id'],
+                'expected': json.loads(row['expected']) if row['expected'] else None,
+                'actual': json.loads(row['actual']) if row['actual'] else None,
+            } for row in rows]
+
+    
+    #* Idempotency keys
+    async def claim_idempotency_key(self, key: str, fingerprint: str, ttl: float, lock_timeout: float,
+                                    conn: Optional[asyncpg.Connection] = None) -> Dict[str, Any]:
+        """Take ``key`` for a first request, see CLAIM_IDEMPOTENCY_KEY.
+
+        Returns ``claimed`` and, when not claimed, the stored ``fingerprint``,
+        ``status_code`` (None while in progress), ``headers`` and ``body``.
+        """
+        # Not @writes: called before the request is routed, and must not pin its reads to the primary
+        async with self.connection(conn) as conn:
+            row = dict(await conn.fetchrow(CLAIM_IDEMPOTENCY_KEY, key, fingerprint, ttl, lock_timeout))
+            if row['headers'] is not None:
+                row['headers'] = json.loads(row['headers'])
+            return row
+    
+    async def save_idempotent_response(self, key: str, status_code: int, headers: List[List[str]], body: bytes,
+                                       conn: Optional[asyncpg.Connection] = None):
+        """Store the response of the request that claimed ``key``"""
+        async with self.connection(conn) as conn:
+            await conn.execute(
+                "UPDATE idempotency_keys SET status_code = $2, headers = $3, body = $4 WHERE key = $1",
+                key, status_code, json.dumps(headers), body
+            )
+    
+    async def release_idempotency_key(self, key: str, conn: Optional[asyncpg.Connection] = None):
+        """Give up a claimed key without a response, so a retry runs again"""
+        async with self.connection(conn) as conn:
+            await conn.execute("DELETE FROM idempotency_keys WHERE key = $1 AND status_code IS NULL", key)
+    
+    async def purge_idempotency_keys(self, ttl: float, conn: Optional[asyncpg.Connection] = None) -> int:
+        """Delete keys taken more than ``ttl`` seconds ago, return how many"""
+        async with self.connection(conn) as conn:
+            result = await conn.execute(
+                "DELETE FROM idempotency_keys WHERE created_at < CURRENT_TIMESTAMP - make_interval(secs => $1)",
+                ttl
+            )
+            return int(result.split()[-1])
+
 
+if settings.METRICS_ENABLED:
+    # Lifecycle methods run once at startup and would only add noise
+    Database = instrument_queries(exclude=(
+        "connect", "disconnect", "init_db", "create_tables", "warm_up", "populate_initial_ideas",
+        "listen_date_events"
+    ))(Database)
 
 db = Database()
\ No newline at end of file
@@ -0,0 +1,36 @@
+from app.config import settings
+from app.database import Database, db
+from app.storage.base import Storage
+from app.storage.memory import InMemoryStorage
+from app.utils.idempotency import IdempotencyStore, InMemoryIdempotencyStore, PostgresIdempotencyStore
+
+
+def create_storage(backend: str) -> Storage:
+    """Build the storage backend named by ``backend`` ("postgres" or "memory")"""
+    if backend == "postgres":
+        return db
+    if backend == "memory":
+        return InMemoryStorage()
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+storage = create_storage(settings.STORAGE_BACKEND)
+
+
+def create_idempotency_store(kind: str, storage: Storage) -> IdempotencyStore:
+    """Build the idempotency key store named by ``kind`` ("memory" or "postgres")"""
+    if kind == "memory":
+        return InMemoryIdempotencyStore()
+    if kind == "postgres":
+        if not isinstance(storage, Database):
+            raise ValueError("IDEMPOTENCY_STORE=postgres needs the postgres storage backend")
+        return PostgresIdempotencyStore(storage)
+    raise ValueError(f"Unknown idempotency store: {kind}")
+
+
+idempotency_store = create_idempotency_store(settings.IDEMPOTENCY_STORE, storage)
+
+
+def get_db() -> Storage:
+    """FastAPI dependency returning the configured storage backend"""
+    return storage
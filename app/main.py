@@ -3,17 +3,44 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from app.config import settings
-from app.database import db
-from app.routers import auth, users, couples, ideas, dates
+from app.dependencies import idempotency_store, storage
+from app.routers import auth, users, couples, ideas, dates, session, export, internal, metrics
+from app.services.date_events import date_event_broker
+from app.services.invite_codes import InviteCodeRefiller
+from app.services.recommendations import recommender
+from app.services.reminders import ReminderScheduler
+from app.utils.idempotency import IdempotencyMiddleware
+from app.utils.metrics import MetricsMiddleware
+from app.utils.replicas import ReadYourWritesMiddleware
+
+
+# POST endpoints the bot calls again when Telegram redelivers an update
+IDEMPOTENT_PATHS = [
+    settings.API_V1_STR + path
+    for path in ("/auth/register", "/couples/", "/couples/code", "/couples/join", "/dates/proposal", "/dates/respond")
+]
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    await db.init_db()
+    await storage.init_db()
+    await storage.listen_date_events(date_event_broker.publish)
+    await storage.listen_date_events(recommender.on_date_event)
+    invite_code_refiller = InviteCodeRefiller(storage)
+    invite_code_refiller.start()
+    reminder_scheduler = ReminderScheduler(storage)
+    if settings.REMINDER_SCHEDULER_ENABLED:
+        await storage.listen_date_events(reminder_scheduler.on_date_event)
+        reminder_scheduler.start()
+    if settings.IDEMPOTENCY_ENABLED:
+        idempotency_store.start()
     yield
     # Shutdown
-    await db.disconnect()
+    await idempotency_store.stop()
+    await reminder_scheduler.stop()
+    await invite_code_refiller.stop()
+    await storage.disconnect()
 
 
 app = FastAPI(
@@ -31,12 +58,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if settings.IDEMPOTENCY_ENABLED:
+    app.add_middleware(IdempotencyMiddleware, store=idempotency_store, paths=IDEMPOTENT_PATHS)
+
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+if settings.DATABASE_REPLICA_URLS:
+    app.add_middleware(ReadYourWritesMiddleware)
+
 # Include routers
 app.include_router(auth.router, prefix=settings.API_V1_STR)
 app.include_router(users.router, prefix=settings.API_V1_STR)
 app.include_router(couples.router, prefix=settings.API_V1_STR)
 app.include_router(ideas.router, prefix=settings.API_V1_STR)
 app.include_router(dates.router, prefix=settings.API_V1_STR)
+app.include_router(session.router, prefix=settings.API_V1_STR)
+app.include_router(export.router, prefix=settings.API_V1_STR)
+app.include_router(internal.router, prefix=settings.API_V1_STR)
+if settings.METRICS_ENABLED:
+    app.include_router(metrics.router)
 
 
 @app.get("/")
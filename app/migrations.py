@@ -0,0 +1,455 @@
+import asyncpg
+import logging
+from dataclasses import dataclass
+from typing import Optional, List, Callable, Awaitable, Any
+
+
+# Arbitrary key for pg_advisory_xact_lock so that concurrently starting workers
+# do not apply the same migration twice
+MIGRATIONS_LOCK_ID = 720_410_001
+
+logger = logging.getLogger(__name__)
+
+# Weighted full-text document of an idea. Migration 7 indexes this exact
+# expression, so search queries must spell it the same way to use the index.
+IDEA_SEARCH_DOCUMENT = """(
+    setweight(to_tsvector('russian', title), 'A') ||
+    setweight(to_tsvector('russian', coalesce(description, '')), 'B') ||
+    setweight(to_tsvector('russian', category), 'C')
+)"""
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    sql: Optional[str] = None
+    # Called as apply(db, conn) for steps that need more than plain SQL
+    apply: Optional[Callable[[Any, asyncpg.Connection], Awaitable[None]]] = None
+
+
+async def _seed_initial_ideas(db, conn: asyncpg.Connection):
+    # Databases created before migrations existed may already be seeded
+    count = await conn.fetchval('SELECT COUNT(*) FROM ideas')
+    if count == 0:
+        await db.populate_initial_ideas(conn)
+
+
+async def _create_trigram_index(db, conn: asyncpg.Connection):
+    # pg_trgm ships with the contrib package, which not every server has;
+    # without it search still works, only without typo tolerance. A missing
+    # package is FeatureNotSupportedError on PostgreSQL 15+ and
+    # UndefinedFileError (no control file) on older servers.
+    try:
+        async with conn.transaction():
+            await conn.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    except (asyncpg.FeatureNotSupportedError, asyncpg.UndefinedFileError,
+            asyncpg.InsufficientPrivilegeError) as e:
+        logger.warning("pg_trgm is not available, idea search will not match misspelled titles: %s", e)
+        return
+    await conn.execute(
+        'CREATE INDEX IF NOT EXISTS idx_ideas_title_trgm ON ideas '
+        'USING GIN (title gin_trgm_ops) WHERE is_active = TRUE'
+    )
+
+
+async def _backfill_couple_stats(db, conn: asyncpg.Connection):
+    await db.rebuild_couple_stats(conn=conn)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(
+        version=1,
+        description="initial schema",
+        sql='''
+            CREATE TABLE IF NOT EXISTS users (
+                id SERIAL PRIMARY KEY,
+                telegram_id BIGINT UNIQUE NOT NULL,
+                name VARCHAR(255) NOT NULL,
+                username VARCHAR(255),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+
+            CREATE TABLE IF NOT EXISTS couples (
+                id SERIAL PRIMARY KEY,
+                user1_id INTEGER REFERENCES users(id),
+                user2_id INTEGER REFERENCES users(id),
+                invite_code VARCHAR(6) UNIQUE NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+
+            CREATE TABLE IF NOT EXISTS ideas (
+                id SERIAL PRIMARY KEY,
+                title VARCHAR(255) NOT NULL,
+                description TEXT,
+                category VARCHAR(100) NOT NULL,
+                is_active BOOLEAN DEFAULT TRUE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+
+            CREATE TABLE IF NOT EXISTS date_events (
+                id SERIAL PRIMARY KEY,
+                couple_id INTEGER REFERENCES couples(id),
+                idea_id INTEGER REFERENCES ideas(id),
+                proposer_id INTEGER REFERENCES users(id),
+                date_status VARCHAR(20) DEFAULT 'pending',
+                scheduled_date TIMESTAMP,
+                completed_date TIMESTAMP,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        ''',
+    ),
+    Migration(
+        version=2,
+        description="seed initial ideas",
+        apply=_seed_initial_ideas,
+    ),
+    Migration(
+        version=3,
+        description="indexes for couple membership, date history and active ideas",
+        sql='''
+            -- get_couple_by_user_id: WHERE user1_id = $1 OR user2_id = $1 (BitmapOr of both)
+            CREATE INDEX IF NOT EXISTS idx_couples_user1_id ON couples (user1_id);
+            CREATE INDEX IF NOT EXISTS idx_couples_user2_id ON couples (user2_id);
+
+            -- get_date_history / get_proposals_for_user: WHERE couple_id = $1 ORDER BY created_at DESC
+            CREATE INDEX IF NOT EXISTS idx_date_events_couple_created
+                ON date_events (couple_id, created_at DESC);
+
+            -- get_all_ideas: WHERE is_active = TRUE ORDER BY created_at DESC
+            CREATE INDEX IF NOT EXISTS idx_ideas_active_created
+                ON ideas (created_at DESC) WHERE is_active = TRUE;
+        ''',
+    ),
+    Migration(
+        version=4,
+        description="keyset pagination indexes on (created_at, id)",
+        sql='''
+            CREATE INDEX IF NOT EXISTS idx_users_created_id ON users (created_at DESC, id DESC);
+
+            -- Supersede the migration 3 indexes, the id tie-breaker makes them usable for keysets
+            CREATE INDEX IF NOT EXISTS idx_date_events_couple_created_id
+                ON date_events (couple_id, created_at DESC, id DESC);
+            DROP INDEX IF EXISTS idx_date_events_couple_created;
+
+            CREATE INDEX IF NOT EXISTS idx_ideas_active_created_id
+                ON ideas (created_at DESC, id DESC) WHERE is_active = TRUE;
+            DROP INDEX IF EXISTS idx_ideas_active_created;
+        ''',
+    ),
+    Migration(
+        version=5,
+        description="pre-generated invite code reservoir",
+        sql='''
+            -- Unused invite codes; rows are deleted when a couple claims them.
+            -- reserved_at is set when a code has been handed out ahead of couple creation.
+            CREATE TABLE IF NOT EXISTS invite_codes (
+                code VARCHAR(6) PRIMARY KEY,
+                reserved_at TIMESTAMP,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_invite_codes_unreserved
+                ON invite_codes (code) WHERE reserved_at IS NULL;
+        ''',
+    ),
+    Migration(
+        version=6,
+        description="notify listeners when a date is proposed or answered",
+        sql='''
+            -- Delivered on commit to every connection that ran LISTEN date_events.
+            -- The payload stays small: subscribers that need the joined fields fetch the event.
+            CREATE OR REPLACE FUNCTION notify_date_event() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'UPDATE' AND OLD.date_status IS NOT DISTINCT FROM NEW.date_status THEN
+                    RETURN NULL;
+                END IF;
+                PERFORM pg_notify('date_events', json_build_object(
+                    'event', CASE TG_OP WHEN 'INSERT' THEN 'proposal' ELSE 'response' END,
+                    'id', NEW.id,
+                    'couple_id', NEW.couple_id,
+                    'idea_id', NEW.idea_id,
+                    'proposer_id', NEW.proposer_id,
+                    'date_status', NEW.date_status
+                )::text);
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            DROP TRIGGER IF EXISTS date_events_notify ON date_events;
+            CREATE TRIGGER date_events_notify
+                AFTER INSERT OR UPDATE OF date_status ON date_events
+                FOR EACH ROW EXECUTE FUNCTION notify_date_event();
+        ''',
+    ),
+    Migration(
+        version=7,
+        description="full-text and trigram indexes for idea search",
+        sql=f'''
+            -- search_ideas: WHERE is_active = TRUE AND <document> @@ <tsquery>
+            CREATE INDEX IF NOT EXISTS idx_ideas_search
+                ON ideas USING GIN ({IDEA_SEARCH_DOCUMENT}) WHERE is_active = TRUE;
+        ''',
+        apply=_create_trigram_index,
+    ),
+    Migration(
+        version=8,
+        description="per-couple date statistics maintained by trigger",
+        sql='''
+            -- Set when a proposal is answered; streaks are counted by the week of the answer
+            ALTER TABLE date_events ADD COLUMN IF NOT EXISTS responded_at TIMESTAMP;
+
+            -- The idea's category when the date was proposed. couple_stats count
+            -- dates by it, so recategorising an idea does not move its past dates
+            -- and rebuild_couple_stats agrees with the trigger.
+            ALTER TABLE date_events ADD COLUMN IF NOT EXISTS idea_category VARCHAR(100);
+            UPDATE date_events de SET idea_category = i.category
+            FROM ideas i
+            WHERE i.id = de.idea_id AND de.idea_category IS NULL;
+            ALTER TABLE date_events ALTER COLUMN idea_category SET NOT NULL;
+
+            -- CREATE_DATE_PROPOSAL sets it; other inserts take the idea's current category
+            CREATE OR REPLACE FUNCTION set_date_event_category() RETURNS trigger AS $$
+            BEGIN
+                IF NEW.idea_category IS NULL THEN
+                    SELECT category INTO NEW.idea_category FROM ideas WHERE id = NEW.idea_id;
+                END IF;
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            DROP TRIGGER IF EXISTS date_events_category ON date_events;
+            CREATE TRIGGER date_events_category
+                BEFORE INSERT ON date_events
+                FOR EACH ROW EXECUTE FUNCTION set_date_event_category();
+
+            -- One row per couple with at least one date event. ``categories`` counts
+            -- accepted and completed dates per idea category; streaks are runs of
+            -- consecutive weeks (Monday to Sunday) with an accepted or completed date.
+            CREATE TABLE IF NOT EXISTS couple_stats (
+                couple_id INTEGER PRIMARY KEY REFERENCES couples(id),
+                proposed INTEGER NOT NULL DEFAULT 0,
+                pending INTEGER NOT NULL DEFAULT 0,
+                accepted INTEGER NOT NULL DEFAULT 0,
+                declined INTEGER NOT NULL DEFAULT 0,
+                completed INTEGER NOT NULL DEFAULT 0,
+                categories JSONB NOT NULL DEFAULT '{}',
+                last_date_at TIMESTAMP,
+                last_date_week DATE,
+                current_streak_weeks INTEGER NOT NULL DEFAULT 0,
+                longest_streak_weeks INTEGER NOT NULL DEFAULT 0
+            );
+
+            -- Runs in the transaction of the statement that proposed or answered the
+            -- date, so the stats commit or roll back together with the event.
+            -- Streaks assume answers arrive in week order, which holds since
+            -- responded_at is the time of the answer; an answer back-dated into an
+            -- earlier week is not counted until rebuild_couple_stats recomputes them.
+            CREATE OR REPLACE FUNCTION apply_couple_stats() RETURNS trigger AS $$
+            DECLARE
+                old_status TEXT := CASE TG_OP WHEN 'UPDATE' THEN coalesce(OLD.date_status, '') ELSE '' END;
+                new_status TEXT := coalesce(NEW.date_status, '');
+                was_done BOOLEAN := old_status IN ('accepted', 'completed');
+                is_done BOOLEAN := new_status IN ('accepted', 'completed');
+                done_at TIMESTAMP := coalesce(NEW.responded_at, NEW.created_at);
+                week DATE := date_trunc('week', done_at)::date;
+                dates INTEGER;
+                s couple_stats%ROWTYPE;
+            BEGIN
+                IF TG_OP = 'UPDATE' AND old_status = new_status THEN
+                    RETURN NULL;
+                END IF;
+
+                INSERT INTO couple_stats (couple_id) VALUES (NEW.couple_id) ON CONFLICT (couple_id) DO NOTHING;
+                SELECT * INTO s FROM couple_stats WHERE couple_id = NEW.couple_id FOR UPDATE;
+
+                s.proposed := s.proposed + (TG_OP = 'INSERT')::int;
+                s.pending := s.pending + (new_status = 'pending')::int - (old_status = 'pending')::int;
+                s.accepted := s.accepted + (new_status = 'accepted')::int - (old_status = 'accepted')::int;
+                s.declined := s.declined + (new_status IN ('rejected', 'declined'))::int
+                                         - (old_status IN ('rejected', 'declined'))::int;
+                s.completed := s.completed + (new_status = 'completed')::int - (old_status = 'completed')::int;
+
+                IF is_done <> was_done THEN
+                    dates := coalesce((s.categories ->> NEW.idea_category)::int, 0) + CASE WHEN is_done THEN 1 ELSE -1 END;
+                    s.categories := CASE WHEN dates > 0
+                        THEN jsonb_set(s.categories, ARRAY[NEW.idea_category], to_jsonb(dates))
+                        ELSE s.categories - NEW.idea_category END;
+                END IF;
+
+                IF is_done AND NOT was_done THEN
+                    IF s.last_date_week IS NULL OR week > s.last_date_week + 7 THEN
+                        s.current_streak_weeks := 1;
+                    ELSIF week = s.last_date_week + 7 THEN
+                        s.current_streak_weeks := s.current_streak_weeks + 1;
+                    END IF;
+                    s.longest_streak_weeks := greatest(s.longest_streak_weeks, s.current_streak_weeks);
+                    s.last_date_week := greatest(s.last_date_week, week);
+                    s.last_date_at := greatest(s.last_date_at, done_at);
+                END IF;
+
+                UPDATE couple_stats SET
+                    proposed = s.proposed, pending = s.pending, accepted = s.accepted,
+                    declined = s.declined, completed = s.completed, categories = s.categories,
+                    last_date_at = s.last_date_at, last_date_week = s.last_date_week,
+                    current_streak_weeks = s.current_streak_weeks,
+                    longest_streak_weeks = s.longest_streak_weeks
+                WHERE couple_id = NEW.couple_id;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            DROP TRIGGER IF EXISTS date_events_couple_stats ON date_events;
+            CREATE TRIGGER date_events_couple_stats
+                AFTER INSERT OR UPDATE OF date_status ON date_events
+                FOR EACH ROW EXECUTE FUNCTION apply_couple_stats();
+        ''',
+        apply=_backfill_couple_stats,
+    ),
+    Migration(
+        version=9,
+        description="date reminders: claim index and scheduled/reminder notifications",
+        sql='''
+            -- Set when the reminder for scheduled_date has been claimed (and so sent);
+            -- rescheduling clears it
+            ALTER TABLE date_events ADD COLUMN IF NOT EXISTS reminded_at TIMESTAMP;
+
+            -- claim_due_reminders / next_reminder_at: accepted dates still to be
+            -- reminded of, soonest first. Stays as small as the reminders pending.
+            CREATE INDEX IF NOT EXISTS idx_date_events_reminders
+                ON date_events (scheduled_date)
+                WHERE reminded_at IS NULL AND scheduled_date IS NOT NULL AND date_status = 'accepted';
+
+            -- Supersedes migration 6: also notifies when a date is scheduled, when its
+            -- reminder is claimed and when it is completed, and sends scheduled_date
+            CREATE OR REPLACE FUNCTION notify_date_event() RETURNS trigger AS $$
+            DECLARE
+                kind TEXT;
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    kind := 'proposal';
+                ELSIF OLD.date_status IS DISTINCT FROM NEW.date_status THEN
+                    -- Besides answers, the API only moves accepted dates to completed
+                    kind := CASE WHEN OLD.date_status = 'pending' THEN 'response' ELSE 'completed' END;
+                ELSIF OLD.reminded_at IS NULL AND NEW.reminded_at IS NOT NULL THEN
+                    kind := 'reminder';
+                ELSIF OLD.scheduled_date IS DISTINCT FROM NEW.scheduled_date THEN
+                    kind := 'scheduled';
+                ELSE
+                    RETURN NULL;
+                END IF;
+                PERFORM pg_notify('date_events', json_build_object(
+                    'event', kind,
+                    'id', NEW.id,
+                    'couple_id', NEW.couple_id,
+                    'idea_id', NEW.idea_id,
+                    'proposer_id', NEW.proposer_id,
+                    'date_status', NEW.date_status,
+                    'scheduled_date', NEW.scheduled_date
+                )::text);
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            DROP TRIGGER IF EXISTS date_events_notify ON date_events;
+            CREATE TRIGGER date_events_notify
+                AFTER INSERT OR UPDATE OF date_status, scheduled_date, reminded_at ON date_events
+                FOR EACH ROW EXECUTE FUNCTION notify_date_event();
+        ''',
+    ),
+    Migration(
+        version=10,
+        description="idempotency keys shared by every worker",
+        sql='''
+            -- Responses to POST requests sent with an Idempotency-Key header, when
+            -- IDEMPOTENCY_STORE=postgres; status_code is NULL while the first
+            -- request with the key is still being handled
+            CREATE TABLE IF NOT EXISTS idempotency_keys (
+                key TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                status_code INTEGER,
+                headers JSONB,
+                body BYTEA,
+                created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            );
+
+            -- purge_idempotency_keys
+            CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created_at ON idempotency_keys (created_at);
+        ''',
+    ),
+    Migration(
+        version=11,
+        description="notify workers when couple membership changes",
+        sql='''
+            -- Every worker caches couples; LISTEN couple_changes lets a join made in one
+            -- worker drop the cached couple in the others. New couples need no notice,
+            -- only couples that exist are cached.
+            CREATE OR REPLACE FUNCTION notify_couple_change() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'UPDATE' AND OLD.user1_id IS NOT DISTINCT FROM NEW.user1_id
+                        AND OLD.user2_id IS NOT DISTINCT FROM NEW.user2_id THEN
+                    RETURN NULL;
+                END IF;
+                PERFORM pg_notify('couple_changes', json_build_object(
+                    'id', OLD.id,
+                    'user_ids', CASE TG_OP
+                        WHEN 'DELETE' THEN json_build_array(OLD.user1_id, OLD.user2_id)
+                        ELSE json_build_array(OLD.user1_id, OLD.user2_id, NEW.user1_id, NEW.user2_id)
+                    END
+                )::text);
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+
+            DROP TRIGGER IF EXISTS couples_notify ON couples;
+            CREATE TRIGGER couples_notify
+                AFTER UPDATE OF user1_id, user2_id OR DELETE ON couples
+                FOR EACH ROW EXECUTE FUNCTION notify_couple_change();
+        ''',
+    ),
+]
+
+
+async def get_schema_version(conn: asyncpg.Connection) -> int:
+    """Return the latest applied migration version, 0 for a fresh database"""
+    exists = await conn.fetchval("SELECT to_regclass('schema_version') IS NOT NULL")
+    if not exists:
+        return 0
+    return await conn.fetchval('SELECT COALESCE(MAX(version), 0) FROM schema_version')
+
+
+async def run_migrations(db, conn: asyncpg.Connection, migrations: List[Migration] = MIGRATIONS) -> List[int]:
+    """Apply pending migrations in order and return the versions applied"""
+    latest = max(m.version for m in migrations)
+    # Fast path: nothing to do, no locks and no DDL
+    if await get_schema_version(conn) >= latest:
+        return []
+
+    applied = []
+    async with conn.transaction():
+        await conn.execute('SELECT pg_advisory_xact_lock($1)', MIGRATIONS_LOCK_ID)
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        # Re-read under the lock, another worker may have migrated meanwhile
+        current = await get_schema_version(conn)
+
+        for migration in sorted(migrations, key=lambda m: m.version):
+            if migration.version <= current:
+                continue
+            if migration.sql:
+                await conn.execute(migration.sql)
+            if migration.apply:
+                await migration.apply(db, conn)
+            await conn.execute(
+                'INSERT INTO schema_version (version, description) VALUES ($1, $2)',
+                migration.version, migration.description
+            )
+            applied.append(migration.version)
+
+    return applied
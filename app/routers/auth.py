@@ -1,12 +1,14 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
 from app.schemas.user import UserCreate, UserResponse
-from app.database import db
+from app.dependencies import get_db
+from app.storage.base import Storage
+from app.utils.serialization import model_response
 
 router = APIRouter(prefix="/auth", tags=["Registration"])
 
 
 @router.post("/register", response_model=UserResponse)
-async def register_user(user_data: UserCreate):
+async def register_user(user_data: UserCreate, db: Storage = Depends(get_db)):
     """Register a new user"""
     user = await db.create_user(
         telegram_id=user_data.telegram_id,
@@ -20,4 +22,4 @@ async def register_user(user_data: UserCreate):
             detail="User with this telegram_id already exists"
         )
     
-    return UserResponse(**user)
\ No newline at end of file
+    return model_response(UserResponse, user)
\ No newline at end of file
@@ -1,36 +1,46 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
 from app.schemas.couple import CoupleCreate, CoupleJoin, CoupleResponse
-from app.database import db
+from app.dependencies import get_db
+from app.storage.base import Storage, JoinStatus
+from app.utils.serialization import model_response
 
 router = APIRouter(prefix="/couples", tags=["couples"])
 
+JOIN_ERRORS = {
+    JoinStatus.invalid_code: "Invalid invite code",
+    JoinStatus.own_couple: "Cannot join your own couple",
+    JoinStatus.already_in_couple: "User is already in a couple",
+    JoinStatus.couple_full: "Couple already has two members",
+}
+
 
 @router.post("/", response_model=CoupleResponse)
-async def create_couple(couple_data: CoupleCreate):
+async def create_couple(couple_data: CoupleCreate, db: Storage = Depends(get_db)):
     """Create a new couple"""
-    couple = await db.create_couple(couple_data.user_id)
+    couple = await db.create_couple(couple_data.user_id, couple_data.invite_code)
     if not couple:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="User is already in a couple"
+            detail="User is already in a couple" if not couple_data.invite_code
+            else "User is already in a couple or invite code is not reserved"
         )
-    return CoupleResponse(**couple)
+    return model_response(CoupleResponse, couple)
 
 
 @router.post("/join", response_model=CoupleResponse)
-async def join_couple(join_data: CoupleJoin):
+async def join_couple(join_data: CoupleJoin, db: Storage = Depends(get_db)):
     """Join an existing couple"""
-    couple = await db.join_couple(join_data.user_id, join_data.invite_code)
+    couple, join_status = await db.join_couple(join_data.user_id, join_data.invite_code)
     if not couple:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid invite code or user already in a couple"
+            detail=JOIN_ERRORS[join_status]
         )
-    return CoupleResponse(**couple)
+    return model_response(CoupleResponse, couple)
 
 
 @router.get("/{couple_id}", response_model=CoupleResponse)
-async def get_couple(couple_id: int):
+async def get_couple(couple_id: int, db: Storage = Depends(get_db)):
     """Get couple information"""
     couple = await db.get_couple_by_id(couple_id)
     if not couple:
@@ -38,18 +48,23 @@ async def get_couple(couple_id: int):
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Couple not found"
         )
-    return CoupleResponse(**couple)
+    return model_response(CoupleResponse, couple)
 
 
-@router.get("/code/{invite_code}", response_model=dict)
-async def generate_couple_code():
-    """Generate a new couple invite code"""
-    code = db.generate_invite_code()
+@router.post("/code", response_model=dict)
+async def generate_couple_code(db: Storage = Depends(get_db)):
+    """Reserve an invite code to create a couple with"""
+    code = await db.reserve_invite_code()
+    if not code:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="No invite codes available, try again shortly"
+        )
     return {"invite_code": code}
 
 
 @router.get("/user/{user_id}", response_model=CoupleResponse)
-async def get_couple_by_user_id(user_id: int):
+async def get_couple_by_user_id(user_id: int, db: Storage = Depends(get_db)):
     """Get couple by user ID"""
     couple = await db.get_couple_by_user_id(user_id)
     if not couple:
@@ -57,4 +72,4 @@ async def get_couple_by_user_id(user_id: int):
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Couple not found"
         )
-    return CoupleResponse(**couple)
\ No newline at end of file
+    return model_response(CoupleResponse, couple)
\ No newline at end of file
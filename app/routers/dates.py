@@ -1,76 +1,150 @@
-from fastapi import APIRouter, HTTPException, status
-from typing import List
-from app.schemas.date_event import DateEventCreate, DateEventResponse, DateEventUpdate
-from app.database import db
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
+from datetime import timezone
+from typing import List, Optional
+from app.schemas.date_event import (
+    DateEventCreate, DateEventResponse, DateEventUpdate, DateResponse, DateSchedule, CoupleStatsResponse
+)
+from app.dependencies import get_db
+from app.services.couple_stats import summarize
+from app.services.date_events import date_event_broker, sse_stream
+from app.services.reminders import utcnow
+from app.storage.base import Storage, ProposalStatus
+from app.utils.pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, decode_cursor, paginate
+)
+from app.utils.serialization import model_response
 
 router = APIRouter(prefix="/dates", tags=["dates"])
 
+PROPOSAL_ERRORS = {
+    ProposalStatus.couple_not_found: (status.HTTP_404_NOT_FOUND, "Couple not found"),
+    ProposalStatus.idea_not_found: (status.HTTP_404_NOT_FOUND, "Idea not found"),
+    ProposalStatus.idea_inactive: (status.HTTP_400_BAD_REQUEST, "Idea is not active"),
+    ProposalStatus.not_member: (status.HTTP_403_FORBIDDEN, "User is not part of this couple"),
+}
+
+RESPONSE_ERRORS = {
+    ProposalStatus.event_not_found: (status.HTTP_404_NOT_FOUND, "Event not found"),
+    ProposalStatus.not_member: (status.HTTP_403_FORBIDDEN, "Not authorized"),
+    ProposalStatus.own_proposal: (status.HTTP_400_BAD_REQUEST, "Cannot respond to own proposal"),
+    ProposalStatus.not_pending: (status.HTTP_400_BAD_REQUEST, "Proposal has already been answered"),
+}
+
+DATE_ERRORS = {
+    ProposalStatus.event_not_found: (status.HTTP_404_NOT_FOUND, "Event not found"),
+    ProposalStatus.not_member: (status.HTTP_403_FORBIDDEN, "Not authorized"),
+    ProposalStatus.not_accepted: (status.HTTP_400_BAD_REQUEST, "Date has not been accepted"),
+}
+
 
 @router.post("/proposal", response_model=DateEventResponse)
-async def create_date_proposal(proposal_data: DateEventCreate):
+async def create_date_proposal(proposal_data: DateEventCreate, db: Storage = Depends(get_db)):
     """Create a date proposal"""
-    # Verify that the couple exists
-    couple = await db.get_couple_by_id(proposal_data.couple_id)
-    if not couple:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Couple not found"
-        )
-    
-    # Verify that the idea exists
-    idea = await db.get_idea_by_id(proposal_data.idea_id)
-    if not idea:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Idea not found"
-        )
-    
-    # Verify that the proposer is part of the couple
-    if proposal_data.proposer_id not in [couple['user1_id'], couple['user2_id']]:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="User is not part of this couple"
-        )
-    
-    date_event = await db.create_date_proposal(
+    date_event, outcome = await db.create_date_proposal(
         couple_id=proposal_data.couple_id,
         idea_id=proposal_data.idea_id,
         proposer_id=proposal_data.proposer_id
     )
+    if not date_event:
+        status_code, detail = PROPOSAL_ERRORS[outcome]
+        raise HTTPException(status_code=status_code, detail=detail)
     
-    return DateEventResponse(**date_event)
+    return model_response(DateEventResponse, date_event)
 
 
-@router.post("/respond")
-async def respond_to_date_proposal(event_id: int, response: str, user_id: int):
-    event = await db.get_date_event_by_id(event_id)
-    if not event:
-        raise HTTPException(status_code=404, detail="Event not found")
-    
-    couple = await db.get_couple_by_id(event['couple_id'])
-    if user_id not in [couple['user1_id'], couple['user2_id']]:
-        raise HTTPException(status_code=403, detail="Not authorized")
-    
-    if user_id == event['proposer_id']:
-        raise HTTPException(status_code=400, detail="Cannot respond to own proposal")
-    
-    result = await db.respond_to_date_proposal(event_id, response)
-    return result
+@router.post("/respond", response_model=DateEventResponse)
+async def respond_to_date_proposal(event_id: int, response: DateResponse, user_id: int,
+                                   db: Storage = Depends(get_db)):
+    result, outcome = await db.respond_to_date_proposal(event_id, response.value, user_id)
+    if not result:
+        status_code, detail = RESPONSE_ERRORS[outcome]
+        raise HTTPException(status_code=status_code, detail=detail)
+    return model_response(DateEventResponse, result)
+
+
+@router.post("/{event_id}/schedule", response_model=DateEventResponse)
+async def schedule_date(event_id: int, user_id: int, schedule: DateSchedule,
+                        db: Storage = Depends(get_db)):
+    """Set or move the time of an accepted date; its reminder is sent REMINDER_LEAD_TIME before.
+
+    The reminder is delivered at most once: it is marked sent when claimed
+    and goes out as a ``reminder`` event only to /dates/stream connections
+    open at that moment. A client that was not connected does not get it
+    later and should check its upcoming dates after a ``resync``.
+    """
+    scheduled_date = schedule.scheduled_date
+    if scheduled_date.tzinfo is not None:
+        # Stored as naive UTC, as the reminder claims compare it; naive input is taken as UTC
+        scheduled_date = scheduled_date.astimezone(timezone.utc).replace(tzinfo=None)
+    if scheduled_date <= utcnow():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Scheduled date must be in the future"
+        )
+
+    result, outcome = await db.schedule_date(event_id, user_id, scheduled_date)
+    if not result:
+        status_code, detail = DATE_ERRORS[outcome]
+        raise HTTPException(status_code=status_code, detail=detail)
+    return model_response(DateEventResponse, result)
 
-@router.get("/proposals/{user_id}")
-async def get_user_proposals(user_id: int, status: str = None):
-    """Get proposals for a specific user"""
+
+@router.post("/{event_id}/complete", response_model=DateEventResponse)
+async def complete_date(event_id: int, user_id: int, db: Storage = Depends(get_db)):
+    """Mark an accepted date as completed"""
+    result, outcome = await db.complete_date(event_id, user_id)
+    if not result:
+        status_code, detail = DATE_ERRORS[outcome]
+        raise HTTPException(status_code=status_code, detail=detail)
+    return model_response(DateEventResponse, result)
+
+
+@router.get("/proposals/{user_id}", response_model=List[DateEventResponse])
+async def get_user_proposals(
+    user_id: int,
+    status: str = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: Storage = Depends(get_db)
+):
+    """Get proposals for a specific user, newest first, one page at a time"""
+    try:
+        after = decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    # No shared connection: the couple usually comes from the cache, and the
+    # proposals query can then be served by a read replica
     couple = await db.get_couple_by_user_id(user_id)
     if not couple:
         raise HTTPException(status_code=404, detail="User not in a couple")
     
-    proposals = await db.get_proposals_for_user(couple['id'], user_id, status)
-    return proposals
+    proposals = await db.get_proposals_for_user(
+        couple['id'], user_id, status, limit=limit + 1, after=after
+    )
+    
+    proposals, next_cursor = paginate(proposals, limit)
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return model_response(DateEventResponse, proposals, many=True, headers=headers)
 
 
 @router.get("/history/{couple_id}", response_model=List[DateEventResponse])
-async def get_date_history(couple_id: int, limit: int = 10):
-    """Get date history for a couple"""
+async def get_date_history(
+    couple_id: int,
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: Storage = Depends(get_db)
+):
+    """Get date history for a couple, newest first, one page at a time"""
+    try:
+        after = decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    
     # Verify that the couple exists
     couple = await db.get_couple_by_id(couple_id)
     if not couple:
@@ -79,12 +153,64 @@ async def get_date_history(couple_id: int, limit: int = 10):
             detail="Couple not found"
         )
     
-    history = await db.get_date_history(couple_id, limit)
-    return [DateEventResponse(**event) for event in history]
+    history = await db.get_date_history(couple_id, limit + 1, after)
+    
+    history, next_cursor = paginate(history, limit)
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return model_response(DateEventResponse, history, many=True, headers=headers)
+
+
+@router.get("/stats/{couple_id}", response_model=CoupleStatsResponse)
+async def get_couple_stats(couple_id: int, db: Storage = Depends(get_db)):
+    """Get a couple's date counts, favourite categories and weekly streaks"""
+    couple = await db.get_couple_by_id(couple_id)
+    if not couple:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Couple not found"
+        )
+    
+    stats = await db.get_couple_stats(couple_id)
+    return model_response(CoupleStatsResponse, summarize(couple_id, stats))
+
+
+@router.get("/stream")
+async def stream_date_events(user_id: Optional[int] = None, couple_id: Optional[int] = None,
+                             db: Storage = Depends(get_db)):
+    """Server-Sent Events for dates proposed, answered, scheduled, reminded of and completed.
+
+    Scoped to a whole couple, or to the events a user has to act on. Each
+    event carries the date event id, couple, idea, proposer, status and
+    scheduled date; a ``resync`` event means the client should re-fetch
+    proposals once.
+    """
+    if (user_id is None) == (couple_id is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Pass exactly one of user_id or couple_id"
+        )
+    
+    if user_id is not None:
+        couple = await db.get_couple_by_user_id(user_id)
+        if not couple:
+            raise HTTPException(status_code=404, detail="User not in a couple")
+    else:
+        couple = await db.get_couple_by_id(couple_id)
+        if not couple:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Couple not found"
+            )
+    
+    return StreamingResponse(
+        sse_stream(date_event_broker, couple['id'], user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @router.get("/{event_id}", response_model=DateEventResponse)
-async def get_date_event(event_id: int):
+async def get_date_event(event_id: int, db: Storage = Depends(get_db)):
     """Get specific date event"""
     date_event = await db.get_date_event_by_id(event_id)
     if not date_event:
@@ -92,4 +218,4 @@ async def get_date_event(event_id: int):
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Date event not found"
         )
-    return DateEventResponse(**date_event)
\ No newline at end of file
+    return model_response(DateEventResponse, date_event)
\ No newline at end of file
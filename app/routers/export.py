@@ -0,0 +1,45 @@
+from enum import Enum
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from app.dependencies import get_db
+from app.storage.base import Storage
+from app.utils.export import ndjson_chunks, csv_chunks, NDJSON_MEDIA_TYPE, CSV_MEDIA_TYPE
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+def _export_response(chunks, export_format: ExportFormat, name: str) -> StreamingResponse:
+    if export_format == ExportFormat.csv:
+        body, media_type = csv_chunks(chunks), CSV_MEDIA_TYPE
+    else:
+        body, media_type = ndjson_chunks(chunks), NDJSON_MEDIA_TYPE
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{name}.{export_format.value}"'}
+    )
+
+
+@router.get("/users")
+async def export_users(
+    format: ExportFormat = ExportFormat.ndjson,
+    chunk_size: int = Query(1000, ge=1, le=10000),
+    db: Storage = Depends(get_db)
+):
+    """Stream all users as NDJSON or CSV"""
+    return _export_response(db.stream_users(chunk_size), format, "users")
+
+
+@router.get("/dates")
+async def export_date_events(
+    format: ExportFormat = ExportFormat.ndjson,
+    chunk_size: int = Query(1000, ge=1, le=10000),
+    db: Storage = Depends(get_db)
+):
+    """Stream all date events as NDJSON or CSV"""
+    return _export_response(db.stream_date_events(chunk_size), format, "date_events")
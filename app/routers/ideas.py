@@ -1,31 +1,128 @@
-from fastapi import APIRouter, HTTPException, status
-from typing import List
-from app.schemas.idea import IdeaCreate, IdeaUpdate, IdeaResponse
-from app.database import db
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Query, Request, Response
+from typing import List, Optional
+from app.schemas.idea import (
+    IdeaCreate, IdeaUpdate, IdeaResponse, IdeaImportResult, IdeaRecommendation,
+    IdeaSearchResult
+)
+from app.dependencies import get_db
+from app.storage.base import Storage
+from app.services.idea_import import (
+    parse_ideas, guess_content_type, UnsupportedImportFormat, InvalidImportPayload
+)
+from app.services.recommendations import recommender
+from app.utils.etag import compute_etag, etag_matches
+from app.utils.pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, decode_cursor, paginate
+)
+from app.utils.serialization import model_response
 
 router = APIRouter(prefix="/ideas", tags=["ideas"])
 
 
 @router.get("/", response_model=List[IdeaResponse])
-async def get_all_ideas():
-    """Get all date ideas"""
-    ideas = await db.get_all_ideas()
-    return [IdeaResponse(**idea) for idea in ideas]
+async def get_all_ideas(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: Storage = Depends(get_db)
+):
+    """Get date ideas, newest first, one page at a time"""
+    try:
+        after = decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    
+    # The ETag covers the fetched rows, including the one past the page that
+    # decides the next cursor, so it changes exactly when the response does
+    ideas, etag = await db.get_ideas_page(limit + 1, after)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    
+    ideas, next_cursor = paginate(ideas, limit)
+    headers = {"ETag": etag}
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+    return model_response(IdeaResponse, ideas, many=True, headers=headers)
 
 
 @router.post("/", response_model=IdeaResponse)
-async def create_idea(idea_data: IdeaCreate):
+async def create_idea(idea_data: IdeaCreate, db: Storage = Depends(get_db)):
     """Create a new date idea"""
     idea = await db.create_idea(
         title=idea_data.title,
         description=idea_data.description,
         category=idea_data.category
     )
-    return IdeaResponse(**idea)
+    return model_response(IdeaResponse, idea)
+
+
+@router.post("/import", response_model=IdeaImportResult)
+async def import_ideas(request: Request, db: Storage = Depends(get_db)):
+    """Bulk import ideas from a JSON array, NDJSON or CSV body, or a multipart file upload"""
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Multipart upload must contain a 'file' field"
+            )
+        content = await upload.read()
+        content_type = guess_content_type(upload.filename, upload.content_type)
+    else:
+        content = await request.body()
+    
+    try:
+        rows, errors = parse_ideas(content, content_type)
+    except UnsupportedImportFormat as e:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=str(e)
+        )
+    except InvalidImportPayload as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    created, duplicates = await db.bulk_create_ideas(rows) if rows else (0, [])
+    return IdeaImportResult(created=created, duplicates=duplicates, errors=errors)
+
+
+@router.get("/search", response_model=List[IdeaSearchResult])
+async def search_ideas(
+    q: str = Query(..., min_length=1, max_length=200),
+    category: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    db: Storage = Depends(get_db)
+):
+    """Search active ideas by title, description and category, every word as a prefix"""
+    ideas = await db.search_ideas(q, category=category, limit=limit)
+    return model_response(IdeaSearchResult, ideas, many=True)
+
+
+@router.get("/recommend/{couple_id}", response_model=List[IdeaRecommendation])
+async def recommend_ideas(couple_id: int, limit: int = Query(5, ge=1, le=MAX_PAGE_SIZE),
+                          db: Storage = Depends(get_db)):
+    """Recommend active ideas for a couple, best first, scored on its date history"""
+    couple = await db.get_couple_by_id(couple_id)
+    if not couple:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Couple not found"
+        )
+    
+    ideas = await recommender.recommend(db, couple_id, limit)
+    return model_response(IdeaRecommendation, ideas, many=True)
 
 
 @router.get("/{idea_id}", response_model=IdeaResponse)
-async def get_idea(idea_id: int):
+async def get_idea(idea_id: int, if_none_match: Optional[str] = Header(None),
+                   db: Storage = Depends(get_db)):
     """Get specific idea"""
     idea = await db.get_idea_by_id(idea_id)
     if not idea:
@@ -33,11 +130,16 @@ async def get_idea(idea_id: int):
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Idea not found"
         )
-    return IdeaResponse(**idea)
+    
+    etag = compute_etag(idea)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    
+    return model_response(IdeaResponse, idea, headers={"ETag": etag})
 
 
 @router.patch("/{idea_id}", response_model=IdeaResponse)
-async def update_idea(idea_id: int, idea_data: IdeaUpdate):
+async def update_idea(idea_id: int, idea_data: IdeaUpdate, db: Storage = Depends(get_db)):
     """Update a specific idea"""
     idea = await db.update_idea(
         idea_id=idea_id,
@@ -51,11 +153,11 @@ async def update_idea(idea_id: int, idea_data: IdeaUpdate):
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Idea not found"
         )
-    return IdeaResponse(**idea)
+    return model_response(IdeaResponse, idea)
 
 
 @router.delete("/{idea_id}")
-async def delete_idea(idea_id: int):
+async def delete_idea(idea_id: int, db: Storage = Depends(get_db)):
     """Delete an idea"""
     deleted = await db.delete_idea(idea_id)
     if not deleted:
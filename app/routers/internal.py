@@ -0,0 +1,69 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from app.config import settings
+from app.database import Database
+from app.dependencies import get_db
+from app.services.date_events import date_event_broker
+from app.services.recommendations import recommender
+from app.storage.base import Storage
+
+router = APIRouter(prefix="/internal", tags=["internal"])
+
+
+def get_postgres_db(db: Storage = Depends(get_db)) -> Database:
+    """The storage backend, for endpoints that only make sense with PostgreSQL"""
+    if not isinstance(db, Database):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not available with the configured storage backend"
+        )
+    return db
+
+
+@router.get("/cache")
+async def get_cache_stats(db: Database = Depends(get_postgres_db)):
+    """Get hit/miss counters of the in-process caches"""
+    return {
+        "ideas": db.ideas_cache.stats(),
+        "couples": db.couple_cache.stats(),
+        "recommendations": recommender.stats(),
+    }
+
+
+@router.get("/pool")
+async def get_pool_stats(db: Database = Depends(get_postgres_db)):
+    """Get connection pool size, idle/busy connections and acquire wait percentiles, plus replica health"""
+    return {
+        **db.pool_monitor.stats(db.pool),
+        "replicas": db.replicas.stats(),
+        "replica_fallbacks": db.replicas.fallbacks,
+    }
+
+
+@router.get("/couple-stats/check")
+async def check_couple_stats(couple_id: int = None, db: Storage = Depends(get_db)):
+    """Get couples whose maintained date stats differ from their date history"""
+    mismatches = await db.check_couple_stats(couple_id)
+    return {"inconsistent": len(mismatches), "couples": mismatches}
+
+
+@router.get("/date-events")
+async def get_date_event_stats():
+    """Get open date event streams and notification counters"""
+    return date_event_broker.stats()
+
+
+@router.get("/slow-queries")
+async def get_slow_queries(limit: int = Query(50, ge=1, le=1000), db: Database = Depends(get_postgres_db)):
+    """Get the most recent statements over the slow query threshold, with sampled plans"""
+    return {
+        "enabled": settings.SLOW_QUERY_LOG_ENABLED,
+        **db.slow_queries.stats(),
+        "queries": db.slow_queries.recent(limit),
+    }
+
+
+@router.delete("/slow-queries")
+async def clear_slow_queries(db: Database = Depends(get_postgres_db)):
+    """Empty the slow query ring"""
+    db.slow_queries.clear()
+    return {"message": "Slow query log cleared"}
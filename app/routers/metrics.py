@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+from app.utils.metrics import registry, PROMETHEUS_MEDIA_TYPE
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Request and database latency metrics of this worker in Prometheus text format"""
+    return Response(content=registry.render(), media_type=PROMETHEUS_MEDIA_TYPE)
@@ -0,0 +1,40 @@
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from app.schemas.session import SessionResponse
+from app.dependencies import get_db
+from app.storage.base import Storage
+from app.utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.utils.serialization import model_response
+
+router = APIRouter(prefix="/session", tags=["session"])
+
+
+@router.get("/{telegram_id}", response_model=SessionResponse)
+async def get_session(
+    telegram_id: int,
+    proposals_limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    history_limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
+    db: Storage = Depends(get_db)
+):
+    """Get the user, their couple, pending proposals to answer and recent history in one call.
+
+    Replaces calling /users/telegram, /couples/user, /dates/proposals and
+    /dates/history in turn: the couple usually comes from the cache, and
+    the two date queries run concurrently.
+    """
+    user = await db.get_user_by_telegram_id(telegram_id)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    
+    session = {"user": user}
+    couple = await db.get_couple_by_user_id(user['id'])
+    if couple:
+        session["couple"] = couple
+        session["pending_proposals"], session["history"] = await asyncio.gather(
+            db.get_proposals_for_user(couple['id'], user['id'], "pending", limit=proposals_limit),
+            db.get_date_history(couple['id'], history_limit)
+        )
+    return model_response(SessionResponse, session)
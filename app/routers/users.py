@@ -1,18 +1,50 @@
-from fastapi import APIRouter, HTTPException, status
-from typing import List
-from app.schemas.user import UserResponse
-from app.database import db
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from typing import List, Optional
+from app.schemas.user import UserResponse, UserBatchRequest, UserBatchResponse
+from app.dependencies import get_db
+from app.storage.base import Storage
+from app.utils.pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, decode_cursor, paginate
+)
+from app.utils.serialization import model_response
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 @router.get("/", response_model=List[UserResponse])
-async def get_all_users():
-    """Get all registered users"""
-    users = await db.get_all_users()
-    return [UserResponse(**user) for user in users]
+async def get_all_users(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: Storage = Depends(get_db)
+):
+    """Get registered users, newest first, one page at a time"""
+    try:
+        after = decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    
+    users, next_cursor = paginate(await db.get_all_users(limit + 1, after), limit)
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return model_response(UserResponse, users, many=True, headers=headers)
+
+@router.post("/batch", response_model=UserBatchResponse)
+async def get_users_batch(batch: UserBatchRequest, db: Storage = Depends(get_db)):
+    """Resolve many users by internal ID and/or Telegram ID at once"""
+    users = await db.get_users_batch(batch.ids, batch.telegram_ids)
+    
+    by_id = {user['id']: user for user in users}
+    by_telegram_id = {user['telegram_id']: user for user in users}
+    return model_response(UserBatchResponse, {
+        "by_id": {i: by_id[i] for i in batch.ids if i in by_id},
+        "by_telegram_id": {t: by_telegram_id[t] for t in batch.telegram_ids if t in by_telegram_id},
+        "missing_ids": [i for i in dict.fromkeys(batch.ids) if i not in by_id],
+        "missing_telegram_ids": [t for t in dict.fromkeys(batch.telegram_ids) if t not in by_telegram_id],
+    })
 
 @router.get("/telegram/{telegram_id}", response_model=UserResponse)
-async def get_user_by_telegram_id(telegram_id: int):
+async def get_user_by_telegram_id(telegram_id: int, db: Storage = Depends(get_db)):
     """Get user by Telegram ID"""
     user = await db.get_user_by_telegram_id(telegram_id)
     if not user:
@@ -20,10 +52,10 @@ async def get_user_by_telegram_id(telegram_id: int):
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
-    return UserResponse(**user)
+    return model_response(UserResponse, user)
 
 @router.get("/{user_id}", response_model=UserResponse)
-async def get_user(user_id: int):
+async def get_user(user_id: int, db: Storage = Depends(get_db)):
     """Get user by ID"""
     user = await db.get_user_by_id(user_id)
     if not user:
@@ -31,4 +63,4 @@ async def get_user(user_id: int):
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
-    return UserResponse(**user)
\ No newline at end of file
+    return model_response(UserResponse, user)
\ No newline at end of file
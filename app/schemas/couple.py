@@ -9,6 +9,8 @@ class CoupleBase(BaseModel):
 
 class CoupleCreate(BaseModel):
     user_id: int
+    # Code previously obtained from POST /couples/code, otherwise one is allocated
+    invite_code: Optional[str] = None
 
 
 class CoupleJoin(BaseModel):
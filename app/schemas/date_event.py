@@ -1,6 +1,7 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
+from enum import Enum
 
 
 class DateEventBase(BaseModel):
@@ -13,6 +14,13 @@ class DateEventCreate(DateEventBase):
     pass
 
 
+class DateResponse(str, Enum):
+    """Answers to a pending proposal, stored as its date_status"""
+    accepted = "accepted"
+    rejected = "rejected"
+    declined = "declined"
+
+
 class DateEventResponse(BaseModel):
     id: int
     couple_id: int
@@ -22,6 +30,7 @@ class DateEventResponse(BaseModel):
     scheduled_date: Optional[datetime] = None
     completed_date: Optional[datetime] = None
     created_at: datetime
+    responded_at: Optional[datetime] = None
     idea_title: Optional[str] = None
     idea_description: Optional[str] = None
     proposer_name: Optional[str] = None
@@ -33,4 +42,29 @@ class DateEventResponse(BaseModel):
 class DateEventUpdate(BaseModel):
     date_status: Optional[str] = None
     scheduled_date: Optional[datetime] = None
-    completed_date: Optional[datetime] = None
\ No newline at end of file
+    completed_date: Optional[datetime] = None
+
+
+class DateSchedule(BaseModel):
+    # With a UTC offset, or naive UTC
+    scheduled_date: datetime
+
+
+class CategoryCount(BaseModel):
+    category: str
+    dates: int
+
+
+class CoupleStatsResponse(BaseModel):
+    couple_id: int
+    proposed: int = 0
+    pending: int = 0
+    accepted: int = 0
+    declined: int = 0
+    completed: int = 0
+    # Categories of the most accepted and completed dates, most first
+    favourite_categories: List[CategoryCount] = []
+    # Consecutive weeks with an accepted or completed date, up to this or last week
+    current_streak_weeks: int = 0
+    longest_streak_weeks: int = 0
+    last_date_at: Optional[datetime] = None
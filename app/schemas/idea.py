@@ -1,12 +1,12 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import Optional, List
 from datetime import datetime
 
 
 class IdeaBase(BaseModel):
-    title: str
+    title: str = Field(..., max_length=255)
     description: Optional[str] = None
-    category: str
+    category: str = Field(..., max_length=100)
 
 
 class IdeaCreate(IdeaBase):
@@ -14,9 +14,9 @@ class IdeaCreate(IdeaBase):
 
 
 class IdeaUpdate(BaseModel):
-    title: Optional[str] = None
+    title: Optional[str] = Field(None, max_length=255)
     description: Optional[str] = None
-    category: Optional[str] = None
+    category: Optional[str] = Field(None, max_length=100)
     is_active: Optional[bool] = None
 
 
@@ -26,4 +26,25 @@ class IdeaResponse(IdeaBase):
     created_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class IdeaRecommendation(IdeaResponse):
+    # Higher is better; only comparable between ideas recommended to the same couple
+    score: float
+
+
+class IdeaSearchResult(IdeaResponse):
+    # Higher is a better match; only comparable within one search
+    rank: float
+
+
+class IdeaImportError(BaseModel):
+    row: int
+    error: str
+
+
+class IdeaImportResult(BaseModel):
+    created: int
+    duplicates: List[str] = []
+    errors: List[IdeaImportError] = []
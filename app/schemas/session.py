@@ -0,0 +1,13 @@
+from pydantic import BaseModel
+from typing import Optional, List
+from app.schemas.couple import CoupleResponse
+from app.schemas.date_event import DateEventResponse
+from app.schemas.user import UserResponse
+
+
+class SessionResponse(BaseModel):
+    """Everything the bot's home screen shows, in one payload"""
+    user: UserResponse
+    couple: Optional[CoupleResponse] = None
+    pending_proposals: List[DateEventResponse] = []
+    history: List[DateEventResponse] = []
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import Optional, List, Dict
 from datetime import datetime
 
 
@@ -24,4 +24,16 @@ class UserResponse(UserBase):
     updated_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class UserBatchRequest(BaseModel):
+    ids: List[int] = Field(default_factory=list, max_length=1000)
+    telegram_ids: List[int] = Field(default_factory=list, max_length=1000)
+
+
+class UserBatchResponse(BaseModel):
+    by_id: Dict[int, UserResponse] = {}
+    by_telegram_id: Dict[int, UserResponse] = {}
+    missing_ids: List[int] = []
+    missing_telegram_ids: List[int] = []
@@ -0,0 +1,64 @@
+"""Per-couple date statistics as shown to the couple, plus maintenance commands.
+
+The counters are kept by the storage backend as dates are proposed and
+answered (see ``Storage.get_couple_stats``). From the command line:
+
+    python -m app.services.couple_stats check [--couple-id ID]
+    python -m app.services.couple_stats rebuild [--couple-id ID]
+
+``check`` prints couples whose stats differ from their date history and
+exits with status 1 if there are any; ``rebuild`` recomputes the stats.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from datetime import date, timedelta
+from typing import Any, Dict, Optional
+
+from app.database import db
+
+FAVOURITE_CATEGORIES = 3
+
+
+def summarize(couple_id: int, stats: Optional[Dict[str, Any]], today: date = None) -> Dict[str, Any]:
+    """Stats with the favourite categories picked out and the current streak zeroed once broken"""
+    if stats is None:
+        return {'couple_id': couple_id}
+    today = today or date.today()
+    this_week = today - timedelta(days=today.weekday())
+    # A streak is still alive during the week after its last date
+    alive = stats['last_date_week'] is not None and stats['last_date_week'] >= this_week - timedelta(weeks=1)
+    favourites = sorted(stats['categories'].items(), key=lambda item: (-item[1], item[0]))
+    return {
+        **{key: stats[key] for key in ('proposed', 'pending', 'accepted', 'declined', 'completed',
+                                       'longest_streak_weeks', 'last_date_at')},
+        'couple_id': couple_id,
+        'favourite_categories': [
+            {'category': category, 'dates': dates} for category, dates in favourites[:FAVOURITE_CATEGORIES]
+        ],
+        'current_streak_weeks': stats['current_streak_weeks'] if alive else 0,
+    }
+
+
+async def main(args) -> int:
+    await db.init_db()
+    try:
+        if args.command == "rebuild":
+            couples = await db.rebuild_couple_stats(args.couple_id)
+            print(f"Rebuilt stats of {couples} couples")
+            return 0
+        mismatches = await db.check_couple_stats(args.couple_id)
+        for mismatch in mismatches:
+            print(json.dumps(mismatch, ensure_ascii=False, default=str))
+        print(f"{len(mismatches)} couples with inconsistent stats", file=sys.stderr)
+        return 1 if mismatches else 0
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check or rebuild per-couple date statistics")
+    parser.add_argument("command", choices=("check", "rebuild"))
+    parser.add_argument("--couple-id", type=int, help="only this couple (default: every couple)")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,100 @@
+import asyncio
+import json
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+from app.config import settings
+from app.storage.base import RESYNC_NOTIFICATION
+
+
+class DateEventBroker:
+    """Fans date event notifications out to subscribers, per couple.
+
+    Fed by ``Storage.listen_date_events``, so one database listener serves
+    every open stream in the process. Each subscriber has a bounded queue; a
+    subscriber that falls behind has its backlog replaced by a single resync
+    notification instead of holding on to events without limit.
+    """
+
+    def __init__(self, queue_size: int = None):
+        self.queue_size = queue_size or settings.DATE_EVENT_QUEUE_SIZE
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = defaultdict(set)
+        self.published = 0
+        self.dropped = 0
+
+    def publish(self, notification: Dict[str, Any]):
+        """Deliver a notification to the subscribers of its couple, or to everyone for a resync"""
+        self.published += 1
+        if notification["event"] == RESYNC_NOTIFICATION["event"]:
+            queues = [queue for queues in self._subscribers.values() for queue in queues]
+        else:
+            queues = self._subscribers.get(notification["couple_id"], ())
+        for queue in queues:
+            self._put(queue, notification)
+
+    def _put(self, queue: asyncio.Queue, notification: Dict[str, Any]):
+        try:
+            queue.put_nowait(notification)
+        except asyncio.QueueFull:
+            self.dropped += queue.qsize()
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(RESYNC_NOTIFICATION)
+
+    @asynccontextmanager
+    async def subscribe(self, couple_id: int) -> AsyncIterator[asyncio.Queue]:
+        """Queue receiving the couple's notifications until the block exits"""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[couple_id].add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers[couple_id].discard(queue)
+            if not self._subscribers[couple_id]:
+                del self._subscribers[couple_id]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "couples": len(self._subscribers),
+            "subscribers": sum(len(queues) for queues in self._subscribers.values()),
+            "published": self.published,
+            "dropped": self.dropped,
+        }
+
+
+def is_for_user(notification: Dict[str, Any], user_id: int) -> bool:
+    """Whether the user needs to hear about it: the partner proposed, or answered the user's proposal"""
+    if notification["event"] == "proposal":
+        return notification["proposer_id"] != user_id
+    if notification["event"] == "response":
+        return notification["proposer_id"] == user_id
+    return True
+
+
+def format_sse(notification: Dict[str, Any]) -> str:
+    return f"event: {notification['event']}\ndata: {json.dumps(notification)}\n\n"
+
+
+async def sse_stream(broker: DateEventBroker, couple_id: int, user_id: Optional[int] = None,
+                     keepalive: float = None) -> AsyncIterator[str]:
+    """Server-Sent Events for a couple, or only those relevant to ``user_id``.
+
+    Opens with a ``resync`` event: the client should fetch proposals once,
+    as it should on every later ``resync`` and after reconnecting. Comment
+    lines are sent every ``keepalive`` seconds so proxies keep the stream open.
+    """
+    keepalive = keepalive or settings.SSE_KEEPALIVE_INTERVAL
+    async with broker.subscribe(couple_id) as queue:
+        yield format_sse(RESYNC_NOTIFICATION)
+        while True:
+            try:
+                notification = await asyncio.wait_for(queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if user_id is None or is_for_user(notification, user_id):
+                yield format_sse(notification)
+
+
+date_event_broker = DateEventBroker()
@@ -0,0 +1,97 @@
+import csv
+import io
+import json
+from typing import List, Tuple, Optional, Any, Iterable
+
+from pydantic import ValidationError
+
+from app.schemas.idea import IdeaCreate, IdeaImportError
+
+
+IdeaRow = Tuple[str, Optional[str], str]
+
+JSON_TYPES = ("application/json",)
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonlines")
+CSV_TYPES = ("text/csv", "application/csv")
+
+
+class UnsupportedImportFormat(ValueError):
+    pass
+
+
+class InvalidImportPayload(ValueError):
+    pass
+
+
+def _format_error(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc']) or 'row'}: {e['msg']}"
+        for e in error.errors()
+    )
+
+
+def _validate(items: Iterable[Tuple[int, Any]]) -> Tuple[List[IdeaRow], List[IdeaImportError]]:
+    rows = []
+    errors = []
+    for index, item in items:
+        if isinstance(item, IdeaImportError):
+            errors.append(item)
+            continue
+        try:
+            idea = IdeaCreate.model_validate(item)
+        except ValidationError as e:
+            errors.append(IdeaImportError(row=index, error=_format_error(e)))
+            continue
+        rows.append((idea.title, idea.description, idea.category))
+    return rows, errors
+
+
+def _json_items(content: bytes) -> Iterable[Tuple[int, Any]]:
+    data = json.loads(content)
+    if not isinstance(data, list):
+        raise InvalidImportPayload("JSON body must be an array of ideas")
+    return enumerate(data)
+
+
+def _ndjson_items(content: bytes) -> Iterable[Tuple[int, Any]]:
+    for index, line in enumerate(content.decode("utf-8").splitlines()):
+        if not line.strip():
+            continue
+        try:
+            yield index, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield index, IdeaImportError(row=index, error=f"invalid JSON: {e.msg}")
+
+
+def _csv_items(content: bytes) -> Iterable[Tuple[int, Any]]:
+    reader = csv.DictReader(io.StringIO(content.decode("utf-8-sig")))
+    for index, record in enumerate(reader):
+        # Empty cells mean "no description" rather than an empty string
+        yield index, {key: value or None for key, value in record.items() if key}
+
+
+def parse_ideas(content: bytes, content_type: str) -> Tuple[List[IdeaRow], List[IdeaImportError]]:
+    """Parse and validate a JSON array, NDJSON or CSV payload of ideas.
+
+    Rows are numbered from 0 in input order (data rows only for CSV). Invalid
+    rows are reported as errors and do not stop the rest of the import.
+    """
+    media_type = content_type.split(";")[0].strip().lower()
+    try:
+        if media_type in JSON_TYPES:
+            return _validate(_json_items(content))
+        if media_type in NDJSON_TYPES:
+            return _validate(_ndjson_items(content))
+        if media_type in CSV_TYPES:
+            return _validate(_csv_items(content))
+    except (json.JSONDecodeError, UnicodeDecodeError, csv.Error) as e:
+        raise InvalidImportPayload(f"Malformed {media_type} payload: {e}") from e
+    raise UnsupportedImportFormat(f"Unsupported content type: {media_type or 'none'}")
+
+
+def guess_content_type(filename: Optional[str], content_type: Optional[str]) -> str:
+    """Pick the payload type of an uploaded file from its extension or declared type"""
+    extension = (filename or "").rsplit(".", 1)[-1].lower()
+    by_extension = {"json": "application/json", "ndjson": "application/x-ndjson",
+                    "jsonl": "application/x-ndjson", "csv": "text/csv"}
+    return by_extension.get(extension) or content_type or ""
@@ -0,0 +1,60 @@
+import asyncio
+import logging
+from typing import Optional
+
+from app.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class InviteCodeRefiller:
+    """Background task keeping the invite code reservoir topped up.
+
+    Every ``interval`` seconds it expires stale reservations and, once fewer
+    than ``threshold`` codes are left, refills the reservoir back to ``size``
+    in a single batch insert. Several workers may run it at once; duplicate
+    codes are dropped by the reservoir's primary key.
+    """
+
+    def __init__(self, db, size: int = None, threshold: int = None,
+                 interval: float = None, reservation_ttl: float = None):
+        self.db = db
+        self.size = size or settings.INVITE_CODE_RESERVOIR_SIZE
+        self.threshold = threshold or settings.INVITE_CODE_REFILL_THRESHOLD
+        self.interval = interval or settings.INVITE_CODE_REFILL_INTERVAL
+        self.reservation_ttl = reservation_ttl or settings.INVITE_CODE_RESERVATION_TTL
+        self._task: Optional[asyncio.Task] = None
+
+    async def refill(self) -> int:
+        """Top up the reservoir if it is below the threshold, return codes added"""
+        await self.db.expire_invite_code_reservations(self.reservation_ttl)
+        available = await self.db.count_available_invite_codes()
+        if available >= self.threshold:
+            return 0
+        return await self.db.refill_invite_codes(self.size - available)
+
+    async def _run(self):
+        while True:
+            try:
+                added = await self.refill()
+                if added:
+                    logger.info("Added %d invite codes to the reservoir", added)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Invite code reservoir refill failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
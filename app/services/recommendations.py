@@ -0,0 +1,250 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.storage.base import Storage, RESYNC_NOTIFICATION
+
+
+# Date statuses counting for or against an idea's category; anything else is ignored
+ACCEPTED_STATUSES = {"accepted", "completed"}
+DECLINED_STATUSES = {"rejected", "declined"}
+PENDING_STATUS = "pending"
+
+DAY = 86400.0
+# Half-lives of the signals, in seconds
+AFFINITY_HALF_LIFE = 90 * DAY
+CATEGORY_RECENCY_HALF_LIFE = 7 * DAY
+NOVELTY_HALF_LIFE = 60 * DAY
+
+AFFINITY_WEIGHT = 1.0
+# Subtracted for a category done just now, decaying with CATEGORY_RECENCY_HALF_LIFE
+CATEGORY_RECENCY_PENALTY = 0.5
+# Subtracted for repeating an idea accepted just now, decaying with NOVELTY_HALF_LIFE
+NOVELTY_PENALTY = 1.5
+
+# Events replayed to build the profile of a couple this process has not seen yet
+HISTORY_WINDOW = 200
+
+
+def _half_life_decay(age: np.ndarray, half_life: float) -> np.ndarray:
+    return np.exp2(-np.maximum(age, 0.0) / half_life)
+
+
+def top_rows(scores: np.ndarray, candidates: np.ndarray, limit: int) -> np.ndarray:
+    """The ``limit`` best-scoring candidate rows, best first"""
+    if len(candidates) > limit:
+        # Keep everything scoring at least the limit-th best, ties included
+        cutoff = np.partition(scores[candidates], len(candidates) - limit)[len(candidates) - limit]
+        candidates = candidates[scores[candidates] >= cutoff]
+    # Rows are in catalog order, so equal scores stay newest first
+    return candidates[np.lexsort((candidates, -scores[candidates]))][:limit]
+
+
+class IdeaMatrix:
+    """Active ideas as parallel arrays: one row per idea, newest first"""
+
+    def __init__(self, ideas: Sequence[Mapping[str, Any]], category_index: Dict[str, int], etag: str):
+        self.etag = etag
+        self.ideas = ideas
+        self.ids = np.fromiter((idea['id'] for idea in ideas), dtype=np.int64, count=len(ideas))
+        self.categories = np.fromiter(
+            (category_index[idea['category']] for idea in ideas), dtype=np.int32, count=len(ideas)
+        )
+        self.row_of = {idea['id']: row for row, idea in enumerate(ideas)}
+
+    def rows(self, idea_ids) -> np.ndarray:
+        """Rows of the given ideas, skipping those not in the matrix"""
+        return np.fromiter(
+            (self.row_of[idea_id] for idea_id in idea_ids if idea_id in self.row_of), dtype=np.int64
+        )
+
+
+class CoupleProfile:
+    """A couple's preference features, updated one date event at a time.
+
+    ``affinity`` holds per-category sums of +1 (accepted) and -1 (declined)
+    as of ``updated_at``, decayed lazily. Pending and declined ideas are
+    excluded from recommendations; accepted ones are penalized by recency.
+    """
+
+    __slots__ = ("affinity", "category_done_at", "updated_at", "done_at", "excluded", "statuses")
+
+    def __init__(self, n_categories: int, now: float):
+        self.affinity = np.zeros(n_categories)
+        self.category_done_at = np.full(n_categories, -np.inf)
+        self.updated_at = now
+        self.done_at: Dict[int, float] = {}
+        self.excluded: Set[int] = set()
+        # Last status applied per date event, which makes apply() idempotent
+        self.statuses: Dict[int, str] = {}
+
+    def resize(self, n_categories: int):
+        grow = n_categories - len(self.affinity)
+        if grow > 0:
+            self.affinity = np.concatenate([self.affinity, np.zeros(grow)])
+            self.category_done_at = np.concatenate([self.category_done_at, np.full(grow, -np.inf)])
+
+    def decayed_affinity(self, now: float) -> np.ndarray:
+        return self.affinity * _half_life_decay(np.float64(now - self.updated_at), AFFINITY_HALF_LIFE)
+
+    def apply(self, event_id: int, idea_id: int, category: Optional[int], status: str, at: float):
+        """Fold one date event (a proposal or its answer) into the features"""
+        previous = self.statuses.get(event_id)
+        # A stale read of an event already answered must not reopen it
+        if previous == status or (previous is not None and status == PENDING_STATUS):
+            return
+        self.statuses[event_id] = status
+        if previous in ACCEPTED_STATUSES and status in ACCEPTED_STATUSES:
+            # Completing an accepted date: it already counts as done
+            return
+        if previous == PENDING_STATUS:
+            self.excluded.discard(idea_id)
+
+        if status == PENDING_STATUS:
+            self.excluded.add(idea_id)
+            return
+        if status not in ACCEPTED_STATUSES and status not in DECLINED_STATUSES:
+            return
+
+        if status in ACCEPTED_STATUSES:
+            self.done_at[idea_id] = max(at, self.done_at.get(idea_id, at))
+        else:
+            self.excluded.add(idea_id)
+        if category is None:
+            return
+
+        # Rebase the sums to the later of the two times before adding
+        now = max(at, self.updated_at)
+        self.affinity = self.decayed_affinity(now)
+        self.updated_at = now
+        weight = float(_half_life_decay(np.float64(now - at), AFFINITY_HALF_LIFE))
+        if status in ACCEPTED_STATUSES:
+            self.affinity[category] += weight
+            self.category_done_at[category] = max(self.category_done_at[category], at)
+        else:
+            self.affinity[category] -= weight
+
+
+class Recommender:
+    """Scores active ideas for a couple in one vectorized pass.
+
+    score = tanh(category affinity) - recency penalty of the category
+            - novelty penalty of the idea, with pending and declined ideas excluded
+
+    Profiles are kept for up to ``max_profiles`` couples (LRU) and updated
+    from date event notifications, so after a couple's first recommendation
+    no history is read again. ``resync`` drops them all: they are rebuilt
+    from the couple's last ``HISTORY_WINDOW`` events on next use.
+    """
+
+    def __init__(self, max_profiles: int = None):
+        self.max_profiles = max_profiles or settings.RECOMMENDER_PROFILES_SIZE
+        self.matrix: Optional[IdeaMatrix] = None
+        # Kept across catalog changes so profile vectors stay aligned
+        self._category_index: Dict[str, int] = {}
+        self._idea_categories: Dict[int, int] = {}
+        self._profiles: "OrderedDict[int, CoupleProfile]" = OrderedDict()
+        self._building: Dict[int, Tuple[CoupleProfile, "asyncio.Future[CoupleProfile]"]] = {}
+        self.builds = 0
+        self.updates = 0
+
+    async def _matrix(self, db: Storage) -> IdeaMatrix:
+        ideas, etag = await db.get_ideas_catalog()
+        if self.matrix is None or self.matrix.etag != etag:
+            for idea in ideas:
+                index = self._category_index.setdefault(idea['category'], len(self._category_index))
+                self._idea_categories[idea['id']] = index
+            self.matrix = IdeaMatrix(ideas, self._category_index, etag)
+        return self.matrix
+
+    def on_date_event(self, notification: Dict[str, Any]):
+        """Storage.listen_date_events callback keeping cached profiles current"""
+        if notification["event"] == RESYNC_NOTIFICATION["event"]:
+            self._profiles.clear()
+            return
+        couple_id = notification["couple_id"]
+        if notification["idea_id"] not in self._idea_categories:
+            # An idea added since the matrix was built: rebuild once the catalog is reloaded
+            self._profiles.pop(couple_id, None)
+            return
+        profile = self._profiles.get(couple_id)
+        if profile is None:
+            if couple_id not in self._building:
+                # Not cached here: its history will be read when it is next needed
+                return
+            profile, _ = self._building[couple_id]
+        self.updates += 1
+        self._apply(profile, notification["id"], notification["idea_id"], notification["date_status"], time.time())
+
+    def _apply(self, profile: CoupleProfile, event_id: int, idea_id: int, status: str, at: float):
+        profile.resize(len(self._category_index))
+        profile.apply(event_id, idea_id, self._idea_categories.get(idea_id), status, at)
+
+    async def _profile(self, db: Storage, couple_id: int) -> CoupleProfile:
+        profile = self._profiles.get(couple_id)
+        if profile is not None:
+            self._profiles.move_to_end(couple_id)
+            return profile
+        if couple_id not in self._building:
+            # Notifications arriving while the history is read go straight into the new profile
+            profile = CoupleProfile(len(self._category_index), time.time())
+            self._building[couple_id] = (profile, asyncio.ensure_future(self._build(db, couple_id, profile)))
+        _, building = self._building[couple_id]
+        return await asyncio.shield(building)
+
+    async def _build(self, db: Storage, couple_id: int, profile: CoupleProfile) -> CoupleProfile:
+        try:
+            history = await db.get_date_history(couple_id, HISTORY_WINDOW)
+        finally:
+            del self._building[couple_id]
+        for event in reversed(history):
+            # Answers are weighted from when they were given, as live notifications are
+            answered_at = event['responded_at'] or event['created_at']
+            self._apply(profile, event['id'], event['idea_id'], event['date_status'], answered_at.timestamp())
+        self.builds += 1
+        self._profiles[couple_id] = profile
+        while len(self._profiles) > self.max_profiles:
+            self._profiles.popitem(last=False)
+        return profile
+
+    async def recommend(self, db: Storage, couple_id: int, limit: int) -> List[Dict[str, Any]]:
+        """Top ``limit`` active ideas for the couple, best first, each with its ``score``"""
+        matrix = await self._matrix(db)
+        profile = await self._profile(db, couple_id)
+        scores, candidates = self.score(matrix, profile, time.time())
+        return [{**matrix.ideas[row], "score": float(scores[row])} for row in top_rows(scores, candidates, limit)]
+
+    def score(self, matrix: IdeaMatrix, profile: CoupleProfile, now: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Scores of every row of ``matrix`` and the rows that are not excluded"""
+        profile.resize(len(self._category_index))
+        affinity = np.tanh(profile.decayed_affinity(now))
+        recency = _half_life_decay(now - profile.category_done_at, CATEGORY_RECENCY_HALF_LIFE)
+        per_category = AFFINITY_WEIGHT * affinity - CATEGORY_RECENCY_PENALTY * recency
+        scores = per_category[matrix.categories]
+
+        if profile.done_at:
+            done = [idea_id for idea_id in profile.done_at if idea_id in matrix.row_of]
+            rows = matrix.rows(done)
+            done_at = np.fromiter((profile.done_at[idea_id] for idea_id in done), dtype=np.float64)
+            scores[rows] -= NOVELTY_PENALTY * _half_life_decay(now - done_at, NOVELTY_HALF_LIFE)
+
+        allowed = np.ones(len(scores), dtype=bool)
+        allowed[matrix.rows(profile.excluded)] = False
+        return scores, np.flatnonzero(allowed)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ideas": len(self.matrix.ids) if self.matrix else 0,
+            "categories": len(self._category_index),
+            "profiles": len(self._profiles),
+            "max_profiles": self.max_profiles,
+            "builds": self.builds,
+            "updates": self.updates,
+        }
+
+
+recommender = Recommender()
@@ -0,0 +1,110 @@
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.storage.base import RESYNC_NOTIFICATION
+
+
+logger = logging.getLogger(__name__)
+
+
+def utcnow() -> datetime:
+    """Current time as naive UTC, the convention of scheduled_date and reminded_at"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class ReminderScheduler:
+    """Background task sending date reminders ``lead_time`` seconds before scheduled_date.
+
+    Sending a reminder is claiming it: ``Storage.claim_due_reminders`` marks
+    a batch of due dates reminded and notifies listeners with a ``reminder``
+    event in one statement, skipping rows another claimer holds, so several
+    workers can run the scheduler without sending anything twice. Between
+    claims it sleeps until the earliest due time it knows of, kept in a heap
+    fed by ``next_reminder_at`` and by ``scheduled`` notifications, or at
+    most ``poll_interval`` seconds.
+    """
+
+    def __init__(self, db, lead_time: float = None, batch_size: int = None, poll_interval: float = None):
+        self.db = db
+        self.lead_time = lead_time if lead_time is not None else settings.REMINDER_LEAD_TIME
+        self.batch_size = batch_size or settings.REMINDER_BATCH_SIZE
+        self.poll_interval = poll_interval or settings.REMINDER_POLL_INTERVAL
+        # Times reminders fall due, earliest first; later than the next poll is left to it
+        self._due: List[datetime] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.sent = 0
+
+    def _push(self, scheduled_date: Optional[datetime]) -> bool:
+        """Remember when the reminder for ``scheduled_date`` falls due, True if before any other"""
+        if scheduled_date is None:
+            return False
+        due = scheduled_date - timedelta(seconds=self.lead_time)
+        if due > utcnow() + timedelta(seconds=self.poll_interval):
+            return False
+        heapq.heappush(self._due, due)
+        return self._due[0] == due
+
+    def on_date_event(self, notification: Dict[str, Any]):
+        """Storage.listen_date_events callback: wake up early for dates scheduled meanwhile"""
+        if notification["event"] == RESYNC_NOTIFICATION["event"]:
+            self._wakeup.set()
+        elif notification["event"] == "scheduled" and notification["date_status"] == "accepted" \
+                and notification["scheduled_date"]:
+            if self._push(datetime.fromisoformat(notification["scheduled_date"])):
+                self._wakeup.set()
+
+    async def run_once(self) -> int:
+        """Claim every reminder due now, batch by batch, return how many were sent"""
+        sent = 0
+        while True:
+            batch = await self.db.claim_due_reminders(self.lead_time, self.batch_size)
+            sent += len(batch)
+            if len(batch) < self.batch_size:
+                break
+        self.sent += sent
+
+        # Every date still to be reminded of is due no earlier than this one
+        self._due = []
+        self._push(await self.db.next_reminder_at())
+        return sent
+
+    def _delay(self) -> float:
+        """Seconds until the earliest known due time, at most ``poll_interval``"""
+        if not self._due:
+            return self.poll_interval
+        return min(max((self._due[0] - utcnow()).total_seconds(), 0.0), self.poll_interval)
+
+    async def _run(self):
+        while True:
+            # Cleared first: a date scheduled while claiming sets it again
+            self._wakeup.clear()
+            try:
+                sent = await self.run_once()
+                if sent:
+                    logger.info("Sent %d date reminders", sent)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Claiming due date reminders failed")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._delay())
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,291 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import asynccontextmanager
+from datetime import datetime
+from enum import Enum
+from typing import Optional, List, Dict, Any, Tuple, AsyncIterator, Mapping, Callable, Sequence
+
+from app.utils.etag import compute_etag
+from app.utils.pagination import Keyset
+from app.utils.search import IdeaSearchIndex
+
+
+class JoinStatus(str, Enum):
+    joined = "joined"
+    invalid_code = "invalid_code"
+    own_couple = "own_couple"
+    already_in_couple = "already_in_couple"
+    couple_full = "couple_full"
+
+
+class ProposalStatus(str, Enum):
+    ok = "ok"
+    couple_not_found = "couple_not_found"
+    idea_not_found = "idea_not_found"
+    idea_inactive = "idea_inactive"
+    event_not_found = "event_not_found"
+    not_member = "not_member"
+    own_proposal = "own_proposal"
+    not_pending = "not_pending"
+    not_accepted = "not_accepted"
+
+
+# Receives date event notifications, see Storage.listen_date_events
+DateEventCallback = Callable[[Dict[str, Any]], None]
+
+# Sent in place of notifications that may have been lost
+RESYNC_NOTIFICATION = {"event": "resync"}
+
+
+INITIAL_IDEAS = [
+    ("Романтический ужин при свечах", "Приготовьте ужин дома при свечах с любимой музыкой", "романтика"),
+    ("Прогулка в парке", "Неспешная прогулка по красивому парку или скверу", "активность"),
+    ("Домашний кинотеатр", "Посмотрите фильм дома с попкорном и уютной атмосферой", "дом"),
+    ("Посещение музея", "Сходите в местный музей или галерею", "культура"),
+    ("Пикник на природе", "Организуйте пикник в живописном месте", "активность"),
+    ("Кулинарный мастер-класс дома", "Готовьте новое блюдо вместе", "дом"),
+    ("Концерт или театр", "Сходите на живое выступление", "культура"),
+    ("Спа-день дома", "Устройте релаксирующий день дома с масками и массажем", "релакс"),
+    ("Фотосессия", "Сделайте красивые фотографии друг друга", "творчество"),
+    ("Ужин в ресторане", "Попробуйте новую кухню в хорошем ресторане", "ресторан"),
+    ("Настольные игры", "Проведите вечер за любимыми настольными играми", "дом"),
+    ("Велопрогулка", "Покатайтесь на велосипедах по городу или парку", "активность"),
+    ("Кулинарные эксперименты", "Попробуйте приготовить блюдо новой кухни", "дом"),
+    ("Танцевальный вечер", "Устройте танцы дома под любимую музыку", "романтика"),
+    ("Книжный клуб на двоих", "Читайте одну книгу и обсуждайте", "культура"),
+    ("Йога вместе", "Занимайтесь йогой или медитацией", "релакс"),
+]
+
+
+class Storage(ABC):
+    """Storage backend used by the routers.
+
+    Rows are plain dicts with the columns of the corresponding table; date
+    events additionally carry ``idea_title``, ``idea_description`` and
+    ``proposer_name``. Every method takes an optional ``conn`` so several
+    calls can share one connection from ``connection()``; backends without
+    connections ignore it.
+    """
+
+    # Built by the default search_ideas from the catalog it was given
+    _search_index: Optional[IdeaSearchIndex] = None
+
+    async def init_db(self):
+        """Prepare the backend for use"""
+
+    async def disconnect(self):
+        """Release the backend's resources"""
+
+    @asynccontextmanager
+    async def connection(self, conn: Any = None) -> AsyncIterator[Any]:
+        """Yield a connection to share between calls, or ``conn`` if one was given"""
+        yield conn
+
+    async def populate_initial_ideas(self, conn: Any = None):
+        """Populate initial date ideas"""
+        await self.bulk_create_ideas(INITIAL_IDEAS, conn=conn)
+
+    #* Users
+    @abstractmethod
+    async def create_user(self, telegram_id: int, name: str, username: str = None,
+                          conn: Any = None) -> Optional[Dict[str, Any]]:
+        """Create a new user, None if the telegram_id is taken"""
+
+    @abstractmethod
+    async def get_user_by_id(self, user_id: int, conn: Any = None) -> Optional[Dict[str, Any]]:
+        """Get user by ID"""
+
+    @abstractmethod
+    async def get_user_by_telegram_id(self, telegram_id: int, conn: Any = None) -> Optional[Dict[str, Any]]:
+        """Get user by Telegram ID"""
+
+    @abstractmethod
+    async def get_users_batch(self, ids: List[int] = None, telegram_ids: List[int] = None,
+                              conn: Any = None) -> List[Dict[str, Any]]:
+        """Get all users matching any of the given IDs or Telegram IDs"""
+
+    @abstractmethod
+    async def get_all_users(self, limit: int = None, after: Keyset = None,
+                            conn: Any = None) -> List[Dict[str, Any]]:
+        """Get users, newest first, optionally a keyset page of them"""
+
+    @abstractmethod
+    def stream_users(self, chunk_size: int = 1000) -> AsyncIterator[List[Mapping[str, Any]]]:
+        """Stream all users in id order, ``chunk_size`` rows at a time"""
+
+    #* Couples
+    @abstractmethod
+    async def create_couple(self, user_id: int, invite_code: str = None,
+                            conn: Any = None) -> Optional[Dict[str, Any]]:
+        """Create a couple, None if the user is in a couple or ``invite_code`` is not reserved"""
+
+    @abstractmethod
+    async def join_couple(self, user_id: int, invite_code: str,
+                          conn: Any = None) -> Tuple[Optional[Dict[str, Any]], JoinStatus]:
+        """Join an existing couple, returns the couple (None on failure) and why"""
+
+    @abstractmethod
+    async def get_couple_by_id(self, couple_id: int, conn: Any = None) -> Optional[Dict[str, Any]]:
+        """Get couple by ID"""
+
+    @abstractmethod
+    async def get_couple_by_user_id(self, user_id: int, conn: Any = None) -> Optional[Dict[str, Any]]:
+        """Get the couple a user belongs to"""
+
+    @abstractmethod
+    async def reserve_invite_code(self, conn: Any = None) -> Optional[str]:
+        """Take a code out of the reservoir for a couple to be created with later"""
+
+    @abstractmethod
+    async def count_available_invite_codes(self, conn: Any = None) -> int:
+        """Count unreserved codes left in the reservoir"""
+
+    @abstractmethod
+    async def refill_invite_codes(self, count: int, conn: Any = None) -> int:
+        """Add up to ``count`` fresh codes to the reservoir and return how many were added"""
+
+    @abstractmethod
+    async def expire_invite_code_reservations(self, max_age: float, conn: Any = None) -> int:
+        """Drop codes reserved more than ``max_age`` seconds ago and never used"""
+
+    #* Ideas
+    @abstractmethod
+    async def create_idea(self, title: str, description: str, category: str,
+                          conn: Any = None) -> Optional[Dict[str, Any]]:
+        """Create a new idea"""
+
+    @abstractmethod
+    async def bulk_create_ideas(self, ideas: List[Tuple[str, Optional[str], str]],
+                                conn: Any = None) -> Tuple[int, List[str]]:
+        """Insert (title, description, category) rows, returns the count created and duplicate titles"""
+
+    @abstractmethod
+    async def get_idea_by_id(self, idea_id: int, conn: Any = None) -> Optional[Dict[str, Any]]:
+        """Get idea by ID"""
+
+    async def get_all_ideas(self) -> List[Dict[str, Any]]:
+        """Get all active ideas"""
+        ideas, _ = await self.get_ideas_catalog()
+        return [dict(idea) for idea in ideas]
+
+    @abstractmethod
+    async def get_ideas_catalog(self) -> Tuple[Sequence[Mapping[str, Any]], str]:
+        """Get all active ideas, newest first, as shared read-only rows, with the catalog ETag"""
+
+    async def get_ideas_page(self, limit: int, after: Keyset = None) -> Tuple[List[Dict[str, Any]], str]:
+        """Get a keyset page of active ideas, newest first, with the ETag of the page"""
+        ideas, _ = await self.get_ideas_catalog()
+        start = 0
+        if after:
+            # Newest first, so the rows at or above the keyset are a prefix of the catalog
+            start = bisect_left(ideas, True, key=lambda idea: (idea['created_at'], idea['id']) < after)
+        page = [dict(idea) for idea in ideas[start:start + limit]]
+        return page, compute_etag(page)
+
+    async def search_ideas(self, query: str, category: str = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """Search active ideas, best match first, each with its ``rank``.
+
+        Served from an in-process prefix index over the cached catalog,
+        rebuilt whenever the catalog ETag changes.
+        """
+        ideas, etag = await self.get_ideas_catalog()
+        if self._search_index is None or self._search_index.etag != etag:
+            self._search_index = IdeaSearchIndex(ideas, etag)
+        return self._search_index.search(query, category, limit)
+
+    @abstractmethod
+    async def update_idea(self, idea_id: int, title: str = None, description: str = None,
+                          category: str = None, is_active: bool = None,
+                          conn: Any = None) -> Optional[Dict[str, Any]]:
+        """Update the given fields of an idea, None if it does not exist"""
+
+    @abstractmethod
+    async def delete_idea(self, idea_id: int, conn: Any = None) -> bool:
+        """Delete an idea"""
+
+    #* Date/Events
+    @abstractmethod
+    async def create_date_proposal(self, couple_id: int, idea_id: int, proposer_id: int,
+                                   conn: Any = None) -> Tuple[Optional[Dict[str, Any]], ProposalStatus]:
+        """Create a date proposal, returns the event (None on failure) and the outcome"""
+
+    @abstractmethod
+    async def respond_to_date_proposal(self, event_id: int, response: str, user_id: int,
+                                       conn: Any = None) -> Tuple[Optional[Dict[str, Any]], ProposalStatus]:
+        """Respond to a pending proposal, returns the event (None on failure) and the outcome"""
+
+    @abstractmethod
+    async def schedule_date(self, event_id: int, user_id: int, scheduled_date: datetime,
+                            conn: Any = None) -> Tuple[Optional[Dict[str, Any]], ProposalStatus]:
+        """Set when an accepted date takes place, re-arming its reminder; returns the event and outcome"""
+
+    @abstractmethod
+    async def complete_date(self, event_id: int, user_id: int,
+                            conn: Any = None) -> Tuple[Optional[Dict[str, Any]], ProposalStatus]:
+        """Mark an accepted date completed as of now; returns the event and outcome"""
+
+    @abstractmethod
+    async def claim_due_reminders(self, lead_time: float, limit: int,
+                                  conn: Any = None) -> List[Dict[str, Any]]:
+        """Claim up to ``limit`` accepted dates scheduled within ``lead_time`` seconds, soonest first.
+
+        Claiming marks the reminder sent and notifies listeners with a
+        ``reminder`` event, atomically, so each reminder is claimed once even
+        with several schedulers claiming concurrently. Delivery is at most
+        once: a claimed reminder is never sent again, heard or not.
+        """
+
+    @abstractmethod
+    async def next_reminder_at(self, conn: Any = None) -> Optional[datetime]:
+        """The earliest scheduled_date of an accepted date whose reminder is still to be sent"""
+
+    @abstractmethod
+    async def get_proposals_for_user(self, couple_id: int, user_id: int, status: str = None,
+                                     limit: int = None, after: Keyset = None,
+                                     conn: Any = None) -> List[Dict[str, Any]]:
+        """Get proposals of the couple made by the partner, newest first"""
+
+    @abstractmethod
+    async def get_date_event_by_id(self, event_id: int, conn: Any = None) -> Optional[Dict[str, Any]]:
+        """Get date event by ID"""
+
+    @abstractmethod
+    def stream_date_events(self, chunk_size: int = 1000) -> AsyncIterator[List[Mapping[str, Any]]]:
+        """Stream all date events in id order, ``chunk_size`` rows at a time"""
+
+    @abstractmethod
+    async def get_date_history(self, couple_id: int, limit: int = 10, after: Keyset = None,
+                               conn: Any = None) -> List[Dict[str, Any]]:
+        """Get date history for a couple, newest first"""
+
+    @abstractmethod
+    async def listen_date_events(self, callback: DateEventCallback):
+        """Call ``callback`` for every date proposed or answered from now on.
+
+        Notifications are dicts with ``event`` ("proposal", "response",
+        "completed", "scheduled" or "reminder"), ``id``, ``couple_id``,
+        ``idea_id``, ``proposer_id``, ``date_status`` and ``scheduled_date``
+        (ISO format or None); ``RESYNC_NOTIFICATION`` means some may have
+        been missed.
+        """
+
+    #* Stats
+    @abstractmethod
+    async def get_couple_stats(self, couple_id: int, conn: Any = None) -> Optional[Dict[str, Any]]:
+        """Get the couple's date statistics, None if it has no date events yet.
+
+        A dict with the ``proposed``, ``pending``, ``accepted``, ``declined``
+        and ``completed`` counts, ``categories`` (accepted or completed dates
+        per idea category), ``last_date_at``, ``last_date_week`` (Monday of
+        the last week with a date) and ``current_streak_weeks`` /
+        ``longest_streak_weeks`` (runs of consecutive weeks with one).
+        Maintained as dates are proposed and answered, not computed on read.
+        """
+
+    @abstractmethod
+    async def rebuild_couple_stats(self, couple_id: int = None, conn: Any = None) -> int:
+        """Recompute the stats of one couple, or all, from their date events; returns couples written"""
+
+    @abstractmethod
+    async def check_couple_stats(self, couple_id: int = None, conn: Any = None) -> List[Dict[str, Any]]:
+        """Couples whose maintained stats differ from recomputed ones, with ``expected`` and ``actual``"""
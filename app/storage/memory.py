@@ -0,0 +1,523 @@
+import random
+import string
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Dict, Any, Tuple, AsyncIterator, Callable, Iterable, Mapping, Sequence
+
+import asyncpg
+
+from app.config import settings
+from app.storage.base import Storage, JoinStatus, ProposalStatus, DateEventCallback
+from app.utils.cache import IdeaCatalogCache
+from app.utils.pagination import Keyset
+
+
+def _newest_first(rows: Iterable[Dict[str, Any]], after: Keyset = None,
+                  limit: int = None) -> List[Dict[str, Any]]:
+    """ORDER BY created_at DESC, id DESC with an optional keyset and LIMIT"""
+    rows = sorted(rows, key=lambda row: (row['created_at'], row['id']), reverse=True)
+    if after:
+        rows = [row for row in rows if (row['created_at'], row['id']) < after]
+    return rows[:limit] if limit else rows
+
+
+DONE_STATUSES = ('accepted', 'completed')
+DECLINED_STATUSES = ('rejected', 'declined')
+COUPLE_STATS_BUCKETS = (
+    ('pending', ('pending',)), ('accepted', ('accepted',)),
+    ('declined', DECLINED_STATUSES), ('completed', ('completed',)),
+)
+
+
+def _empty_couple_stats(couple_id: int) -> Dict[str, Any]:
+    return {
+        'couple_id': couple_id, 'proposed': 0, 'pending': 0, 'accepted': 0, 'declined': 0,
+        'completed': 0, 'categories': {}, 'last_date_at': None, 'last_date_week': None,
+        'current_streak_weeks': 0, 'longest_streak_weeks': 0,
+    }
+
+
+def _apply_couple_stats(stats: Dict[str, Any], event: Dict[str, Any], old_status: Optional[str]):
+    """What the apply_couple_stats trigger does for an inserted (``old_status`` None) or answered event"""
+    new_status = event['date_status']
+    if old_status == new_status:
+        return
+    if old_status is None:
+        stats['proposed'] += 1
+    for bucket, statuses in COUPLE_STATS_BUCKETS:
+        stats[bucket] += (new_status in statuses) - (old_status in statuses)
+
+    was_done, is_done = old_status in DONE_STATUSES, new_status in DONE_STATUSES
+    if is_done != was_done:
+        category = event['idea_category']
+        dates = stats['categories'].get(category, 0) + (1 if is_done else -1)
+        if dates > 0:
+            stats['categories'][category] = dates
+        else:
+            stats['categories'].pop(category, None)
+
+    if is_done and not was_done:
+        done_at = event['responded_at'] or event['created_at']
+        week = done_at.date() - timedelta(days=done_at.weekday())
+        last_week = stats['last_date_week']
+        if last_week is None or week > last_week + timedelta(weeks=1):
+            stats['current_streak_weeks'] = 1
+        elif week == last_week + timedelta(weeks=1):
+            stats['current_streak_weeks'] += 1
+        stats['longest_streak_weeks'] = max(stats['longest_streak_weeks'], stats['current_streak_weeks'])
+        stats['last_date_week'] = max(last_week or week, week)
+        stats['last_date_at'] = max(stats['last_date_at'] or done_at, done_at)
+
+
+class InMemoryStorage(Storage):
+    """Storage backend keeping every table in process memory.
+
+    Mirrors the PostgreSQL backend row for row: same columns and defaults,
+    unique telegram_id and invite_code, joined date event fields and the
+    same status outcomes. Deleting an idea that date events still reference
+    raises ``asyncpg.ForeignKeyViolationError`` like the database would.
+    Meant for tests and for benchmarking the HTTP layer without a database.
+    """
+
+    def __init__(self):
+        self.users: Dict[int, Dict[str, Any]] = {}
+        self.couples: Dict[int, Dict[str, Any]] = {}
+        self.ideas: Dict[int, Dict[str, Any]] = {}
+        self.date_events: Dict[int, Dict[str, Any]] = {}
+        # Unique and lookup indexes
+        self._user_by_telegram_id: Dict[int, int] = {}
+        self._couple_by_code: Dict[str, int] = {}
+        self._couple_by_user: Dict[int, int] = {}
+        # Invite code reservoir: code -> reserved_at (None while unreserved)
+        self._invite_codes: Dict[str, Optional[datetime]] = {}
+        self._next_ids: Dict[str, int] = {}
+        self.ideas_cache = IdeaCatalogCache(ttl=settings.IDEAS_CACHE_TTL)
+        self._date_event_listeners: List[DateEventCallback] = []
+        # Maintained like the couple_stats table: on every proposal and answer
+        self.couple_stats: Dict[int, Dict[str, Any]] = {}
+
+    def _next_id(self, table: str) -> int:
+        self._next_ids[table] = self._next_ids.get(table, 0) + 1
+        return self._next_ids[table]
+
+    async def init_db(self):
+        """Seed the initial ideas like the first migrations do"""
+        if not self.ideas:
+            await self.populate_initial_ideas()
+
+    #* Users
+    async def create_user(self, telegram_id: int, name: str, username: str = None,
+                          conn: Any = None) -> Optional[Dict[str, Any]]:
+        """Create a new user"""
+        if telegram_id in self._user_by_telegram_id:
+            return None
+        now = datetime.now()
+        user = {
+            'id': self._next_id('users'), 'telegram_id': telegram_id, 'name': name,
+            'username': username, 'created_at': now, 'updated_at': now,
+        }
+        self.users[user['id']] = user
+        self._user_by_telegram_id[telegram_id] = user['id']
+        return dict(user)
+
+    async def get_user_by_id(self, user_id: int, conn: Any = None) -> Optional[Dict[str, Any]]:
+        """Get user by ID"""
+        user = self.users.get(user_id)
+        return dict(user) if user else None
+
+    async def get_user_by_telegram_id(self, telegram_id: int, conn: Any = None) -> Optional[Dict[str, Any]]:
+        """Get user by Telegram ID"""
+        return await self.get_user_by_id(self._user_by_telegram_id.get(telegram_id))
+
+    async def get_users_batch(self, ids: List[int] = None, telegram_ids: List[int] = None,
+                              conn: Any = None) -> List[Dict[str, Any]]:
+        """Get all users matching any of the given IDs or Telegram IDs"""
+        matched = set(ids or ()) & self.users.keys()
+        matched.update(
+            self._user_by_telegram_id[t] for t in telegram_ids or () if t in self._user_by_telegram_id
+        )
+        return [dict(self.users[user_id]) for user_id in matched]
+
+    async def get_all_users(self, limit: int = None, after: Keyset = None,
+                            conn: Any = None) -> List[Dict[str, Any]]:
+        """Get users, newest first, optionally a keyset page of them"""
+        return [dict(user) for user in _newest_first(self.users.values(), after, limit)]
+
+    async def _stream(self, rows: Callable[[], List[Dict[str, Any]]],
+                      chunk_size: int) -> AsyncIterator[List[Dict[str, Any]]]:
+        rows = rows()
+        for start in range(0, len(rows), chunk_size):
+            yield rows[start:start + chunk_size]
+
+    def stream_users(self, chunk_size: int = 1000) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Stream all users in id order"""
+        return self._stream(
+            lambda: [dict(self.users[user_id]) for user_id in sorted(self.users)], chunk_size
+        )
+
+    #* Couples
+    def generate_invite_code(self) -> str:
+        """Generate an invite code"""
+        return ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
+
+    def _insert_couple(self, user_id: int, invite_code: str) -> Dict[str, Any]:
+        couple = {
+            'id': self._next_id('couples'), 'user1_id': user_id, 'user2_id': None,
+            'invite_code': invite_code, 'created_at': datetime.now(),
+        }
+        self.couples[couple['id']] = couple
+        self._couple_by_code[invite_code] = couple['id']
+        self._couple_by_user[user_id] = couple['id']
+        return dict(couple)
+
+    async def create_couple(self, user_id: int, invite_code: str = None,
+                            conn: Any = None) -> Optional[Dict[str, Any]]:
+        """Create a new couple with a reserved, pooled or freshly generated code"""
+        if user_id in self._couple_by_user:
+            return None
+
+        if invite_code:
+            if self._invite_codes.get(invite_code) is None:
+                return None
+            del self._invite_codes[invite_code]
+            return self._insert_couple(user_id, invite_code)
+
+        code = next((c for c, reserved_at in self._invite_codes.items() if reserved_at is None), None)
+        if code:
+            del self._invite_codes[code]
+        else:
+            code = self.generate_invite_code()
+            while code in self._couple_by_code or code in self._invite_codes:
+                code = self.generate_invite_code()
+        return self._insert_couple(user_id, code)
+
+    async def join_couple(self, user_id: int, invite_code: str,
+                          conn: Any = None) -> Tuple[Optional[Dict[str, Any]], JoinStatus]:
+        """Join an existing couple using invite code"""
+        couple = self.couples.get(self._couple_by_code.get(invite_code))
+        if not couple:
+            return None, JoinStatus.invalid_code
+        if user_id in (couple['user1_id'], couple['user2_id']):
+            return None, JoinStatus.own_couple
+        if user_id in self._couple_by_user:
+            return None, JoinStatus.already_in_couple
+        if couple['user2_id'] is not None:
+            return None, JoinStatus.couple_full
+
+        couple['user2_id'] = user_id
+        self._couple_by_user[user_id] = couple['id']
+        return dict(couple), JoinStatus.joined
+
+    async def get_couple_by_id(self, couple_id: int, conn: Any = None) -> Optional[Dict[str, Any]]:
+        """Get couple by ID"""
+        couple = self.couples.get(couple_id)
+        return dict(couple) if couple else None
+
+    async def get_couple_by_user_id(self, user_id: int, conn: Any = None) -> Optional[Dict[str, Any]]:
+        """Get couple by user ID"""
+        return await self.get_couple_by_id(self._couple_by_user.get(user_id))
+
+    async def reserve_invite_code(self, conn: Any = None) -> Optional[str]:
+        """Take a code out of the reservoir for a couple to be created with later"""
+        code = next((c for c, reserved_at in self._invite_codes.items() if reserved_at is None), None)
+        if code:
+            self._invite_codes[code] = datetime.now()
+        return code
+
+    async def count_available_invite_codes(self, conn: Any = None) -> int:
+        """Count unreserved codes left in the reservoir"""
+        return sum(1 for reserved_at in self._invite_codes.values() if reserved_at is None)
+
+    async def refill_invite_codes(self, count: int, conn: Any = None) -> int:
+        """Add up to ``count`` fresh codes to the reservoir and return how many were added"""
+        added = 0
+        for code in {self.generate_invite_code() for _ in range(count)}:
+            if code not in self._invite_codes and code not in self._couple_by_code:
+                self._invite_codes[code] = None
+                added += 1
+        return added
+
+    async def expire_invite_code_reservations(self, max_age: float, conn: Any = None) -> int:
+        """Drop codes reserved more than ``max_age`` seconds ago and never used"""
+        cutoff = datetime.now() - timedelta(seconds=max_age)
+        expired = [c for c, reserved_at in self._invite_codes.items() if reserved_at and reserved_at < cutoff]
+        for code in expired:
+            del self._invite_codes[code]
+        return len(expired)
+
+    #* Ideas
+    def _insert_idea(self, title: str, description: Optional[str], category: str) -> Dict[str, Any]:
+        idea = {
+            'id': self._next_id('ideas'), 'title': title, 'description': description,
+            'category': category, 'is_active': True, 'created_at': datetime.now(),
+        }
+        self.ideas[idea['id']] = idea
+        return dict(idea)
+
+    async def create_idea(self, title: str, description: str, category: str,
+                          conn: Any = None) -> Optional[Dict[str, Any]]:
+        """Create a new idea"""
+        idea = self._insert_idea(title, description, category)
+        self.ideas_cache.invalidate()
+        return idea
+
+    async def bulk_create_ideas(self, ideas: List[Tuple[str, Optional[str], str]],
+                                conn: Any = None) -> Tuple[int, List[str]]:
+        """Insert (title, description, category) rows, skipping titles that already exist"""
+        existing = {idea['title'] for idea in self.ideas.values()}
+        created = 0
+        duplicates = []
+        for title, description, category in ideas:
+            if title in existing:
+                duplicates.append(title)
+                continue
+            existing.add(title)
+            self._insert_idea(title, description, category)
+            created += 1
+        if created:
+            self.ideas_cache.invalidate()
+        return created, duplicates
+
+    async def get_idea_by_id(self, idea_id: int, conn: Any = None) -> Optional[Dict[str, Any]]:
+        """Get idea by ID"""
+        idea = self.ideas.get(idea_id)
+        return dict(idea) if idea else None
+
+    async def get_ideas_catalog(self) -> Tuple[Sequence[Mapping[str, Any]], str]:
+        """Get all active ideas with the catalog ETag, served from the catalog cache"""
+        return await self.ideas_cache.get(self._fetch_active_ideas)
+
+    async def _fetch_active_ideas(self) -> List[Dict[str, Any]]:
+        return [dict(idea) for idea in _newest_first(i for i in self.ideas.values() if i['is_active'])]
+
+    async def update_idea(self, idea_id: int, title: str = None, description: str = None,
+                          category: str = None, is_active: bool = None,
+                          conn: Any = None) -> Optional[Dict[str, Any]]:
+        """Update an idea"""
+        idea = self.ideas.get(idea_id)
+        if not idea:
+            return None
+        updates = {'title': title, 'description': description, 'category': category, 'is_active': is_active}
+        updates = {field: value for field, value in updates.items() if value is not None}
+        if updates:
+            idea.update(updates)
+            self.ideas_cache.invalidate()
+        return dict(idea)
+
+    async def delete_idea(self, idea_id: int, conn: Any = None) -> bool:
+        """Delete an idea"""
+        if idea_id not in self.ideas:
+            return False
+        if any(event['idea_id'] == idea_id for event in self.date_events.values()):
+            raise asyncpg.ForeignKeyViolationError(
+                'update or delete on table "ideas" violates foreign key constraint '
+                '"date_events_idea_id_fkey" on table "date_events"'
+            )
+        del self.ideas[idea_id]
+        self.ideas_cache.invalidate()
+        return True
+
+    #* Date/Events
+    def _enrich(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """The event row with idea and proposer fields joined in"""
+        idea = self.ideas[event['idea_id']]
+        return {
+            **event,
+            'idea_title': idea['title'],
+            'idea_description': idea['description'],
+            'proposer_name': self.users[event['proposer_id']]['name'],
+        }
+
+    def _notify_date_event(self, kind: str, event: Dict[str, Any]):
+        """Deliver the notification the date_events trigger would send"""
+        notification = {
+            'event': kind,
+            **{key: event[key] for key in ('id', 'couple_id', 'idea_id', 'proposer_id', 'date_status')},
+            'scheduled_date': event['scheduled_date'].isoformat() if event['scheduled_date'] else None,
+        }
+        for callback in self._date_event_listeners:
+            callback(notification)
+
+    async def listen_date_events(self, callback: DateEventCallback):
+        """Call ``callback`` for every date event notification through this storage"""
+        self._date_event_listeners.append(callback)
+
+    async def create_date_proposal(self, couple_id: int, idea_id: int, proposer_id: int,
+                                   conn: Any = None) -> Tuple[Optional[Dict[str, Any]], ProposalStatus]:
+        """Create a date proposal"""
+        couple = self.couples.get(couple_id)
+        if not couple:
+            return None, ProposalStatus.couple_not_found
+        idea = self.ideas.get(idea_id)
+        if not idea:
+            return None, ProposalStatus.idea_not_found
+        if proposer_id not in (couple['user1_id'], couple['user2_id']):
+            return None, ProposalStatus.not_member
+        if idea['is_active'] is False:
+            return None, ProposalStatus.idea_inactive
+
+        event = {
+            'id': self._next_id('date_events'), 'couple_id': couple_id, 'idea_id': idea_id,
+            'proposer_id': proposer_id, 'date_status': 'pending', 'scheduled_date': None,
+            'completed_date': None, 'created_at': datetime.now(), 'responded_at': None,
+            'reminded_at': None, 'idea_category': idea['category'],
+        }
+        self.date_events[event['id']] = event
+        self._update_couple_stats(event, None)
+        self._notify_date_event('proposal', event)
+        return self._enrich(event), ProposalStatus.ok
+
+    async def respond_to_date_proposal(self, event_id: int, response: str, user_id: int,
+                                       conn: Any = None) -> Tuple[Optional[Dict[str, Any]], ProposalStatus]:
+        """Respond to a date proposal on behalf of ``user_id``"""
+        event = self.date_events.get(event_id)
+        if not event:
+            return None, ProposalStatus.event_not_found
+        couple = self.couples[event['couple_id']]
+        if user_id not in (couple['user1_id'], couple['user2_id']):
+            return None, ProposalStatus.not_member
+        if event['proposer_id'] == user_id:
+            return None, ProposalStatus.own_proposal
+        if event['date_status'] != 'pending':
+            return None, ProposalStatus.not_pending
+
+        event['date_status'] = response
+        event['responded_at'] = datetime.now()
+        self._update_couple_stats(event, 'pending')
+        self._notify_date_event('response', event)
+        return self._enrich(event), ProposalStatus.ok
+
+    def _accepted_date_for(self, event_id: int, user_id: int) -> Tuple[Optional[Dict[str, Any]], ProposalStatus]:
+        """The accepted event ``user_id`` may update, or why not"""
+        event = self.date_events.get(event_id)
+        if not event:
+            return None, ProposalStatus.event_not_found
+        couple = self.couples[event['couple_id']]
+        if user_id not in (couple['user1_id'], couple['user2_id']):
+            return None, ProposalStatus.not_member
+        if event['date_status'] != 'accepted':
+            return None, ProposalStatus.not_accepted
+        return event, ProposalStatus.ok
+
+    async def schedule_date(self, event_id: int, user_id: int, scheduled_date: datetime,
+                            conn: Any = None) -> Tuple[Optional[Dict[str, Any]], ProposalStatus]:
+        """Set when an accepted date takes place and re-arm its reminder"""
+        event, outcome = self._accepted_date_for(event_id, user_id)
+        if not event:
+            return None, outcome
+        changed = event['scheduled_date'] != scheduled_date
+        event['scheduled_date'] = scheduled_date
+        event['reminded_at'] = None
+        if changed:
+            self._notify_date_event('scheduled', event)
+        return self._enrich(event), outcome
+
+    async def complete_date(self, event_id: int, user_id: int,
+                            conn: Any = None) -> Tuple[Optional[Dict[str, Any]], ProposalStatus]:
+        """Mark an accepted date completed as of now"""
+        event, outcome = self._accepted_date_for(event_id, user_id)
+        if not event:
+            return None, outcome
+        event['date_status'] = 'completed'
+        event['completed_date'] = datetime.now()
+        self._update_couple_stats(event, 'accepted')
+        self._notify_date_event('completed', event)
+        return self._enrich(event), outcome
+
+    def _pending_reminders(self) -> List[Dict[str, Any]]:
+        return [
+            event for event in self.date_events.values()
+            if event['reminded_at'] is None and event['scheduled_date'] is not None
+            and event['date_status'] == 'accepted'
+        ]
+
+    async def claim_due_reminders(self, lead_time: float, limit: int,
+                                  conn: Any = None) -> List[Dict[str, Any]]:
+        """Claim up to ``limit`` accepted dates scheduled within ``lead_time`` seconds, soonest first"""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        horizon = now + timedelta(seconds=lead_time)
+        due = sorted(
+            (event for event in self._pending_reminders() if event['scheduled_date'] <= horizon),
+            key=lambda event: (event['scheduled_date'], event['id'])
+        )[:limit]
+        for event in due:
+            event['reminded_at'] = now
+            self._notify_date_event('reminder', event)
+        return [self._enrich(event) for event in due]
+
+    async def next_reminder_at(self, conn: Any = None) -> Optional[datetime]:
+        """The earliest scheduled_date of an accepted date whose reminder is still to be sent"""
+        return min((event['scheduled_date'] for event in self._pending_reminders()), default=None)
+
+    async def get_proposals_for_user(self, couple_id: int, user_id: int, status: str = None,
+                                     limit: int = None, after: Keyset = None,
+                                     conn: Any = None) -> List[Dict[str, Any]]:
+        """Get proposals that user can respond to"""
+        events = (
+            event for event in self.date_events.values()
+            if event['couple_id'] == couple_id and event['proposer_id'] != user_id
+            and (not status or event['date_status'] == status)
+        )
+        return [self._enrich(event) for event in _newest_first(events, after, limit)]
+
+    async def get_date_event_by_id(self, event_id: int, conn: Any = None) -> Optional[Dict[str, Any]]:
+        """Get date event by ID"""
+        event = self.date_events.get(event_id)
+        return self._enrich(event) if event else None
+
+    def stream_date_events(self, chunk_size: int = 1000) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Stream all date events with idea and proposer fields, in id order"""
+        return self._stream(
+            lambda: [self._enrich(self.date_events[event_id]) for event_id in sorted(self.date_events)],
+            chunk_size
+        )
+
+    async def get_date_history(self, couple_id: int, limit: int = 10, after: Keyset = None,
+                               conn: Any = None) -> List[Dict[str, Any]]:
+        """Get date history for a couple, newest first, continuing after the ``after`` keyset"""
+        events = (event for event in self.date_events.values() if event['couple_id'] == couple_id)
+        return [self._enrich(event) for event in _newest_first(events, after, limit)]
+
+    #* Stats
+    def _update_couple_stats(self, event: Dict[str, Any], old_status: Optional[str]):
+        stats = self.couple_stats.setdefault(event['couple_id'], _empty_couple_stats(event['couple_id']))
+        _apply_couple_stats(stats, event, old_status)
+
+    def _compute_couple_stats(self, couple_id: int = None) -> Dict[int, Dict[str, Any]]:
+        """Stats replayed from the date events, answers in the order they were given"""
+        events = sorted(
+            (event for event in self.date_events.values() if couple_id is None or event['couple_id'] == couple_id),
+            key=lambda event: (event['responded_at'] or event['created_at'], event['id'])
+        )
+        computed: Dict[int, Dict[str, Any]] = {}
+        for event in events:
+            stats = computed.setdefault(event['couple_id'], _empty_couple_stats(event['couple_id']))
+            _apply_couple_stats(stats, event, None)
+        return computed
+
+    def _scoped_couple_stats(self, couple_id: int = None) -> Dict[int, Dict[str, Any]]:
+        if couple_id is None:
+            return dict(self.couple_stats)
+        return {couple_id: self.couple_stats[couple_id]} if couple_id in self.couple_stats else {}
+
+    async def get_couple_stats(self, couple_id: int, conn: Any = None) -> Optional[Dict[str, Any]]:
+        """Get the couple's date statistics, None if it has no date events yet"""
+        stats = self.couple_stats.get(couple_id)
+        return {**stats, 'categories': dict(stats['categories'])} if stats else None
+
+    async def rebuild_couple_stats(self, couple_id: int = None, conn: Any = None) -> int:
+        """Recompute the stats of one couple, or all, from their date events"""
+        computed = self._compute_couple_stats(couple_id)
+        for stale_id in self._scoped_couple_stats(couple_id):
+            del self.couple_stats[stale_id]
+        self.couple_stats.update(computed)
+        return len(computed)
+
+    async def check_couple_stats(self, couple_id: int = None, conn: Any = None) -> List[Dict[str, Any]]:
+        """Couples whose maintained stats differ from recomputed ones, with ``expected`` and ``actual``"""
+        expected = self._compute_couple_stats(couple_id)
+        actual = self._scoped_couple_stats(couple_id)
+        return [
+            {'couple_id': stats_id, 'expected': expected.get(stats_id), 'actual': actual.get(stats_id)}
+            for stats_id in sorted(expected.keys() | actual.keys())
+            if expected.get(stats_id) != actual.get(stats_id)
+        ]
@@ -0,0 +1,161 @@
+import asyncio
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Optional, List, Dict, Any, Callable, Awaitable, Tuple, Iterable, Mapping
+
+from app.utils.etag import compute_etag
+
+
+class IdeaCatalogCache:
+    """In-process cache of the active ideas catalog.
+
+    Every write to the ideas table bumps ``version`` and drops the cached
+    rows, the next read refills them. A fill that raced with a write is
+    returned to its caller but not stored, so stale rows are never published.
+    Writes made by other worker processes are picked up after ``ttl`` seconds.
+    Every caller shares the cached rows, so they are handed out as a tuple of
+    read-only mappings.
+    """
+
+    def __init__(self, ttl: float = 60.0):
+        self.ttl = ttl
+        self.version = 0
+        self._ideas: Optional[Tuple[Mapping[str, Any], ...]] = None
+        self._etag: Optional[str] = None
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _is_fresh(self) -> bool:
+        return self._ideas is not None and time.monotonic() < self._expires_at
+
+    async def get(
+        self, loader: Callable[[], Awaitable[List[Dict[str, Any]]]]
+    ) -> Tuple[Tuple[Mapping[str, Any], ...], str]:
+        """Return cached ideas and their ETag, loading them with ``loader`` on a miss"""
+        if self._is_fresh():
+            self.hits += 1
+            return self._ideas, self._etag
+
+        async with self._lock:
+            # Another coroutine may have filled the cache while we waited
+            if self._is_fresh():
+                self.hits += 1
+                return self._ideas, self._etag
+
+            self.misses += 1
+            version = self.version
+            rows = await loader()
+            etag = compute_etag(rows)
+            ideas = tuple(MappingProxyType(idea) for idea in rows)
+            if version == self.version:
+                self._ideas = ideas
+                self._etag = etag
+                self._expires_at = time.monotonic() + self.ttl
+            return ideas, etag
+
+    def invalidate(self):
+        """Drop cached ideas after a write"""
+        self.version += 1
+        self._ideas = None
+        self._etag = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "size": len(self._ideas) if self._ideas is not None else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class CoupleCache:
+    """Bounded LRU+TTL cache of couple rows, addressable by couple id and by member user id.
+
+    Only couples that exist are cached. Writes that change membership must call
+    ``invalidate`` with the couple id and/or the user ids involved. Readers pass
+    the ``generation`` seen before their query to ``put`` so that a row read
+    before an invalidation is not cached after it. Callers get copies, so
+    changing a returned row does not change the cache.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._couples: "OrderedDict[int, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._by_user: Dict[int, int] = {}
+
+    def _lookup(self, couple_id: Optional[int]) -> Optional[Dict[str, Any]]:
+        entry = self._couples.get(couple_id) if couple_id is not None else None
+        if entry is None:
+            self.misses += 1
+            return None
+        couple, expires_at = entry
+        if time.monotonic() >= expires_at:
+            self._evict(couple_id)
+            self.misses += 1
+            return None
+        self._couples.move_to_end(couple_id)
+        self.hits += 1
+        return dict(couple)
+
+    def get_by_id(self, couple_id: int) -> Optional[Dict[str, Any]]:
+        """Return a cached couple by id, or None on a miss"""
+        return self._lookup(couple_id)
+
+    def get_by_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Return the cached couple ``user_id`` belongs to, or None on a miss"""
+        return self._lookup(self._by_user.get(user_id))
+
+    def put(self, couple: Dict[str, Any], generation: int):
+        """Cache a couple row read from the database while ``generation`` was current"""
+        if generation != self.generation:
+            return
+        couple_id = couple['id']
+        self._evict(couple_id)
+        self._couples[couple_id] = (dict(couple), time.monotonic() + self.ttl)
+        for user_id in (couple['user1_id'], couple['user2_id']):
+            if user_id is not None:
+                self._by_user[user_id] = couple_id
+        while len(self._couples) > self.max_size:
+            self._evict(next(iter(self._couples)))
+
+    def invalidate(self, couple_id: int = None, user_ids: Iterable[Optional[int]] = ()):
+        """Drop a couple and any couples cached for the given users"""
+        self.generation += 1
+        if couple_id is not None:
+            self._evict(couple_id)
+        for user_id in user_ids:
+            cached_id = self._by_user.get(user_id)
+            if cached_id is not None:
+                self._evict(cached_id)
+
+    def clear(self):
+        """Drop every cached couple, when invalidations from other workers may have been missed"""
+        self.generation += 1
+        self._couples.clear()
+        self._by_user.clear()
+
+    def _evict(self, couple_id: int):
+        entry = self._couples.pop(couple_id, None)
+        if entry is None:
+            return
+        couple, _ = entry
+        for user_id in (couple['user1_id'], couple['user2_id']):
+            if self._by_user.get(user_id) == couple_id:
+                del self._by_user[user_id]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._couples),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,41 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import AsyncIterator, List, Mapping, Any
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+CSV_MEDIA_TYPE = "text/csv"
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+async def ndjson_chunks(chunks: AsyncIterator[List[Mapping[str, Any]]]) -> AsyncIterator[bytes]:
+    """Encode chunks of rows as newline-delimited JSON, one output block per chunk"""
+    async for rows in chunks:
+        yield "".join(
+            json.dumps(dict(row), default=_json_default, ensure_ascii=False) + "\n"
+            for row in rows
+        ).encode("utf-8")
+
+
+async def csv_chunks(chunks: AsyncIterator[List[Mapping[str, Any]]]) -> AsyncIterator[bytes]:
+    """Encode chunks of rows as CSV with a header taken from the first row"""
+    header_written = False
+    async for rows in chunks:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if not header_written:
+            writer.writerow(rows[0].keys())
+            header_written = True
+        for row in rows:
+            writer.writerow(
+                value.isoformat() if isinstance(value, (datetime, date)) else value
+                for value in row.values()
+            )
+        yield buffer.getvalue().encode("utf-8")
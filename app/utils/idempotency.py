@@ -0,0 +1,341 @@
+import asyncio
+import hashlib
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from starlette.responses import JSONResponse
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.utils.metrics import http_idempotent_replays
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+# How often a retry polls for the first request with its key to finish in another worker
+PENDING_POLL_INTERVAL = 0.05
+PURGE_INTERVAL = 600.0
+
+
+@dataclass(frozen=True)
+class StoredResponse:
+    """The response to the first request sent with a key, and that request's fingerprint"""
+    fingerprint: str
+    status_code: int
+    headers: List[Tuple[str, str]]
+    body: bytes
+
+
+# Returned by IdempotencyStore.claim while the first request with the key is still running
+PENDING = "pending"
+
+Claim = Union[None, str, StoredResponse]
+
+
+class IdempotencyStore(ABC):
+    """Where idempotency keys and their responses are kept.
+
+    ``claim`` takes a key for the calling request (returns None), or returns
+    the stored response, or ``PENDING`` if another request holds the key.
+    The request that claimed a key must then ``save`` a response or
+    ``release`` the key.
+    """
+
+    @abstractmethod
+    async def claim(self, key: str, fingerprint: str) -> Claim:
+        """Take ``key`` for the calling request, or return its response or ``PENDING``"""
+
+    @abstractmethod
+    async def save(self, key: str, response: StoredResponse):
+        """Store the response of the request that claimed ``key``"""
+
+    @abstractmethod
+    async def release(self, key: str):
+        """Give up a claimed key without a response, so a retry runs again"""
+
+    def start(self):
+        """Start background maintenance, if the store needs any"""
+
+    async def stop(self):
+        """Stop what ``start`` started"""
+
+
+class InMemoryIdempotencyStore(IdempotencyStore):
+    """Bounded LRU+TTL map of keys to responses, for one worker process.
+
+    A claimed key without a response expires after ``lock_timeout``, so a
+    request that never finished does not hold it until the TTL.
+    """
+
+    def __init__(self, max_size: int = None, ttl: float = None, lock_timeout: float = None):
+        self.max_size = max_size or settings.IDEMPOTENCY_CACHE_SIZE
+        self.ttl = ttl or settings.IDEMPOTENCY_KEY_TTL
+        self.lock_timeout = lock_timeout or settings.IDEMPOTENCY_LOCK_TIMEOUT
+        # key -> (response, None while pending; expires at)
+        self._entries: "OrderedDict[str, Tuple[Optional[StoredResponse], float]]" = OrderedDict()
+
+    def _lookup(self, key: str) -> Optional[Tuple[Optional[StoredResponse], float]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() >= entry[1]:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _put(self, key: str, response: Optional[StoredResponse], ttl: float):
+        self._entries[key] = (response, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[StoredResponse]:
+        """The stored response for ``key``, None if there is none (yet)"""
+        entry = self._lookup(key)
+        return entry[0] if entry else None
+
+    async def claim(self, key: str, fingerprint: str) -> Claim:
+        entry = self._lookup(key)
+        if entry is not None:
+            return entry[0] or PENDING
+        self._put(key, None, self.lock_timeout)
+        return None
+
+    async def save(self, key: str, response: StoredResponse):
+        self._put(key, response, self.ttl)
+
+    async def release(self, key: str):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] is None:
+            del self._entries[key]
+
+
+class PostgresIdempotencyStore(IdempotencyStore):
+    """Keys in the idempotency_keys table, shared by every worker.
+
+    Stored responses are also kept in a per-worker ``InMemoryIdempotencyStore``,
+    so retries landing on the worker that answered first do not query the
+    table. Rows older than the TTL are purged every ``PURGE_INTERVAL`` seconds
+    between ``start`` and ``stop``.
+    """
+
+    def __init__(self, db, ttl: float = None, lock_timeout: float = None):
+        self.db = db
+        self.ttl = ttl or settings.IDEMPOTENCY_KEY_TTL
+        self.lock_timeout = lock_timeout or settings.IDEMPOTENCY_LOCK_TIMEOUT
+        self.local = InMemoryIdempotencyStore(ttl=self.ttl, lock_timeout=self.lock_timeout)
+        self._task: Optional[asyncio.Task] = None
+
+    async def claim(self, key: str, fingerprint: str) -> Claim:
+        response = self.local.get(key)
+        if response is not None:
+            return response
+        row = await self.db.claim_idempotency_key(key, fingerprint, self.ttl, self.lock_timeout)
+        if row['claimed']:
+            return None
+        if row['status_code'] is None:
+            # In progress, or taken by a request that committed after this statement began
+            return PENDING
+        response = StoredResponse(
+            row['fingerprint'], row['status_code'], [tuple(header) for header in row['headers']], row['body']
+        )
+        await self.local.save(key, response)
+        return response
+
+    async def save(self, key: str, response: StoredResponse):
+        await self.db.save_idempotent_response(key, response.status_code, response.headers, response.body)
+        await self.local.save(key, response)
+
+    async def release(self, key: str):
+        await self.db.release_idempotency_key(key)
+
+    async def _run(self):
+        while True:
+            try:
+                purged = await self.db.purge_idempotency_keys(self.ttl)
+                if purged:
+                    logger.info("Purged %d expired idempotency keys", purged)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Purging expired idempotency keys failed")
+            await asyncio.sleep(PURGE_INTERVAL)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def _header(scope: Scope, name: bytes) -> Optional[bytes]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
+
+
+def _match_route(scope: Scope):
+    """Set the route the router would match, so responses sent without it are counted per route"""
+    router = getattr(scope.get("app"), "router", None)
+    for route in getattr(router, "routes", ()):
+        match, child_scope = route.matches(scope)
+        if match == Match.FULL:
+            scope["route"] = child_scope.get("route", route)
+            return
+
+
+async def _read_body(receive: Receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+class IdempotencyMiddleware:
+    """Pure ASGI middleware answering retried POST requests from the first response.
+
+    Applies to POST requests to ``paths`` sent with an ``Idempotency-Key``
+    header. The first request with a key runs as usual and its response
+    (unless a 5xx) is stored under the key and path; a retry with the same
+    body gets the stored response back, marked ``Idempotent-Replayed: true``,
+    without reaching the route or the storage backend. A retry with a
+    different body gets 422. Retries arriving while the first request is
+    still running wait for it, up to ``wait_timeout`` seconds, then get 409:
+    within a worker they await its result, across workers they poll the store.
+    """
+
+    def __init__(self, app: ASGIApp, store: IdempotencyStore, paths: Iterable[str],
+                 wait_timeout: float = None):
+        self.app = app
+        self.store = store
+        self.paths = frozenset(paths)
+        self.wait_timeout = wait_timeout or settings.IDEMPOTENCY_WAIT_TIMEOUT
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        raw_key = _header(scope, IDEMPOTENCY_KEY_HEADER.lower().encode())
+        if raw_key is None:
+            await self.app(scope, receive, send)
+            return
+        idempotency_key = raw_key.decode("latin-1").strip()
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            await self._error(scope, receive, send, 400,
+                              f"{IDEMPOTENCY_KEY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters")
+            return
+
+        body = await _read_body(receive)
+        fingerprint = hashlib.sha256(scope["query_string"] + b"\n" + body).hexdigest()
+        key = f"{scope['path']} {idempotency_key}"
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                # Coalesced with the request already running in this worker
+                try:
+                    await asyncio.wait_for(asyncio.shield(inflight), max(deadline - time.monotonic(), 0.0))
+                except asyncio.TimeoutError:
+                    await self._still_running(scope, receive, send)
+                    return
+                continue
+
+            inflight = self._inflight[key] = asyncio.get_running_loop().create_future()
+            try:
+                claim = await self.store.claim(key, fingerprint)
+                if claim is None:
+                    await self._run_first(key, fingerprint, scope, body, receive, send)
+                    return
+            finally:
+                del self._inflight[key]
+                inflight.set_result(None)
+
+            if claim == PENDING:
+                # Held by a request in another worker
+                if time.monotonic() >= deadline:
+                    await self._still_running(scope, receive, send)
+                    return
+                await asyncio.sleep(PENDING_POLL_INTERVAL)
+                continue
+
+            if claim.fingerprint != fingerprint:
+                await self._error(scope, receive, send, 422,
+                                  f"{IDEMPOTENCY_KEY_HEADER} was already used for a different request")
+                return
+            http_idempotent_replays.inc((scope["path"],))
+            await self._replay(claim, scope, send)
+            return
+
+    async def _run_first(self, key: str, fingerprint: str, scope: Scope, body: bytes,
+                         receive: Receive, send: Send):
+        """Run the request that claimed ``key`` and store its response"""
+        status_code = None
+        headers: List[Tuple[str, str]] = []
+        chunks: List[bytes] = []
+        body_sent = False
+
+        async def receive_body() -> Message:
+            nonlocal body_sent
+            if body_sent:
+                return await receive()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers.extend((name.decode("latin-1"), value.decode("latin-1"))
+                               for name, value in message.get("headers", ()))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_body, send_wrapper)
+        except BaseException:
+            # Not answered: a retry must run again
+            await asyncio.shield(self.store.release(key))
+            raise
+        if status_code is None or status_code >= 500:
+            await self.store.release(key)
+        else:
+            await self.store.save(key, StoredResponse(fingerprint, status_code, headers, b"".join(chunks)))
+
+    async def _replay(self, response: StoredResponse, scope: Scope, send: Send):
+        _match_route(scope)
+        headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in response.headers]
+        headers.append((REPLAYED_HEADER.lower().encode(), b"true"))
+        await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": response.body})
+
+    async def _still_running(self, scope: Scope, receive: Receive, send: Send):
+        await self._error(scope, receive, send, 409,
+                          f"A request with this {IDEMPOTENCY_KEY_HEADER} is still being processed")
+
+    async def _error(self, scope: Scope, receive: Receive, send: Send, status_code: int, detail: str):
+        _match_route(scope)
+        await JSONResponse({"detail": detail}, status_code=status_code)(scope, receive, send)
@@ -0,0 +1,38 @@
+import base64
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Tuple
+
+
+# Keyset position: (created_at, id) of the last row of the previous page
+Keyset = Tuple[datetime, int]
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    """Build an opaque cursor pointing after ``row``"""
+    raw = f"{row['created_at'].isoformat()}|{row['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Keyset]:
+    """Parse a cursor produced by encode_cursor, raising ValueError if it is malformed"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def paginate(rows: List[Dict[str, Any]], limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Split ``limit + 1`` fetched rows into a page and the cursor for the next one"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
@@ -0,0 +1,64 @@
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any, AsyncIterator
+
+import asyncpg
+
+
+class PoolMonitor:
+    """Tracks how long requests wait to acquire a pooled connection.
+
+    Keeps the last ``window`` wait times for percentiles plus running totals.
+    """
+
+    def __init__(self, window: int = 10000):
+        self._waits = deque(maxlen=window)
+        self.acquires = 0
+        self.waiting = 0
+        self.max_wait = 0.0
+
+    @asynccontextmanager
+    async def acquire(self, pool: asyncpg.Pool) -> AsyncIterator[asyncpg.Connection]:
+        """Acquire a connection from ``pool`` and record the wait"""
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            conn = await pool.acquire()
+        finally:
+            self.waiting -= 1
+        waited = time.perf_counter() - started
+        self._waits.append(waited)
+        self.acquires += 1
+        self.max_wait = max(self.max_wait, waited)
+        try:
+            yield conn
+        finally:
+            await pool.release(conn)
+
+    def percentiles(self) -> Dict[str, float]:
+        """Acquire wait percentiles over the recent window, in milliseconds"""
+        if not self._waits:
+            return {"p50": 0.0, "p90": 0.0, "p99": 0.0}
+        waits = sorted(self._waits)
+        last = len(waits) - 1
+        return {
+            name: waits[min(last, int(q * len(waits)))] * 1000
+            for name, q in (("p50", 0.50), ("p90", 0.90), ("p99", 0.99))
+        }
+
+    def stats(self, pool: asyncpg.Pool) -> Dict[str, Any]:
+        size = pool.get_size() if pool else 0
+        idle = pool.get_idle_size() if pool else 0
+        return {
+            "pid": os.getpid(),
+            "min_size": pool.get_min_size() if pool else 0,
+            "max_size": pool.get_max_size() if pool else 0,
+            "size": size,
+            "idle": idle,
+            "busy": size - idle,
+            "waiting": self.waiting,
+            "acquires": self.acquires,
+            "acquire_wait_ms": {**self.percentiles(), "max": self.max_wait * 1000},
+        }
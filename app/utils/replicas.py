@@ -0,0 +1,134 @@
+import asyncio
+import functools
+import itertools
+import logging
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import asyncpg
+from starlette.types import ASGIApp, Scope, Receive, Send
+
+logger = logging.getLogger(__name__)
+
+# Acquiring only connects or resets a connection, so any of these raised while
+# acquiring means the replica cannot serve reads right now
+REPLICA_UNAVAILABLE_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.PostgresError,
+    asyncpg.InterfaceError,
+)
+
+# Set once the current request has written through the primary, so that its
+# later reads see the write instead of a lagging replica
+_wrote_to_primary: ContextVar[bool] = ContextVar("wrote_to_primary", default=False)
+
+
+def pinned_to_primary() -> bool:
+    """Whether reads in the current context must go to the primary"""
+    return _wrote_to_primary.get()
+
+
+def writes(func: Callable) -> Callable:
+    """Mark an async ``Database`` method as a write: later reads in the request stay on the primary"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        _wrote_to_primary.set(True)
+        return await func(*args, **kwargs)
+    return wrapper
+
+
+class ReadYourWritesMiddleware:
+    """Pure ASGI middleware giving every request a fresh read-your-writes flag.
+
+    Under uvicorn each request runs in its own task and already starts clean;
+    this matters when requests share a task, e.g. with ``httpx.ASGITransport``.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _wrote_to_primary.set(False)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _wrote_to_primary.reset(token)
+
+
+def parse_urls(value: Optional[str]) -> List[str]:
+    """Split a comma-separated list of DSNs"""
+    return [url.strip() for url in (value or "").split(",") if url.strip()]
+
+
+class Replica:
+    """One read replica: its pool and health bookkeeping"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.pool: Optional[asyncpg.Pool] = None
+        self.down_until = 0.0
+        self.reads = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def name(self) -> str:
+        """host:port/database, without credentials"""
+        parts = urlsplit(self.url)
+        host = parts.hostname or "localhost"
+        port = f":{parts.port}" if parts.port else ""
+        return f"{host}{port}{parts.path}"
+
+    def is_up(self, now: float) -> bool:
+        return self.pool is not None and self.down_until <= now
+
+
+class ReplicaSet:
+    """Read replicas picked round-robin, skipping any that failed recently.
+
+    A replica that fails to hand out a connection is taken out of rotation
+    for ``retry_interval`` seconds, after which the next read tries it again.
+    """
+
+    def __init__(self, urls: List[str], retry_interval: float):
+        self.replicas = [Replica(url) for url in urls]
+        self.retry_interval = retry_interval
+        self.fallbacks = 0
+        self._turn = itertools.count()
+
+    def __iter__(self):
+        return iter(self.replicas)
+
+    def pick(self) -> Optional[Replica]:
+        """Next healthy replica, or None if reads should go to the primary"""
+        now = time.monotonic()
+        healthy = [replica for replica in self.replicas if replica.is_up(now)]
+        if not healthy:
+            return None
+        return healthy[next(self._turn) % len(healthy)]
+
+    def mark_down(self, replica: Replica, error: BaseException):
+        logger.warning("Read replica %s unavailable, using the primary for %.0fs: %s",
+                       replica.name, self.retry_interval, error)
+        replica.failures += 1
+        replica.last_error = f"{type(error).__name__}: {error}"
+        replica.down_until = time.monotonic() + self.retry_interval
+
+    def stats(self) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        return [{
+            "replica": replica.name,
+            "up": replica.is_up(now),
+            "size": replica.pool.get_size() if replica.pool else 0,
+            "idle": replica.pool.get_idle_size() if replica.pool else 0,
+            "reads": replica.reads,
+            "failures": replica.failures,
+            "last_error": replica.last_error,
+            "retry_in_s": round(max(0.0, replica.down_until - now), 1),
+        } for replica in self.replicas]
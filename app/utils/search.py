@@ -0,0 +1,95 @@
+import heapq
+import re
+from bisect import bisect_left
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+_WORD = re.compile(r"\w+")
+
+# Same weights ts_rank gives the A, B and C labels of the database index
+TITLE_WEIGHT = 1.0
+DESCRIPTION_WEIGHT = 0.4
+CATEGORY_WEIGHT = 0.2
+
+# Prefixes up to this long match many words and are typed over and over,
+# so their ranked matches are kept for the life of the index
+MEMOIZED_PREFIX_LENGTH = 3
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercase words of ``text``, with ё folded into е"""
+    if not text:
+        return []
+    return _WORD.findall(text.lower().replace("ё", "е"))
+
+
+class IdeaSearchIndex:
+    """Inverted index of a catalog snapshot for prefix search.
+
+    Every word of an idea's title, description and category points to the
+    idea with the weight of the best field it appears in. Words are kept
+    sorted, so the words starting with a query prefix are one contiguous run
+    found by bisection. All query words must match; an idea's rank is the
+    sum of their weights, ties keep catalog order (newest first). The index
+    is immutable: a changed catalog gets a new one.
+    """
+
+    def __init__(self, ideas: Sequence[Mapping[str, Any]], etag: str):
+        self.etag = etag
+        self.ideas = ideas
+        self._postings: Dict[str, Dict[int, float]] = {}
+        for row, idea in enumerate(ideas):
+            for field, weight in (("title", TITLE_WEIGHT), ("description", DESCRIPTION_WEIGHT),
+                                  ("category", CATEGORY_WEIGHT)):
+                for word in tokenize(idea[field]):
+                    rows = self._postings.setdefault(word, {})
+                    if rows.get(row, 0.0) < weight:
+                        rows[row] = weight
+        self._words = sorted(self._postings)
+        self._ranked: Dict[str, List[Tuple[float, int]]] = {}
+
+    def _prefix_matches(self, prefix: str) -> Dict[int, float]:
+        """Rows with a word starting with ``prefix``, each with its best weight"""
+        matches: Dict[int, float] = {}
+        for i in range(bisect_left(self._words, prefix), len(self._words)):
+            word = self._words[i]
+            if not word.startswith(prefix):
+                break
+            for row, weight in self._postings[word].items():
+                if matches.get(row, 0.0) < weight:
+                    matches[row] = weight
+        return matches
+
+    def _ranked_matches(self, prefix: str) -> List[Tuple[float, int]]:
+        """Matches of ``prefix`` as (-weight, row), best first"""
+        ranked = self._ranked.get(prefix)
+        if ranked is None:
+            ranked = sorted((-weight, row) for row, weight in self._prefix_matches(prefix).items())
+            if len(prefix) <= MEMOIZED_PREFIX_LENGTH:
+                self._ranked[prefix] = ranked
+        return ranked
+
+    def search(self, query: str, category: str = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """Best ``limit`` ideas matching every word of ``query`` as a prefix, each with its ``rank``"""
+        words = tokenize(query)
+        if not words:
+            return []
+        if len(words) == 1:
+            # Already in rank order: stop at the first ``limit`` ideas in the category
+            results = []
+            for weight, row in self._ranked_matches(words[0]):
+                if category is None or self.ideas[row]['category'] == category:
+                    results.append({**self.ideas[row], "rank": -weight})
+                    if len(results) == limit:
+                        break
+            return results
+
+        ranks = self._prefix_matches(words[0])
+        for prefix in words[1:]:
+            if not ranks:
+                return []
+            matches = self._prefix_matches(prefix)
+            ranks = {row: rank + matches[row] for row, rank in ranks.items() if row in matches}
+        if category is not None:
+            ranks = {row: rank for row, rank in ranks.items() if self.ideas[row]['category'] == category}
+        rows = heapq.nsmallest(limit, ranks, key=lambda row: (-ranks[row], row))
+        return [{**self.ideas[row], "rank": ranks[row]} for row in rows]
@@ -0,0 +1,36 @@
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Type
+
+from fastapi.responses import Response
+from pydantic import BaseModel, TypeAdapter
+
+
+JSON_MEDIA_TYPE = "application/json"
+
+
+@lru_cache(maxsize=None)
+def _adapter(model: Type[BaseModel], many: bool) -> TypeAdapter:
+    return TypeAdapter(List[model] if many else model)
+
+
+def dump_json(model: Type[BaseModel], content: Any, many: bool = False) -> bytes:
+    """Validate rows against ``model`` and encode them to JSON in one pass through pydantic-core"""
+    adapter = _adapter(model, many)
+    return adapter.dump_json(adapter.validate_python(content))
+
+
+def model_response(model: Type[BaseModel], content: Any, many: bool = False,
+                   status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    """JSON response for storage rows, validated against ``model`` exactly once.
+
+    Returning a Response skips FastAPI's own ``response_model`` validation and
+    ``jsonable_encoder`` pass, so routes keep ``response_model`` for the
+    OpenAPI schema only. Headers must be passed here, headers set on an
+    injected ``Response`` are not applied to a returned one.
+    """
+    return Response(
+        content=dump_json(model, content, many),
+        status_code=status_code,
+        media_type=JSON_MEDIA_TYPE,
+        headers=headers
+    )
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import random
+import re
+from collections import deque
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Set
+
+import asyncpg
+
+
+logger = logging.getLogger(__name__)
+
+EXPLAIN_PREFIX = "EXPLAIN"
+# Client-side limit for the EXPLAIN run, an ANALYZE takes as long as the query itself
+EXPLAIN_TIMEOUT = 30.0
+MAX_QUERY_LENGTH = 2000
+
+# Statements that may modify data or take row locks; EXPLAIN ANALYZE would execute them again
+_WRITE_STATEMENT = re.compile(r"\b(insert|update|delete|merge|copy|truncate|alter|create|drop|lock)\b", re.I)
+
+
+def _param_shape(value: Any) -> str:
+    """Describe a parameter without logging its value"""
+    if value is None:
+        return "null"
+    if isinstance(value, (str, bytes, list, tuple)):
+        return f"{type(value).__name__}({len(value)})"
+    return type(value).__name__
+
+
+def is_explainable(query: str) -> bool:
+    """Single DML statement; skips utility commands and asyncpg's multi-statement connection reset"""
+    statement = query.strip().rstrip(";").lower()
+    return statement.startswith(("select", "with", "insert", "update", "delete", "values")) and ";" not in statement
+
+
+def is_read_only(query: str) -> bool:
+    statement = query.lstrip().lower()
+    return statement.startswith(("select", "with")) and not _WRITE_STATEMENT.search(statement)
+
+
+class SlowQueryLog:
+    """Records statements slower than ``threshold_ms`` in a bounded ring.
+
+    Installed as an asyncpg query logger on every pool connection. A
+    ``sample_rate`` share of the slow statements gets its plan captured in the
+    background: ``EXPLAIN (ANALYZE, BUFFERS)`` for read-only statements, a
+    plain ``EXPLAIN`` for anything that could write. Parameter values are
+    never stored, only their types and lengths, and those are logged at DEBUG.
+    Call ``close`` before closing the pool to cancel plans still running.
+    """
+
+    def __init__(self, threshold_ms: float, sample_rate: float = 0.1, size: int = 200,
+                 max_concurrent_explains: int = 1):
+        self.threshold_ms = threshold_ms
+        self.sample_rate = sample_rate
+        self.max_concurrent_explains = max_concurrent_explains
+        self.pool: Optional[asyncpg.Pool] = None
+        self._entries = deque(maxlen=size)
+        # Referenced until done, the event loop only keeps weak references to tasks
+        self._explains: Set[asyncio.Task] = set()
+        self.captured = 0
+
+    def __call__(self, record):
+        """asyncpg query logger callback, receives a ``LoggedQuery``"""
+        duration_ms = record.elapsed * 1000
+        if duration_ms < self.threshold_ms or record.query.lstrip().upper().startswith(EXPLAIN_PREFIX):
+            return
+
+        query = " ".join(record.query.split())[:MAX_QUERY_LENGTH]
+        entry = {
+            "at": datetime.utcnow().isoformat(),
+            "duration_ms": round(duration_ms, 3),
+            "query": query,
+            "params": [_param_shape(arg) for arg in record.args or ()],
+            "error": type(record.exception).__name__ if record.exception else None,
+            "plan": None,
+        }
+        self._entries.append(entry)
+        self.captured += 1
+        logger.warning("Slow query (%.1f ms): %s", duration_ms, query)
+        logger.debug("Slow query parameters: %s", entry["params"])
+
+        if (self.pool is not None and record.exception is None and is_explainable(record.query)
+                and len(self._explains) < self.max_concurrent_explains
+                and random.random() < self.sample_rate):
+            task = asyncio.get_running_loop().create_task(self._explain(entry, record.query, record.args))
+            self._explains.add(task)
+            task.add_done_callback(self._explains.discard)
+
+    async def _explain(self, entry: Dict[str, Any], query: str, args):
+        analyze = is_read_only(query)
+        options = "(ANALYZE, BUFFERS) " if analyze else ""
+        try:
+            async with self.pool.acquire() as conn:
+                rows = await conn.fetch(f"{EXPLAIN_PREFIX} {options}{query}", *(args or ()),
+                                        timeout=EXPLAIN_TIMEOUT)
+            entry["plan"] = "\n".join(row[0] for row in rows)
+            entry["plan_analyzed"] = analyze
+        except Exception as exc:
+            entry["plan_error"] = f"{type(exc).__name__}: {exc}"
+
+    async def close(self):
+        """Cancel plans still being captured and wait for them to release their connections"""
+        explains = list(self._explains)
+        for task in explains:
+            task.cancel()
+        await asyncio.gather(*explains, return_exceptions=True)
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Most recent slow statements first"""
+        return list(reversed(self._entries))[:limit]
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "threshold_ms": self.threshold_ms,
+            "sample_rate": self.sample_rate,
+            "captured": self.captured,
+            "size": len(self._entries),
+        }
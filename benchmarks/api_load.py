@@ -0,0 +1,270 @@
+"""Replay a bot workload against the API and report throughput and latency per endpoint.
+
+Each simulated couple registers two users, creates and joins a couple, then
+plans ``--dates`` dates: list ideas, propose, list the partner's proposals,
+respond, read the history and render the bot's home screen, once with the
+four separate calls it used to make and once with ``/session``.
+``--concurrency`` couples run at once.
+
+By default requests go through ``httpx.ASGITransport`` straight into the app,
+backed by the in-memory storage (``--backend memory``) or by PostgreSQL in a
+throwaway schema (``--backend postgres``). With ``--base-url`` the same
+workload is sent over HTTP to an already running server instead.
+
+Results are written as JSON (``--output``); ``--compare`` prints per-endpoint
+latency changes between two result files, e.g. from two commits.
+
+Usage:
+    python -m benchmarks.api_load --backend memory --couples 500 --concurrency 50
+    DATABASE_URL=postgresql://... python -m benchmarks.api_load --backend postgres --output before.json
+    python -m benchmarks.api_load --compare before.json after.json
+"""
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import asyncpg
+import httpx
+
+from app.config import settings
+from app.database import Database
+from app.dependencies import get_db
+from app.main import app
+from app.storage.memory import InMemoryStorage
+
+
+SCHEMA = "bench_api_load"
+P = settings.API_V1_STR
+
+
+class Recorder:
+    """Collects latencies per endpoint label and counts unexpected statuses"""
+
+    def __init__(self):
+        self.latencies = collections.defaultdict(list)
+        self.errors = collections.Counter()
+
+    async def call(self, client: httpx.AsyncClient, endpoint: str, method: str, url: str,
+                   expected=(200,), **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.latencies[endpoint].append(time.perf_counter() - started)
+        if response.status_code not in expected:
+            self.errors[f"{endpoint} {response.status_code}"] += 1
+        return response
+
+
+async def home_screen(client: httpx.AsyncClient, rec: Recorder, user: dict):
+    """The bot's home screen: four calls in turn, then the same data from /session"""
+    started = time.perf_counter()
+    responses = [await client.get(f"{P}/users/telegram/{user['telegram_id']}")]
+    responses.append(await client.get(f"{P}/couples/user/{user['id']}"))
+    responses.append(await client.get(f"{P}/dates/proposals/{user['id']}", params={"status": "pending"}))
+    responses.append(await client.get(f"{P}/dates/history/{responses[1].json()['id']}"))
+    rec.latencies["home screen (4 calls)"].append(time.perf_counter() - started)
+    for response in responses:
+        if response.status_code != 200:
+            rec.errors[f"home screen {response.url.path} {response.status_code}"] += 1
+
+    await rec.call(client, "GET /session/{telegram_id}", "GET", f"{P}/session/{user['telegram_id']}")
+
+
+async def couple_session(client: httpx.AsyncClient, rec: Recorder, telegram_ids, dates: int):
+    """One couple's life: register, pair up, then plan ``dates`` dates"""
+    users = []
+    for name in ("Alice", "Bob"):
+        r = await rec.call(client, "POST /auth/register", "POST", f"{P}/auth/register",
+                           json={"telegram_id": next(telegram_ids), "name": name})
+        users.append(r.json())
+    first, second = users
+
+    r = await rec.call(client, "POST /couples/", "POST", f"{P}/couples/", json={"user_id": first["id"]})
+    couple = r.json()
+    await rec.call(client, "POST /couples/join", "POST", f"{P}/couples/join",
+                   json={"user_id": second["id"], "invite_code": couple["invite_code"]})
+
+    etag = None
+    for i in range(dates):
+        headers = {"If-None-Match": etag} if etag else {}
+        r = await rec.call(client, "GET /ideas/", "GET", f"{P}/ideas/", expected=(200, 304), headers=headers)
+        etag = r.headers.get("ETag", etag)
+        if r.status_code == 200:
+            ideas = r.json()
+        proposer, responder = (first, second) if i % 2 == 0 else (second, first)
+
+        r = await rec.call(client, "POST /dates/proposal", "POST", f"{P}/dates/proposal", json={
+            "couple_id": couple["id"], "idea_id": random.choice(ideas)["id"], "proposer_id": proposer["id"]
+        })
+        event = r.json()
+        await rec.call(client, "GET /dates/proposals/{user_id}", "GET",
+                       f"{P}/dates/proposals/{responder['id']}", params={"status": "pending"})
+        await rec.call(client, "POST /dates/respond", "POST", f"{P}/dates/respond", params={
+            "event_id": event["id"], "response": random.choice(("accepted", "rejected")),
+            "user_id": responder["id"]
+        })
+        await rec.call(client, "GET /dates/history/{couple_id}", "GET", f"{P}/dates/history/{couple['id']}")
+        await home_screen(client, rec, proposer)
+
+
+async def run_workload(client: httpx.AsyncClient, couples: int, concurrency: int, dates: int,
+                       telegram_ids) -> tuple:
+    rec = Recorder()
+    queue = asyncio.Queue()
+    for _ in range(couples):
+        queue.put_nowait(None)
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            await couple_session(client, rec, telegram_ids, dates)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return rec, time.perf_counter() - started
+
+
+def summarize(rec: Recorder, elapsed: float) -> dict:
+    endpoints = {}
+    for endpoint, latencies in sorted(rec.latencies.items()):
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        endpoints[endpoint] = {
+            "requests": len(latencies),
+            "rps": round(len(latencies) / elapsed, 1),
+            "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+            "p50_ms": round(quantiles[49] * 1000, 3),
+            "p95_ms": round(quantiles[94] * 1000, 3),
+            "p99_ms": round(quantiles[98] * 1000, 3),
+        }
+    total = sum(len(latencies) for latencies in rec.latencies.values())
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "requests": total,
+        "rps": round(total / elapsed, 1),
+        "errors": dict(rec.errors),
+        "endpoints": endpoints,
+    }
+
+
+def print_summary(result: dict):
+    print(f"{'endpoint':<34} {'reqs':>7} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for endpoint, stats in result["endpoints"].items():
+        print(f"{endpoint:<34} {stats['requests']:>7} {stats['rps']:>8.0f} "
+              f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f}")
+    print(f"total: {result['requests']} requests in {result['elapsed_s']:.2f}s, {result['rps']:.0f} req/s")
+    if result["errors"]:
+        print(f"unexpected statuses: {result['errors']}")
+
+
+def compare(before_path: str, after_path: str):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    print(f"{before_path} ({before.get('commit')}, {before.get('target')}) -> "
+          f"{after_path} ({after.get('commit')}, {after.get('target')})")
+    print(f"{'endpoint':<34} {'p50 ms':>24} {'p95 ms':>24} {'p99 ms':>24}")
+    for endpoint, new in after["result"]["endpoints"].items():
+        old = before["result"]["endpoints"].get(endpoint)
+        if not old:
+            continue
+        cells = []
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            change = (new[key] - old[key]) / old[key] if old[key] else 0.0
+            cells.append(f"{old[key]:.2f} -> {new[key]:.2f} ({change:+.0%})")
+        print(f"{endpoint:<34} " + " ".join(f"{cell:>24}" for cell in cells))
+    old_rps, new_rps = before["result"]["rps"], after["result"]["rps"]
+    print(f"throughput: {old_rps:.0f} -> {new_rps:.0f} req/s ({(new_rps - old_rps) / old_rps:+.1%})")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def open_postgres(concurrency: int) -> Database:
+    db = Database()
+    db.pool = await asyncpg.create_pool(
+        settings.DATABASE_URL, min_size=min(concurrency, settings.DB_POOL_MAX_SIZE),
+        max_size=settings.DB_POOL_MAX_SIZE, server_settings={"search_path": SCHEMA}
+    )
+    async with db.pool.acquire() as conn:
+        await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await conn.execute(f"CREATE SCHEMA {SCHEMA}")
+    await db.create_tables()
+    await db.warm_up()
+    return db
+
+
+async def main(args):
+    storage = None
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=30.0)
+    else:
+        storage = await open_postgres(args.concurrency) if args.backend == "postgres" else InMemoryStorage()
+        await storage.init_db()
+        app.dependency_overrides[get_db] = lambda: storage
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+
+    # Telegram ids must not collide with users left over on a live server
+    telegram_ids = itertools.count(random.randint(10 ** 9, 10 ** 12))
+    try:
+        async with client:
+            if storage is not None:
+                await storage.refill_invite_codes((args.couples + args.warmup) * 2)
+            if args.warmup:
+                await run_workload(client, args.warmup, args.concurrency, args.dates, telegram_ids)
+            rec, elapsed = await run_workload(client, args.couples, args.concurrency, args.dates, telegram_ids)
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+        if isinstance(storage, Database):
+            async with storage.pool.acquire() as conn:
+                await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            await storage.disconnect()
+
+    result = summarize(rec, elapsed)
+    print_summary(result)
+    if args.output:
+        report = {
+            "commit": git_commit(),
+            "at": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "target": args.base_url or args.backend,
+            "params": {k: getattr(args, k) for k in ("couples", "concurrency", "dates", "warmup")},
+            "result": result,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {args.output}")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=("memory", "postgres"), default="memory")
+    parser.add_argument("--base-url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--couples", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--dates", type=int, default=5, help="dates planned per couple")
+    parser.add_argument("--warmup", type=int, default=20, help="couples run before measuring")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"),
+                        help="compare two result files instead of running")
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        sys.exit(0)
+    result = asyncio.run(main(args))
+    sys.exit(1 if result["errors"] else 0)
@@ -0,0 +1,124 @@
+"""Fire many simultaneous joins at one invite code and check that exactly one wins.
+
+Creates a couple and ``--joiners`` fresh users in a throwaway schema, then
+starts all joins at once over a pool of ``--concurrency`` connections. Runs the
+legacy check-then-update join for comparison, which lets several joiners
+"succeed" and overwrite each other. Exits non-zero if the current join admits
+more than one user.
+
+Usage:
+    DATABASE_URL=postgresql://... python -m benchmarks.couple_join_stress --joiners 200 --rounds 20
+"""
+import argparse
+import asyncio
+import collections
+import sys
+import time
+
+import asyncpg
+
+from app.config import settings
+from app.database import Database, JoinStatus
+from app.migrations import MIGRATIONS
+
+
+SCHEMA = "bench_couple_join"
+
+
+async def legacy_join_couple(db: Database, user_id: int, invite_code: str):
+    """The pre-change join: three separate queries with nothing held between them"""
+    async with db.pool.acquire() as conn:
+        if await conn.fetchrow("SELECT * FROM couples WHERE user1_id = $1 OR user2_id = $1", user_id):
+            return None, "already_in_couple"
+        couple = await conn.fetchrow(
+            "SELECT * FROM couples WHERE invite_code = $1 AND user2_id IS NULL", invite_code
+        )
+        if not couple or couple['user1_id'] == user_id:
+            return None, "rejected"
+        await conn.execute("UPDATE couples SET user2_id = $1 WHERE invite_code = $2", user_id, invite_code)
+        return dict(couple), "joined"
+
+
+async def run_round(db: Database, join, joiners: int, round_no: int):
+    first_user = round_no * (joiners + 1) + 1
+    async with db.pool.acquire() as conn:
+        await conn.execute(
+            "INSERT INTO users (telegram_id, name) SELECT g, 'user ' || g FROM generate_series($1::int, $2::int) g",
+            first_user, first_user + joiners
+        )
+    couple = await db.create_couple(first_user)
+
+    start = asyncio.Event()
+
+    async def attempt(user_id):
+        await start.wait()
+        _, join_status = await join(db, user_id, couple['invite_code'])
+        return join_status
+
+    tasks = [asyncio.create_task(attempt(first_user + i)) for i in range(1, joiners + 1)]
+    await asyncio.sleep(0)
+    started = time.perf_counter()
+    start.set()
+    statuses = await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    final = await db.get_couple_by_id(couple['id'])
+    # JoinStatus is a str enum, so legacy and atomic statuses compare and count alike
+    statuses = [getattr(s, "value", s) for s in statuses]
+    winners = [s for s in statuses if s == JoinStatus.joined.value]
+    return len(winners), final['user2_id'] is not None, collections.Counter(statuses), elapsed
+
+
+async def run(name, join, db: Database, joiners: int, rounds: int) -> int:
+    violations = 0
+    reasons = collections.Counter()
+    total_time = 0.0
+    for round_no in range(rounds):
+        winners, filled, statuses, elapsed = await run_round(db, join, joiners, round_no)
+        reasons.update(statuses)
+        total_time += elapsed
+        if winners != 1 or not filled:
+            violations += 1
+    print(
+        f"{name:>8}: {rounds} rounds x {joiners} joiners | "
+        f"{violations} rounds with != 1 winner | "
+        f"{rounds * joiners / total_time:8.0f} joins/s | {dict(reasons)}"
+    )
+    return violations
+
+
+async def reset_schema(db: Database):
+    async with db.pool.acquire() as conn:
+        await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await conn.execute(f"CREATE SCHEMA {SCHEMA}")
+        for migration in MIGRATIONS:
+            if migration.sql:
+                await conn.execute(migration.sql)
+    await db.refill_invite_codes(1000)
+
+
+async def main(args):
+    db = Database()
+    db.pool = await asyncpg.create_pool(
+        settings.DATABASE_URL, min_size=args.concurrency, max_size=args.concurrency,
+        server_settings={"search_path": SCHEMA}
+    )
+    try:
+        await reset_schema(db)
+        await run("legacy", legacy_join_couple, db, args.joiners, args.rounds)
+        await reset_schema(db)
+        violations = await run("atomic", Database.join_couple, db, args.joiners, args.rounds)
+    finally:
+        async with db.pool.acquire() as conn:
+            await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await db.pool.close()
+    return violations
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--joiners", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    sys.exit(1 if asyncio.run(main(args)) else 0)
@@ -0,0 +1,64 @@
+"""Time short prefix queries against the in-process idea search index.
+
+Builds a catalog of ``--ideas`` ideas from the words of the seed ideas and
+times ``IdeaSearchIndex.search`` for 1 to 3 letter prefixes, the queries the
+bot's inline mode sends while a word is being typed, against filtering the
+whole catalog the way clients had to before search existed.
+
+Usage:
+    python -m benchmarks.idea_search --ideas 5000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from app.storage.base import INITIAL_IDEAS
+from app.utils.search import IdeaSearchIndex, tokenize
+
+
+def timed(func, queries, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for query in queries:
+            func(query)
+    return (time.perf_counter() - started) / (repeat * len(queries))
+
+
+def scan(ideas, query: str, limit: int):
+    """Every idea with a word starting with ``query``, first ``limit`` kept"""
+    prefix = query.lower()
+    matches = [idea for idea in ideas
+               if any(word.startswith(prefix) for word in tokenize(f"{idea['title']} {idea['description']}"))]
+    return matches[:limit]
+
+
+def main(args):
+    rng = random.Random(42)
+    words = sorted({word for title, description, _ in INITIAL_IDEAS for word in tokenize(f"{title} {description}")})
+    categories = sorted({category for _, _, category in INITIAL_IDEAS})
+    now = datetime.now()
+    ideas = [{
+        'id': i, 'title': " ".join(rng.sample(words, 3)).capitalize(), 'description': " ".join(rng.sample(words, 8)),
+        'category': rng.choice(categories), 'is_active': True, 'created_at': now - timedelta(minutes=i),
+    } for i in range(args.ideas)]
+
+    started = time.perf_counter()
+    index = IdeaSearchIndex(ideas, etag="bench")
+    build_time = time.perf_counter() - started
+    print(f"{args.ideas} ideas, {len(words)} distinct words, index built in {build_time * 1e3:.1f} ms")
+
+    for length in (1, 2, 3):
+        queries = sorted({word[:length] for word in words})
+        index_time = timed(lambda q: index.search(q, limit=args.limit), queries, args.repeat)
+        scan_time = timed(lambda q: scan(ideas, q, args.limit), queries, 1)
+        print(f"{length}-letter prefixes ({len(queries):3d}): index {index_time * 1e3:7.3f} ms, "
+              f"full scan {scan_time * 1e3:8.3f} ms ({scan_time / index_time:.0f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ideas", type=int, default=5000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    main(parser.parse_args())
@@ -0,0 +1,139 @@
+"""Compare invite code allocation under contention: legacy check-then-insert loop vs reservoir claim.
+
+Runs ``--allocations`` couple creations with ``--concurrency`` concurrent tasks
+against a throwaway schema, once per strategy, and reports throughput, latency
+percentiles, round trips per allocation and failed allocations (unique
+violations from two requests racing to the same code).
+
+A small ``--alphabet`` plus ``--prefill`` simulates a code space that is
+filling up, which is where the legacy loop degrades.
+
+Usage:
+    DATABASE_URL=postgresql://... python -m benchmarks.invite_codes --allocations 5000 --concurrency 50
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import string
+import time
+
+import asyncpg
+
+from app.config import settings
+from app.database import Database
+from app.migrations import MIGRATIONS
+
+
+SCHEMA = "bench_invite_codes"
+
+
+async def legacy_create_couple(db: Database, user_id: int):
+    """The pre-reservoir allocation: check the code, regenerate on collision, then insert"""
+    async with db.pool.acquire() as conn:
+        if await conn.fetchrow("SELECT * FROM couples WHERE user1_id = $1 OR user2_id = $1", user_id):
+            return
+        invite_code = db.generate_invite_code()
+        while await conn.fetchval("SELECT id FROM couples WHERE invite_code = $1", invite_code):
+            invite_code = db.generate_invite_code()
+        await conn.fetchrow(
+            "INSERT INTO couples (user1_id, invite_code) VALUES ($1, $2) RETURNING *",
+            user_id, invite_code
+        )
+
+
+async def reservoir_create_couple(db: Database, user_id: int):
+    await db.create_couple(user_id)
+
+
+async def reset_schema(conn: asyncpg.Connection, users: int, prefill: int, db: Database):
+    await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    await conn.execute(f"CREATE SCHEMA {SCHEMA}")
+    for migration in MIGRATIONS:
+        if migration.sql:
+            await conn.execute(migration.sql)
+    await conn.execute(
+        "INSERT INTO users (telegram_id, name) SELECT g, 'user ' || g FROM generate_series(1, $1) g",
+        users + prefill
+    )
+    # Occupy part of the code space with existing couples
+    codes = set()
+    while len(codes) < prefill:
+        codes.add(db.generate_invite_code())
+    await conn.executemany(
+        "INSERT INTO couples (user1_id, invite_code) VALUES ($1, $2)",
+        [(users + i + 1, code) for i, code in enumerate(codes)]
+    )
+
+
+async def run_strategy(name, allocate, db: Database, users: int, concurrency: int, stats: dict):
+    stats.update(round_trips=0, failures=0)
+    latencies = []
+    queue = asyncio.Queue()
+    for user_id in range(1, users + 1):
+        queue.put_nowait(user_id)
+
+    async def worker():
+        while not queue.empty():
+            user_id = queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                await allocate(db, user_id)
+            except asyncpg.UniqueViolationError:
+                stats["failures"] += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(
+        f"{name:>10}: {users / elapsed:8.0f} alloc/s | "
+        f"p50 {quantiles[49] * 1000:6.2f} ms  p95 {quantiles[94] * 1000:6.2f} ms  "
+        f"p99 {quantiles[98] * 1000:6.2f} ms | "
+        f"{stats['round_trips'] / users:.2f} round trips/alloc | "
+        f"{stats['failures']} failed"
+    )
+
+
+async def main(args):
+    db = Database()
+    alphabet = args.alphabet
+    db.generate_invite_code = lambda: "".join(random.choices(alphabet, k=6))
+    stats = {"round_trips": 0}
+
+    def count_round_trip(record):
+        stats["round_trips"] += 1
+
+    async def init(conn):
+        conn.add_query_logger(count_round_trip)
+
+    db.pool = await asyncpg.create_pool(
+        settings.DATABASE_URL, min_size=args.concurrency, max_size=args.concurrency,
+        server_settings={"search_path": SCHEMA}, init=init
+    )
+    try:
+        async with db.pool.acquire() as conn:
+            await reset_schema(conn, args.allocations, args.prefill, db)
+        await run_strategy("legacy", legacy_create_couple, db, args.allocations, args.concurrency, stats)
+
+        async with db.pool.acquire() as conn:
+            await reset_schema(conn, args.allocations, args.prefill, db)
+        # The refiller runs in the background in production; fill up front here
+        await db.refill_invite_codes(args.allocations * 2)
+        await run_strategy("reservoir", reservoir_create_couple, db, args.allocations, args.concurrency, stats)
+    finally:
+        async with db.pool.acquire() as conn:
+            await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await db.pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--allocations", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--prefill", type=int, default=0, help="couples already occupying codes")
+    parser.add_argument("--alphabet", default=string.ascii_uppercase + string.digits)
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,94 @@
+"""Measure the per-call overhead of the metrics middleware and the Database method wrapper.
+
+Drives a trivial ASGI endpoint directly (no HTTP client, no network) with and
+without ``MetricsMiddleware``, and awaits a no-op coroutine with and without
+``timed_query``. Both baselines do almost nothing, so the difference is the
+cost added to every request and every query. Also times rendering ``/metrics``
+with the series the run produced.
+
+Usage:
+    python -m benchmarks.metrics_overhead --iterations 200000
+"""
+import argparse
+import asyncio
+import time
+
+from fastapi import FastAPI
+
+from app.utils.metrics import MetricsMiddleware, timed_query, registry
+
+
+def build_app(with_metrics: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        return {"id": item_id}
+
+    if with_metrics:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+
+async def drive(app, iterations: int) -> float:
+    """Call the ASGI app directly and return seconds per request"""
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    started = time.perf_counter()
+    for i in range(iterations):
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": "GET", "scheme": "http", "path": f"/items/{i % 100}", "raw_path": b"",
+            "root_path": "", "query_string": b"", "headers": [], "server": ("test", 80),
+        }
+        await app(scope, receive, send)
+    return (time.perf_counter() - started) / iterations
+
+
+async def noop(self, value):
+    return value
+
+
+async def await_calls(func, iterations: int) -> float:
+    started = time.perf_counter()
+    for i in range(iterations):
+        await func(None, i)
+    return (time.perf_counter() - started) / iterations
+
+
+async def main(args):
+    # Warm both apps up so route compilation and lazy imports are not measured
+    plain, instrumented = build_app(False), build_app(True)
+    await drive(plain, 1000)
+    await drive(instrumented, 1000)
+
+    base = await drive(plain, args.requests)
+    metered = await drive(instrumented, args.requests)
+    print(
+        f"middleware: {base * 1e6:7.2f} us/request without, {metered * 1e6:7.2f} us/request with "
+        f"(+{(metered - base) * 1e6:.2f} us, {(metered - base) / base:+.1%})"
+    )
+
+    wrapped = timed_query(noop)
+    base = await await_calls(noop, args.iterations)
+    metered = await await_calls(wrapped, args.iterations)
+    print(
+        f"   wrapper: {base * 1e9:7.0f} ns/call without, {metered * 1e9:7.0f} ns/call with "
+        f"(+{(metered - base) * 1e9:.0f} ns)"
+    )
+
+    started = time.perf_counter()
+    body = registry.render()
+    print(f"    scrape: {(time.perf_counter() - started) * 1e3:.2f} ms for {len(body.splitlines())} lines")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--iterations", type=int, default=200000)
+    args = parser.parse_args()
+    asyncio.run(main(args))
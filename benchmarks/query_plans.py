@@ -0,0 +1,131 @@
+"""Show query plans for the hot queries before and after the index migrations.
+
+Builds a throwaway schema filled with synthetic data, runs EXPLAIN ANALYZE for
+each hot query without secondary indexes, applies the index migrations and runs
+them again. Nothing outside the scratch schema is touched.
+
+Usage:
+    DATABASE_URL=postgresql://... python -m benchmarks.query_plans --couples 50000
+"""
+import argparse
+import asyncio
+
+import asyncpg
+
+from app.config import settings
+from app.database import SEARCH_IDEAS_FULL_TEXT
+from app.migrations import MIGRATIONS
+
+
+SCHEMA = "bench_query_plans"
+
+HOT_QUERIES = {
+    "get_couple_by_user_id": (
+        "SELECT * FROM couples WHERE user1_id = $1 OR user2_id = $1",
+        lambda n: [n // 2],
+    ),
+    "get_date_history": (
+        """
+        SELECT de.*, i.title as idea_title, i.description as idea_description,
+               u.name as proposer_name
+        FROM date_events de
+        JOIN ideas i ON de.idea_id = i.id
+        JOIN users u ON de.proposer_id = u.id
+        WHERE de.couple_id = $1
+        ORDER BY de.created_at DESC, de.id DESC
+        LIMIT 10
+        """,
+        lambda n: [n // 4],
+    ),
+    "get_all_users": (
+        "SELECT * FROM users ORDER BY created_at DESC, id DESC LIMIT 50",
+        lambda n: [],
+    ),
+    "get_all_ideas": (
+        "SELECT * FROM ideas WHERE is_active = TRUE ORDER BY created_at DESC, id DESC",
+        lambda n: [],
+    ),
+    "search_ideas": (
+        SEARCH_IDEAS_FULL_TEXT,
+        lambda n: ["'12':*", None, 20],
+    ),
+}
+
+
+async def seed(conn: asyncpg.Connection, couples: int, events_per_couple: int, ideas: int):
+    await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    await conn.execute(f"CREATE SCHEMA {SCHEMA}")
+    await conn.execute(f"SET search_path TO {SCHEMA}")
+    await conn.execute(MIGRATIONS[0].sql)
+
+    users = couples * 2
+    await conn.execute(
+        "INSERT INTO users (telegram_id, name) SELECT g, 'user ' || g FROM generate_series(1, $1) g",
+        users
+    )
+    await conn.execute(
+        """
+        INSERT INTO couples (user1_id, user2_id, invite_code)
+        SELECT 2 * g - 1, 2 * g, lpad(to_hex(g), 6, '0') FROM generate_series(1, $1) g
+        """,
+        couples
+    )
+    # Mostly inactive catalog so the partial index has something to skip
+    await conn.execute(
+        """
+        INSERT INTO ideas (title, category, is_active, created_at)
+        SELECT 'idea ' || g, 'cat ' || (g % 8), g % 20 = 0, now() - g * interval '1 minute'
+        FROM generate_series(1, $1) g
+        """,
+        ideas
+    )
+    await conn.execute(
+        """
+        INSERT INTO date_events (couple_id, idea_id, proposer_id, created_at)
+        SELECT c, 1 + (g % $3), 2 * c - (g % 2), now() - g * interval '1 hour'
+        FROM generate_series(1, $1) c, generate_series(1, $2) g
+        """,
+        couples, events_per_couple, ideas
+    )
+    await conn.execute("ANALYZE")
+
+
+async def explain_all(conn: asyncpg.Connection, couples: int):
+    for name, (query, params) in HOT_QUERIES.items():
+        plan = await conn.fetch("EXPLAIN (ANALYZE, BUFFERS, COSTS OFF) " + query, *params(couples))
+        print(f"--- {name}")
+        for row in plan:
+            print("   ", row[0])
+
+
+async def main(couples: int, events_per_couple: int, ideas: int):
+    conn = await asyncpg.connect(settings.DATABASE_URL)
+    try:
+        print(f"Seeding {couples} couples, {couples * events_per_couple} date events, {ideas} ideas...")
+        await seed(conn, couples, events_per_couple, ideas)
+
+        print("\n=== Before (no secondary indexes)")
+        await explain_all(conn, couples)
+
+        # Every SQL migration after the initial schema is an index migration
+        index_migrations = [m for m in MIGRATIONS if m.version > 1 and m.sql]
+        for migration in index_migrations:
+            await conn.execute(migration.sql)
+        await conn.execute("ANALYZE")
+
+        print("\n=== After migrations " + ", ".join(
+            f"{m.version} ({m.description})" for m in index_migrations
+        ))
+        await explain_all(conn, couples)
+    finally:
+        await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--couples", type=int, default=20000)
+    parser.add_argument("--events-per-couple", type=int, default=10)
+    parser.add_argument("--ideas", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(main(args.couples, args.events_per_couple, args.ideas))
@@ -0,0 +1,94 @@
+"""Time idea scoring for one couple: the vectorized pass against a per-idea Python loop.
+
+Builds a catalog of ``--ideas`` active ideas in ``--categories`` categories
+and a couple profile from ``--history`` answered dates, then times
+``Recommender.score`` plus top-k selection against scoring the same formula
+idea by idea in Python. Both must produce the same ranking.
+
+Usage:
+    python -m benchmarks.recommendations --ideas 5000 --history 200
+"""
+import argparse
+import math
+import random
+import time
+from datetime import datetime
+
+from app.services.recommendations import (
+    AFFINITY_HALF_LIFE, AFFINITY_WEIGHT, CATEGORY_RECENCY_HALF_LIFE, CATEGORY_RECENCY_PENALTY,
+    DAY, NOVELTY_HALF_LIFE, NOVELTY_PENALTY, CoupleProfile, IdeaMatrix, Recommender, top_rows
+)
+
+
+def decay(age: float, half_life: float) -> float:
+    return 2.0 ** (-max(age, 0.0) / half_life)
+
+
+def python_top(matrix: IdeaMatrix, profile: CoupleProfile, now: float, limit: int):
+    """The same scoring, one idea at a time"""
+    affinity_decay = decay(now - profile.updated_at, AFFINITY_HALF_LIFE)
+    scored = []
+    for row, idea in enumerate(matrix.ideas):
+        if idea['id'] in profile.excluded:
+            continue
+        category = int(matrix.categories[row])
+        score = AFFINITY_WEIGHT * math.tanh(profile.affinity[category] * affinity_decay)
+        score -= CATEGORY_RECENCY_PENALTY * decay(now - profile.category_done_at[category],
+                                                  CATEGORY_RECENCY_HALF_LIFE)
+        if idea['id'] in profile.done_at:
+            score -= NOVELTY_PENALTY * decay(now - profile.done_at[idea['id']], NOVELTY_HALF_LIFE)
+        scored.append((-score, row))
+    scored.sort()
+    return [row for _, row in scored[:limit]]
+
+
+def numpy_top(recommender: Recommender, matrix: IdeaMatrix, profile: CoupleProfile, now: float, limit: int):
+    scores, candidates = recommender.score(matrix, profile, now)
+    return top_rows(scores, candidates, limit).tolist()
+
+
+def timed(func, repeat: int) -> float:
+    func()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat
+
+
+def main(args):
+    rng = random.Random(42)
+    categories = [f"category {i}" for i in range(args.categories)]
+    now = time.time()
+    ideas = [{
+        'id': i, 'title': f'Idea {i}', 'description': None, 'category': rng.choice(categories),
+        'is_active': True, 'created_at': datetime.fromtimestamp(now - i),
+    } for i in range(args.ideas)]
+
+    recommender = Recommender()
+    recommender._category_index = {category: i for i, category in enumerate(categories)}
+    recommender._idea_categories = {idea['id']: recommender._category_index[idea['category']] for idea in ideas}
+    matrix = IdeaMatrix(ideas, recommender._category_index, etag="bench")
+
+    profile = CoupleProfile(len(categories), now)
+    for event_id in range(args.history):
+        idea = rng.choice(ideas)
+        status = rng.choice(("accepted", "accepted", "rejected", "pending"))
+        profile.apply(event_id, idea['id'], recommender._idea_categories[idea['id']], status,
+                      now - rng.uniform(0, 365 * DAY))
+
+    assert numpy_top(recommender, matrix, profile, now, args.limit) == python_top(matrix, profile, now, args.limit)
+    numpy_time = timed(lambda: numpy_top(recommender, matrix, profile, now, args.limit), args.repeat)
+    python_time = timed(lambda: python_top(matrix, profile, now, args.limit), args.repeat)
+    print(f"{args.ideas} ideas, {args.categories} categories, {args.history} dates in history, top {args.limit}")
+    print(f"python loop: {python_time * 1e3:8.3f} ms")
+    print(f"vectorized:  {numpy_time * 1e3:8.3f} ms  ({python_time / numpy_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ideas", type=int, default=5000)
+    parser.add_argument("--categories", type=int, default=12)
+    parser.add_argument("--history", type=int, default=200, help="dates in the couple's history")
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=200)
+    main(parser.parse_args())
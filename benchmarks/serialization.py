@@ -0,0 +1,113 @@
+"""Measure the per-row cost of serializing list responses, before and after model_response.
+
+For the row shapes of ``/ideas/``, ``/users/`` and ``/dates/history`` two
+minimal apps serve the same in-memory rows: the previous handler style, which
+builds a Pydantic object per row and lets FastAPI validate and encode the list
+again through ``response_model``, and ``model_response``, which validates and
+encodes once in pydantic-core. Each is timed at 1 and ``--rows`` rows per
+response; the difference divided by the extra rows is the marginal cost per row,
+independent of routing and the rest of the request overhead.
+
+Usage:
+    python -m benchmarks.serialization --rows 200 --requests 300
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi import FastAPI
+
+from app.schemas.date_event import DateEventResponse
+from app.schemas.idea import IdeaResponse
+from app.schemas.user import UserResponse
+from app.utils.serialization import model_response
+
+
+def idea_rows(n):
+    now = datetime.now()
+    return [{
+        'id': i, 'title': f'Идея {i}', 'description': 'Неспешная прогулка по красивому парку',
+        'category': 'активность', 'is_active': True, 'created_at': now - timedelta(seconds=i),
+    } for i in range(n)]
+
+
+def user_rows(n):
+    now = datetime.now()
+    return [{
+        'id': i, 'telegram_id': 10 ** 9 + i, 'name': f'User {i}', 'username': f'user{i}',
+        'created_at': now - timedelta(seconds=i), 'updated_at': now,
+    } for i in range(n)]
+
+
+def date_event_rows(n):
+    now = datetime.now()
+    return [{
+        'id': i, 'couple_id': 1, 'idea_id': i % 16 + 1, 'proposer_id': 1 + i % 2,
+        'date_status': 'accepted', 'scheduled_date': None, 'completed_date': None,
+        'created_at': now - timedelta(seconds=i), 'idea_title': 'Пикник на природе',
+        'idea_description': 'Организуйте пикник в живописном месте', 'proposer_name': 'Alice',
+    } for i in range(n)]
+
+
+ENDPOINTS = {
+    "/ideas/": (IdeaResponse, idea_rows),
+    "/users/": (UserResponse, user_rows),
+    "/dates/history": (DateEventResponse, date_event_rows),
+}
+
+
+def build_app(model, rows, fast: bool) -> FastAPI:
+    app = FastAPI()
+    if fast:
+        @app.get("/rows", response_model=List[model])
+        async def fast_rows():
+            return model_response(model, rows, many=True)
+    else:
+        @app.get("/rows", response_model=List[model])
+        async def legacy_rows():
+            return [model(**row) for row in rows]
+    return app
+
+
+async def drive(app, requests: int) -> float:
+    """Call the ASGI app directly and return seconds per request"""
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/rows", "raw_path": b"/rows", "root_path": "",
+        "query_string": b"", "headers": [], "server": ("bench", 80),
+    }
+    await app(dict(scope), receive, send)
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - started) / requests
+
+
+async def main(args):
+    print(f"{'endpoint':<16} {'legacy us/row':>14} {'fast us/row':>12} {'speedup':>8} "
+          f"{'legacy ms/page':>15} {'fast ms/page':>13}")
+    for endpoint, (model, make_rows) in ENDPOINTS.items():
+        costs = {}
+        for fast in (False, True):
+            one = await drive(build_app(model, make_rows(1), fast), args.requests)
+            page = await drive(build_app(model, make_rows(args.rows), fast), args.requests)
+            costs[fast] = ((page - one) / (args.rows - 1), page)
+        (legacy_row, legacy_page), (fast_row, fast_page) = costs[False], costs[True]
+        print(f"{endpoint:<16} {legacy_row * 1e6:>14.2f} {fast_row * 1e6:>12.2f} "
+              f"{legacy_row / fast_row:>7.1f}x {legacy_page * 1e3:>15.3f} {fast_page * 1e3:>13.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200, help="rows per page")
+    parser.add_argument("--requests", type=int, default=300, help="requests per measurement")
+    args = parser.parse_args()
+    asyncio.run(main(args))
@@ -0,0 +1,54 @@
+import os
+import random
+
+import httpx
+import pytest
+import pytest_asyncio
+
+from app.database import Database
+from app.dependencies import get_db
+from app.main import app
+from app.storage.memory import InMemoryStorage
+
+
+@pytest_asyncio.fixture
+async def memory_storage():
+    storage = InMemoryStorage()
+    await storage.init_db()
+    return storage
+
+
+@pytest_asyncio.fixture
+async def client(memory_storage):
+    """HTTP client for the app with every route on a fresh InMemoryStorage"""
+    app.dependency_overrides[get_db] = lambda: memory_storage
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            yield client
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+
+
+@pytest_asyncio.fixture
+async def postgres_storage():
+    """A Database on DATABASE_URL with migrations applied; skips the test when it is not set"""
+    if not os.environ.get("DATABASE_URL"):
+        pytest.skip("DATABASE_URL is not set")
+    db = Database()
+    await db.init_db()
+    try:
+        yield db
+    finally:
+        await db.disconnect()
+
+
+@pytest.fixture(params=["memory", "postgres"])
+def storage(request):
+    """Each storage backend in turn, PostgreSQL only when DATABASE_URL is set"""
+    return request.getfixturevalue(f"{request.param}_storage")
+
+
+@pytest.fixture
+def telegram_id():
+    """A telegram_id not used by earlier runs against the same database"""
+    return random.randint(1, 10**12)
@@ -0,0 +1,374 @@
+import csv
+import io
+import json
+from datetime import timedelta
+
+import pytest
+
+from app.schemas.date_event import DateEventResponse
+from app.schemas.user import UserResponse
+from app.services.date_events import DateEventBroker, sse_stream
+from app.services.reminders import utcnow
+from app.utils.pagination import NEXT_CURSOR_HEADER
+
+API = "/api/v1"
+
+pytestmark = pytest.mark.asyncio
+
+
+async def register(client, telegram_id: int, name: str):
+    response = await client.post(f"{API}/auth/register", json={"telegram_id": telegram_id, "name": name})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+async def couple_of_two(client):
+    """Register two users and put them in a couple, return (first, second, couple)"""
+    first = await register(client, 1, "Anna")
+    second = await register(client, 2, "Boris")
+    couple = (await client.post(f"{API}/couples/", json={"user_id": first["id"]})).json()
+    response = await client.post(f"{API}/couples/join",
+                                 json={"user_id": second["id"], "invite_code": couple["invite_code"]})
+    assert response.status_code == 200, response.text
+    return first, second, response.json()
+
+
+async def propose(client, couple_id: int, idea_id: int, proposer_id: int):
+    return await client.post(f"{API}/dates/proposal",
+                             json={"couple_id": couple_id, "idea_id": idea_id, "proposer_id": proposer_id})
+
+
+async def test_register(client):
+    user = await register(client, 42, "Anna")
+    assert user["telegram_id"] == 42
+    assert user["name"] == "Anna"
+
+    response = await client.post(f"{API}/auth/register", json={"telegram_id": 42, "name": "Someone else"})
+    assert response.status_code == 400
+
+    response = await client.get(f"{API}/users/{user['id']}")
+    assert response.json() == user
+
+
+async def test_create_and_join_couple(client):
+    first = await register(client, 1, "Anna")
+    second = await register(client, 2, "Boris")
+    third = await register(client, 3, "Vera")
+
+    response = await client.post(f"{API}/couples/", json={"user_id": first["id"]})
+    assert response.status_code == 200, response.text
+    couple = response.json()
+    assert couple["user1_id"] == first["id"]
+    assert couple["user2_id"] is None
+
+    response = await client.post(f"{API}/couples/", json={"user_id": first["id"]})
+    assert response.status_code == 400
+
+    join = {"user_id": second["id"], "invite_code": "nosuch"}
+    response = await client.post(f"{API}/couples/join", json=join)
+    assert (response.status_code, response.json()["detail"]) == (400, "Invalid invite code")
+
+    join["invite_code"] = couple["invite_code"]
+    response = await client.post(f"{API}/couples/join", json={**join, "user_id": first["id"]})
+    assert (response.status_code, response.json()["detail"]) == (400, "Cannot join your own couple")
+
+    response = await client.post(f"{API}/couples/join", json=join)
+    assert response.status_code == 200, response.text
+    assert response.json()["user2_id"] == second["id"]
+
+    response = await client.post(f"{API}/couples/join", json={**join, "user_id": third["id"]})
+    assert (response.status_code, response.json()["detail"]) == (400, "Couple already has two members")
+
+    response = await client.get(f"{API}/couples/{couple['id']}")
+    assert response.json()["user2_id"] == second["id"]
+
+
+async def test_reserved_invite_code(client, memory_storage):
+    first = await register(client, 1, "Anna")
+    assert (await client.post(f"{API}/couples/code")).status_code == 503
+
+    await memory_storage.refill_invite_codes(10)
+
+    response = await client.post(f"{API}/couples/code")
+    assert response.status_code == 200, response.text
+    code = response.json()["invite_code"]
+
+    response = await client.post(f"{API}/couples/", json={"user_id": first["id"], "invite_code": code})
+    assert response.status_code == 200, response.text
+    assert response.json()["invite_code"] == code
+
+    response = await client.post(f"{API}/couples/", json={"user_id": first["id"], "invite_code": code})
+    assert response.status_code == 400
+
+
+async def test_propose_and_respond(client):
+    first, second, couple = await couple_of_two(client)
+    idea = (await client.get(f"{API}/ideas/", params={"limit": 1})).json()[0]
+
+    response = await propose(client, couple["id"], idea["id"], first["id"])
+    assert response.status_code == 200, response.text
+    event = response.json()
+    assert event["date_status"] == "pending"
+    assert event["idea_title"] == idea["title"]
+    assert event["proposer_name"] == "Anna"
+
+    response = await client.get(f"{API}/dates/proposals/{second['id']}")
+    assert [proposal["id"] for proposal in response.json()] == [event["id"]]
+
+    response = await client.post(f"{API}/dates/respond",
+                                 params={"event_id": event["id"], "response": "maybe", "user_id": second["id"]})
+    assert response.status_code == 422
+
+    respond = {"event_id": event["id"], "response": "accepted"}
+    response = await client.post(f"{API}/dates/respond", params={**respond, "user_id": first["id"]})
+    assert (response.status_code, response.json()["detail"]) == (400, "Cannot respond to own proposal")
+
+    response = await client.post(f"{API}/dates/respond", params={**respond, "user_id": second["id"]})
+    assert response.status_code == 200, response.text
+    assert response.json()["date_status"] == "accepted"
+    assert response.json()["responded_at"] is not None
+
+    response = await client.post(f"{API}/dates/respond", params={**respond, "user_id": second["id"]})
+    assert (response.status_code, response.json()["detail"]) == (400, "Proposal has already been answered")
+
+    response = await client.post(f"{API}/dates/respond", params={**respond, "event_id": 999999, "user_id": second["id"]})
+    assert response.status_code == 404
+
+
+async def test_propose_errors(client):
+    first, _, couple = await couple_of_two(client)
+    outsider = await register(client, 3, "Vera")
+    idea = (await client.get(f"{API}/ideas/", params={"limit": 1})).json()[0]
+
+    assert (await propose(client, 999999, idea["id"], first["id"])).status_code == 404
+    assert (await propose(client, couple["id"], 999999, first["id"])).status_code == 404
+    assert (await propose(client, couple["id"], idea["id"], outsider["id"])).status_code == 403
+
+    await client.patch(f"{API}/ideas/{idea['id']}", json={"is_active": False})
+    response = await propose(client, couple["id"], idea["id"], first["id"])
+    assert (response.status_code, response.json()["detail"]) == (400, "Idea is not active")
+
+
+async def test_ideas_pages(client):
+    catalog = (await client.get(f"{API}/ideas/", params={"limit": 200})).json()
+    assert len(catalog) > 10
+
+    seen = []
+    params = {"limit": 4}
+    while True:
+        response = await client.get(f"{API}/ideas/", params=params)
+        assert response.status_code == 200
+        seen.extend(idea["id"] for idea in response.json())
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            break
+        params["cursor"] = cursor
+
+    assert seen == [idea["id"] for idea in catalog]
+    response = await client.get(f"{API}/ideas/", params={"cursor": "garbage"})
+    assert response.status_code == 400
+
+
+async def test_history_pages(client):
+    first, second, couple = await couple_of_two(client)
+    ideas = (await client.get(f"{API}/ideas/", params={"limit": 5})).json()
+    proposed = [(await propose(client, couple["id"], idea["id"], first["id"])).json()["id"] for idea in ideas]
+
+    seen = []
+    params = {"limit": 2}
+    while True:
+        response = await client.get(f"{API}/dates/history/{couple['id']}", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) <= 2
+        seen.extend(event["id"] for event in page)
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if not cursor:
+            break
+        params["cursor"] = cursor
+
+    # Newest first, every event exactly once
+    assert seen == proposed[::-1]
+
+    assert (await client.get(f"{API}/dates/history/999999")).status_code == 404
+    response = await client.get(f"{API}/dates/history/{couple['id']}", params={"cursor": "garbage"})
+    assert response.status_code == 400
+
+
+async def test_ideas_etag(client):
+    response = await client.get(f"{API}/ideas/", params={"limit": 5})
+    etag = response.headers["ETag"]
+    idea = response.json()[0]
+
+    response = await client.get(f"{API}/ideas/", params={"limit": 5}, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+    response = await client.get(f"{API}/ideas/{idea['id']}")
+    response = await client.get(f"{API}/ideas/{idea['id']}", headers={"If-None-Match": response.headers["ETag"]})
+    assert response.status_code == 304
+
+    await client.post(f"{API}/ideas/", json={"title": "Brand new idea", "category": "test"})
+    response = await client.get(f"{API}/ideas/", params={"limit": 5}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json()[0]["title"] == "Brand new idea"
+
+
+async def test_exports(client):
+    first, second, couple = await couple_of_two(client)
+    idea = (await client.get(f"{API}/ideas/", params={"limit": 1})).json()[0]
+    await propose(client, couple["id"], idea["id"], first["id"])
+
+    response = await client.get(f"{API}/export/users", params={"chunk_size": 1})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    users = [json.loads(line) for line in response.text.splitlines()]
+    assert [user["id"] for user in users] == [first["id"], second["id"]]
+
+    response = await client.get(f"{API}/export/dates", params={"format": "csv"})
+    assert response.headers["content-type"].startswith("text/csv")
+    assert 'filename="date_events.csv"' in response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [(row["idea_title"], row["proposer_name"]) for row in rows] == [(idea["title"], "Anna")]
+
+
+async def test_import_ideas(client):
+    ideas = [
+        {"title": "Imported idea", "category": "test"},
+        {"title": "x" * 300, "category": "test"},
+        {"category": "test"},
+    ]
+    response = await client.post(f"{API}/ideas/import", json=ideas)
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert result["created"] == 1
+    assert [error["row"] for error in result["errors"]] == [1, 2]
+
+    body = 'title,description,category\nImported idea,,test\nCSV idea,,test\n'
+    response = await client.post(f"{API}/ideas/import", content=body, headers={"Content-Type": "text/csv"})
+    assert response.json() == {"created": 1, "duplicates": ["Imported idea"], "errors": []}
+
+    response = await client.post(f"{API}/ideas/import", files={"file": ("ideas.ndjson", b'{"title": "Uploaded", "category": "test"}\nnot json\n')})
+    result = response.json()
+    assert (result["created"], [error["row"] for error in result["errors"]]) == (1, [1])
+
+    response = await client.post(f"{API}/ideas/import", content=b"<ideas/>", headers={"Content-Type": "application/xml"})
+    assert response.status_code == 415
+    response = await client.post(f"{API}/ideas/import", json={"title": "Not a list"})
+    assert response.status_code == 400
+    response = await client.post(f"{API}/ideas/import", content=b"[{", headers={"Content-Type": "application/json"})
+    assert response.status_code == 400
+
+
+async def test_users_batch(client):
+    first = await register(client, 1, "Anna")
+    second = await register(client, 2, "Boris")
+
+    response = await client.post(f"{API}/users/batch",
+                                 json={"ids": [first["id"], 999999], "telegram_ids": [2, 404]})
+    assert response.status_code == 200, response.text
+    batch = response.json()
+    assert batch["by_id"] == {str(first["id"]): first}
+    assert batch["by_telegram_id"] == {"2": second}
+    assert (batch["missing_ids"], batch["missing_telegram_ids"]) == ([999999], [404])
+
+
+async def test_responses_carry_only_schema_fields(client):
+    first, second, couple = await couple_of_two(client)
+    idea = (await client.get(f"{API}/ideas/", params={"limit": 1})).json()[0]
+
+    response = await client.get(f"{API}/users/{first['id']}")
+    assert response.headers["content-type"] == "application/json"
+    assert set(response.json()) == set(UserResponse.model_fields)
+
+    # Storage rows carry columns such as reminded_at that the schema leaves out
+    event = (await propose(client, couple["id"], idea["id"], first["id"])).json()
+    assert set(event) == set(DateEventResponse.model_fields)
+    history = (await client.get(f"{API}/dates/history/{couple['id']}")).json()
+    assert history == [event]
+
+
+async def test_date_stream(client, memory_storage):
+    first, second, couple = await couple_of_two(client)
+    idea = (await client.get(f"{API}/ideas/", params={"limit": 1})).json()[0]
+
+    assert (await client.get(f"{API}/dates/stream")).status_code == 400
+    response = await client.get(f"{API}/dates/stream", params={"user_id": first["id"], "couple_id": couple["id"]})
+    assert response.status_code == 400
+    assert (await client.get(f"{API}/dates/stream", params={"couple_id": 999999})).status_code == 404
+
+    broker = DateEventBroker()
+    await memory_storage.listen_date_events(broker.publish)
+    stream = sse_stream(broker, couple["id"], user_id=second["id"], keepalive=60)
+    try:
+        assert (await anext(stream)).startswith("event: resync\n")
+        await propose(client, couple["id"], idea["id"], first["id"])
+        event, data = (await anext(stream)).split("\n")[:2]
+        assert event == "event: proposal"
+        assert json.loads(data.removeprefix("data: "))["proposer_id"] == first["id"]
+    finally:
+        await stream.aclose()
+    assert broker.stats()["subscribers"] == 0
+
+
+async def test_session(client):
+    single = await register(client, 3, "Vera")
+    response = await client.get(f"{API}/session/3")
+    assert response.json() == {"user": single, "couple": None, "pending_proposals": [], "history": []}
+
+    first, second, couple = await couple_of_two(client)
+    idea = (await client.get(f"{API}/ideas/", params={"limit": 1})).json()[0]
+    event = (await propose(client, couple["id"], idea["id"], first["id"])).json()
+
+    session = (await client.get(f"{API}/session/2")).json()
+    assert session["user"] == second
+    assert session["couple"] == couple
+    assert session["pending_proposals"] == [event]
+    assert session["history"] == [event]
+    assert (await client.get(f"{API}/session/1")).json()["pending_proposals"] == []
+
+    assert (await client.get(f"{API}/session/404")).status_code == 404
+
+
+async def test_search_ideas(client):
+    await client.post(f"{API}/ideas/", json={"title": "Stargazing picnic", "category": "outdoor"})
+    await client.post(f"{API}/ideas/", json={"title": "Stargazing from the roof", "category": "home"})
+
+    results = (await client.get(f"{API}/ideas/search", params={"q": "stargaz"})).json()
+    assert {idea["title"] for idea in results} == {"Stargazing picnic", "Stargazing from the roof"}
+    assert all(idea["rank"] > 0 for idea in results)
+
+    results = (await client.get(f"{API}/ideas/search", params={"q": "stargaz pic"})).json()
+    assert [idea["title"] for idea in results] == ["Stargazing picnic"]
+    results = (await client.get(f"{API}/ideas/search", params={"q": "stargaz", "category": "home"})).json()
+    assert [idea["title"] for idea in results] == ["Stargazing from the roof"]
+
+    assert (await client.get(f"{API}/ideas/search", params={"q": ""})).status_code == 422
+
+
+async def test_reminder_claims(client, memory_storage):
+    first, second, couple = await couple_of_two(client)
+    idea = (await client.get(f"{API}/ideas/", params={"limit": 1})).json()[0]
+    event = (await propose(client, couple["id"], idea["id"], first["id"])).json()
+    await client.post(f"{API}/dates/respond",
+                      params={"event_id": event["id"], "response": "accepted", "user_id": second["id"]})
+
+    response = await client.post(f"{API}/dates/{event['id']}/schedule", params={"user_id": first["id"]},
+                                 json={"scheduled_date": (utcnow() - timedelta(minutes=1)).isoformat()})
+    assert response.status_code == 400
+    scheduled_date = utcnow() + timedelta(minutes=30)
+    response = await client.post(f"{API}/dates/{event['id']}/schedule", params={"user_id": first["id"]},
+                                 json={"scheduled_date": scheduled_date.isoformat()})
+    assert response.status_code == 200, response.text
+    assert await memory_storage.next_reminder_at() == scheduled_date
+
+    notifications = []
+    await memory_storage.listen_date_events(notifications.append)
+    assert await memory_storage.claim_due_reminders(lead_time=60, limit=10) == []
+    claimed = await memory_storage.claim_due_reminders(lead_time=3600, limit=10)
+    assert [reminder["id"] for reminder in claimed] == [event["id"]]
+    assert [notification["event"] for notification in notifications] == ["reminder"]
+
+    # Claimed once: neither a second claim nor the next wake-up sees it again
+    assert await memory_storage.claim_due_reminders(lead_time=3600, limit=10) == []
+    assert await memory_storage.next_reminder_at() is None
@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+from app.database import Database
+from app.utils.cache import CoupleCache
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_cached_couples_are_copies():
+    cache = CoupleCache()
+    couple = {"id": 1, "user1_id": 10, "user2_id": None, "invite_code": "abc"}
+    cache.put(couple, cache.generation)
+    couple["user2_id"] = 11
+
+    cached = cache.get_by_user(10)
+    assert cached["user2_id"] is None
+    cached["user2_id"] = 12
+    assert cache.get_by_id(1)["user2_id"] is None
+
+
+async def test_join_in_another_worker_invalidates(postgres_storage, telegram_id):
+    other = Database()
+    await other.init_db()
+    try:
+        owner = await postgres_storage.create_user(telegram_id, "owner")
+        joiner = await postgres_storage.create_user(telegram_id + 1, "joiner")
+        couple = await postgres_storage.create_couple(owner['id'])
+        assert (await other.get_couple_by_user_id(owner['id']))['user2_id'] is None
+
+        await postgres_storage.join_couple(joiner['id'], couple['invite_code'])
+        for _ in range(50):
+            if other.couple_cache.get_by_user(owner['id']) is None:
+                break
+            await asyncio.sleep(0.02)
+        assert (await other.get_couple_by_user_id(owner['id']))['user2_id'] == joiner['id']
+        assert (await other.get_couple_by_user_id(joiner['id']))['id'] == couple['id']
+    finally:
+        await other.disconnect()
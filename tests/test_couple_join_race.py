@@ -0,0 +1,29 @@
+import asyncio
+
+import pytest
+
+from app.storage.base import JoinStatus
+
+pytestmark = pytest.mark.asyncio
+
+JOINERS = 8
+
+
+async def test_concurrent_joins_fill_the_couple_once(postgres_storage, telegram_id):
+    db = postgres_storage
+    owner = await db.create_user(telegram_id, "owner")
+    couple = await db.create_couple(owner['id'])
+    joiners = [await db.create_user(telegram_id + 1 + i, f"joiner {i}") for i in range(JOINERS)]
+
+    results = await asyncio.gather(*(db.join_couple(user['id'], couple['invite_code']) for user in joiners))
+
+    statuses = [join_status for _, join_status in results]
+    assert statuses.count(JoinStatus.joined) == 1
+    assert statuses.count(JoinStatus.couple_full) == JOINERS - 1
+
+    winner = next(joined for joined, join_status in results if join_status is JoinStatus.joined)
+    stored = await db.get_couple_by_id(couple['id'])
+    assert stored['user2_id'] == winner['user2_id']
+    for user in joiners:
+        if user['id'] != winner['user2_id']:
+            assert await db.get_couple_by_user_id(user['id']) is None
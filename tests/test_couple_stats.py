@@ -0,0 +1,25 @@
+import pytest
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_recategorised_idea_keeps_past_dates(storage, telegram_id):
+    first = await storage.create_user(telegram_id, "first")
+    second = await storage.create_user(telegram_id + 1, "second")
+    couple = await storage.create_couple(first['id'])
+    await storage.join_couple(second['id'], couple['invite_code'])
+    idea = await storage.create_idea("Recategorised idea", None, "before")
+
+    event, _ = await storage.create_date_proposal(couple['id'], idea['id'], first['id'])
+    await storage.respond_to_date_proposal(event['id'], 'accepted', second['id'])
+    await storage.update_idea(idea['id'], category="after")
+    await storage.complete_date(event['id'], first['id'])
+    event, _ = await storage.create_date_proposal(couple['id'], idea['id'], second['id'])
+    await storage.respond_to_date_proposal(event['id'], 'accepted', first['id'])
+
+    stats = await storage.get_couple_stats(couple['id'])
+    assert stats['categories'] == {'before': 1, 'after': 1}
+    assert await storage.check_couple_stats(couple['id']) == []
+
+    await storage.rebuild_couple_stats(couple['id'])
+    assert (await storage.get_couple_stats(couple['id']))['categories'] == {'before': 1, 'after': 1}
@@ -0,0 +1,42 @@
+import pytest
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_pages_walk_the_catalog(storage):
+    catalog, _ = await storage.get_ideas_catalog()
+
+    seen, after = [], None
+    while True:
+        page, etag = await storage.get_ideas_page(7, after)
+        assert etag.startswith('"')
+        seen.extend(idea['id'] for idea in page)
+        if len(page) < 7:
+            break
+        after = (page[-1]['created_at'], page[-1]['id'])
+
+    assert seen == [idea['id'] for idea in catalog]
+
+
+async def test_page_etag_follows_its_rows(storage):
+    first, etag = await storage.get_ideas_page(3)
+    assert await storage.get_ideas_page(3) == (first, etag)
+
+    second, second_etag = await storage.get_ideas_page(3, (first[-1]['created_at'], first[-1]['id']))
+    assert second_etag != etag
+    assert not {idea['id'] for idea in first} & {idea['id'] for idea in second}
+
+
+async def test_callers_cannot_change_the_cached_catalog(storage):
+    catalog, etag = await storage.get_ideas_catalog()
+    with pytest.raises(TypeError):
+        catalog[0]['title'] = "Changed"
+
+    ideas = await storage.get_all_ideas()
+    ideas[0]['title'] = "Changed"
+    ideas.clear()
+    page, _ = await storage.get_ideas_page(1)
+    page[0]['title'] = "Changed"
+
+    assert await storage.get_ideas_catalog() == (catalog, etag)
+    assert catalog[0]['title'] != "Changed"
@@ -0,0 +1,57 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.utils.idempotency import IdempotencyMiddleware, InMemoryIdempotencyStore, REPLAYED_HEADER
+from app.utils.metrics import MetricsMiddleware, http_requests
+
+pytestmark = pytest.mark.asyncio
+
+
+def make_app():
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.post("/items/test")
+    async def create_item(item: dict):
+        app.state.calls += 1
+        return {"call": app.state.calls, **item}
+
+    app.add_middleware(IdempotencyMiddleware, store=InMemoryIdempotencyStore(), paths=["/items/test"])
+    app.add_middleware(MetricsMiddleware)
+    return app
+
+
+async def post(app, body, key):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        return await client.post("/items/test", json=body, headers={"Idempotency-Key": key})
+
+
+def requests_counted(status_code: int) -> float:
+    return http_requests._values.get(("POST", "/items/test", str(status_code)), 0)
+
+
+async def test_retry_is_replayed_and_counted_under_its_route():
+    app = make_app()
+    counted = requests_counted(200)
+
+    first = await post(app, {"name": "a"}, "key")
+    retry = await post(app, {"name": "a"}, "key")
+
+    assert first.json() == retry.json() == {"call": 1, "name": "a"}
+    assert REPLAYED_HEADER.lower() not in first.headers
+    assert retry.headers[REPLAYED_HEADER] == "true"
+    assert app.state.calls == 1
+    assert requests_counted(200) == counted + 2
+
+
+async def test_key_reused_for_another_body():
+    app = make_app()
+    counted = requests_counted(422)
+
+    await post(app, {"name": "a"}, "key")
+    response = await post(app, {"name": "b"}, "key")
+
+    assert response.status_code == 422
+    assert app.state.calls == 1
+    assert requests_counted(422) == counted + 1
@@ -0,0 +1,30 @@
+import pytest
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_create_couple_recovers_from_a_taken_code_in_a_transaction(postgres_storage, telegram_id):
+    db = postgres_storage
+    owner = await db.create_user(telegram_id, "owner")
+    squatter = await db.create_user(telegram_id + 1, "squatter")
+    async with db.pool.acquire() as conn:
+        transaction = conn.transaction()
+        await transaction.start()
+        try:
+            # Leave one code in the reservoir and give it to a couple already, as a
+            # code generated by the empty-reservoir fallback would be
+            code = await conn.fetchval(
+                "SELECT code FROM invite_codes WHERE reserved_at IS NULL LIMIT 1"
+            ) or db.generate_invite_code()
+            await conn.execute("DELETE FROM invite_codes")
+            await conn.execute("INSERT INTO invite_codes (code) VALUES ($1)", code)
+            await conn.execute("INSERT INTO couples (user1_id, invite_code) VALUES ($1, $2)", squatter['id'], code)
+
+            couple = await db.create_couple(owner['id'], conn=conn)
+
+            assert couple['user1_id'] == owner['id']
+            assert couple['invite_code'] != code
+            # The caller's transaction is still usable
+            assert await conn.fetchval("SELECT count(*) FROM couples WHERE user1_id = $1", owner['id']) == 1
+        finally:
+            await transaction.rollback()
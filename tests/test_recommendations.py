@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.services.recommendations import Recommender
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_history_is_weighted_from_the_answer(memory_storage):
+    db = memory_storage
+    first = await db.create_user(1, "first")
+    second = await db.create_user(2, "second")
+    couple = await db.create_couple(first['id'])
+    await db.join_couple(second['id'], couple['invite_code'])
+    ideas = await db.get_all_ideas()
+
+    answered, pending = ideas[0], ideas[1]
+    event, _ = await db.create_date_proposal(couple['id'], answered['id'], first['id'])
+    await db.respond_to_date_proposal(event['id'], 'accepted', second['id'])
+    other, _ = await db.create_date_proposal(couple['id'], pending['id'], first['id'])
+    # Proposed a month before they were answered
+    month_ago = datetime.now() - timedelta(days=30)
+    db.date_events[event['id']]['created_at'] = month_ago
+    db.date_events[other['id']]['created_at'] = month_ago
+
+    recommender = Recommender()
+    await recommender.recommend(db, couple['id'], 5)
+    profile = recommender._profiles[couple['id']]
+
+    assert profile.done_at[answered['id']] == db.date_events[event['id']]['responded_at'].timestamp()
+    assert pending['id'] in profile.excluded
@@ -0,0 +1,54 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+import pytest
+from asyncpg.connection import LoggedQuery
+
+from app.utils.slow_queries import SlowQueryLog
+
+pytestmark = pytest.mark.asyncio
+
+QUERY = "SELECT * FROM users WHERE telegram_id = $1 AND name = $2"
+
+
+class StuckPool:
+    """A pool whose connections never become available"""
+
+    def __init__(self):
+        self.waiting = asyncio.Event()
+
+    @asynccontextmanager
+    async def acquire(self):
+        self.waiting.set()
+        await asyncio.Future()
+        yield
+
+
+def slow_query(query: str = QUERY, args=(42, "secret name")) -> LoggedQuery:
+    return LoggedQuery(query=query, args=args, timeout=None, elapsed=1.0,
+                       exception=None, conn_addr=None, conn_params=None)
+
+
+async def test_parameters_stay_out_of_warnings(caplog):
+    log = SlowQueryLog(threshold_ms=10)
+    with caplog.at_level(logging.DEBUG, logger="app.utils.slow_queries"):
+        log(slow_query())
+
+    warnings = [record.getMessage() for record in caplog.records if record.levelno == logging.WARNING]
+    assert len(warnings) == 1 and "telegram_id" in warnings[0]
+    assert "secret" not in caplog.text
+    assert log.recent()[0]["params"] == ["int", "str(11)"]
+
+
+async def test_close_cancels_pending_plans():
+    log = SlowQueryLog(threshold_ms=10, sample_rate=1.0)
+    log.pool = StuckPool()
+    log(slow_query())
+    log(slow_query())
+    await log.pool.waiting.wait()
+    assert len(log._explains) == 1
+
+    await log.close()
+    assert not log._explains
+    assert log.recent()[0]["plan"] is None
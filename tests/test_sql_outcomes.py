@@ -0,0 +1,23 @@
+import re
+
+from app import database
+from app.storage.base import JoinStatus, ProposalStatus
+
+
+def sql_outcomes(query: str):
+    """The outcome literals a validated statement's CASE can produce"""
+    case = query[query.rindex("CASE"):query.rindex("END")]
+    return set(re.findall(r"(?:THEN|ELSE) '(\w+)'", case))
+
+
+def test_sql_outcomes_are_the_enums():
+    assert sql_outcomes(database.JOIN_COUPLE) == {status.value for status in JoinStatus}
+    assert sql_outcomes(database.CREATE_DATE_PROPOSAL) == {
+        "ok", "couple_not_found", "idea_not_found", "not_member", "idea_inactive",
+    }
+    assert sql_outcomes(database.RESPOND_TO_DATE_PROPOSAL) == {
+        "ok", "event_not_found", "not_member", "own_proposal", "not_pending",
+    }
+    for query in (database.CREATE_DATE_PROPOSAL, database.RESPOND_TO_DATE_PROPOSAL,
+                  database.SCHEDULE_DATE, database.COMPLETE_DATE):
+        assert sql_outcomes(query) <= {status.value for status in ProposalStatus}
@@ -0,0 +1,73 @@
+import pytest
+
+from app.storage.base import JoinStatus, ProposalStatus
+
+pytestmark = pytest.mark.asyncio
+
+
+async def users(storage, telegram_id: int, count: int):
+    return [await storage.create_user(telegram_id + i, f"user {i}") for i in range(count)]
+
+
+async def active_idea(storage):
+    return await storage.create_idea("Outcome test idea", "test", "test")
+
+
+async def test_join_outcomes(storage, telegram_id):
+    first, second, third = await users(storage, telegram_id, 3)
+    couple = await storage.create_couple(first['id'])
+
+    assert (await storage.join_couple(second['id'], "nosuch"))[1] is JoinStatus.invalid_code
+    assert (await storage.join_couple(first['id'], couple['invite_code']))[1] is JoinStatus.own_couple
+
+    joined, status = await storage.join_couple(second['id'], couple['invite_code'])
+    assert status is JoinStatus.joined
+    assert joined['user2_id'] == second['id']
+
+    assert (await storage.join_couple(second['id'], couple['invite_code']))[1] is JoinStatus.own_couple
+    assert (await storage.join_couple(third['id'], couple['invite_code']))[1] is JoinStatus.couple_full
+
+    other = await storage.create_couple(third['id'])
+    assert (await storage.join_couple(second['id'], other['invite_code']))[1] is JoinStatus.already_in_couple
+
+
+async def test_proposal_outcomes(storage, telegram_id):
+    first, second, outsider = await users(storage, telegram_id, 3)
+    couple = await storage.create_couple(first['id'])
+    await storage.join_couple(second['id'], couple['invite_code'])
+    idea = await active_idea(storage)
+
+    assert (await storage.create_date_proposal(0, idea['id'], first['id']))[1] is ProposalStatus.couple_not_found
+    assert (await storage.create_date_proposal(couple['id'], 0, first['id']))[1] is ProposalStatus.idea_not_found
+    assert (await storage.create_date_proposal(couple['id'], idea['id'], outsider['id']))[1] \
+        is ProposalStatus.not_member
+
+    event, status = await storage.create_date_proposal(couple['id'], idea['id'], first['id'])
+    assert status is ProposalStatus.ok
+    assert event['date_status'] == 'pending'
+
+    inactive = await active_idea(storage)
+    await storage.update_idea(inactive['id'], is_active=False)
+    assert (await storage.create_date_proposal(couple['id'], inactive['id'], first['id']))[1] \
+        is ProposalStatus.idea_inactive
+
+
+async def test_response_outcomes(storage, telegram_id):
+    first, second, outsider = await users(storage, telegram_id, 3)
+    couple = await storage.create_couple(first['id'])
+    await storage.join_couple(second['id'], couple['invite_code'])
+    event, _ = await storage.create_date_proposal(couple['id'], (await active_idea(storage))['id'], first['id'])
+
+    assert (await storage.respond_to_date_proposal(0, 'accepted', second['id']))[1] \
+        is ProposalStatus.event_not_found
+    assert (await storage.respond_to_date_proposal(event['id'], 'accepted', outsider['id']))[1] \
+        is ProposalStatus.not_member
+    assert (await storage.respond_to_date_proposal(event['id'], 'accepted', first['id']))[1] \
+        is ProposalStatus.own_proposal
+
+    answered, status = await storage.respond_to_date_proposal(event['id'], 'accepted', second['id'])
+    assert status is ProposalStatus.ok
+    assert answered['date_status'] == 'accepted'
+
+    assert (await storage.respond_to_date_proposal(event['id'], 'rejected', second['id']))[1] \
+        is ProposalStatus.not_pending